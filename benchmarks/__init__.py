@@ -0,0 +1,6 @@
+"""
+Performance benchmarks for httpsig.
+
+Run the suite from the repository root with ``python -m benchmarks``, or a
+single script with e.g. ``python -m benchmarks.bench_batch``.
+"""
@@ -0,0 +1,44 @@
+"""
+Run the benchmark suite and write the results as JSON.
+
+    python -m benchmarks [--output results.json] [--quick] [--match TEXT]
+
+Compare two runs with ``python -m benchmarks.compare old.json new.json``.
+"""
+import argparse
+import json
+import sys
+
+from benchmarks.suite import run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks', description=__doc__.strip())
+    parser.add_argument('--output', '-o',
+                        help='write JSON here instead of standard output')
+    parser.add_argument('--quick', action='store_true',
+                        help='smallest RSA key and fewer header counts only')
+    parser.add_argument('--match', help='only run benchmarks whose id '
+                        'contains this text')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='seconds per timing round (default: 0.2)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='timing rounds per benchmark (default: 5)')
+    args = parser.parse_args(argv)
+
+    def log(line):
+        sys.stderr.write(line + '\n')
+
+    results = run(quick=args.quick, match=args.match,
+                  min_time=args.min_time, repeat=args.repeat, log=log)
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
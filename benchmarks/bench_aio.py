@@ -0,0 +1,86 @@
+"""
+Measure event-loop stalls while verifying concurrent requests, inline with
+RequestVerifier.verify() versus offloaded with AsyncVerifier.
+
+    python -m benchmarks.bench_aio [--requests N] [--algorithm ALG]
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import DATE, load_keys
+from httpsig.aio import AsyncVerifier
+from httpsig.keystore import KeyStore, StaticKeyLoader
+from httpsig.sign import HeaderSigner
+from httpsig.verify import RequestVerifier
+
+
+async def measure(verify, requests, concurrency):
+    stalls = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.001)
+            stalls.append(time.perf_counter() - start - 0.001)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(request):
+        async with semaphore:
+            return await verify(*request)
+
+    tick = asyncio.ensure_future(ticker())
+    start = time.perf_counter()
+    results = await asyncio.gather(*[one(r) for r in requests])
+    elapsed = time.perf_counter() - start
+    done.set()
+    await tick
+    assert all(results)
+    stalls.sort()
+    return (elapsed, stalls[len(stalls) // 2],
+            stalls[int(len(stalls) * 0.99)], stalls[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--algorithm', default='rsa-sha256')
+    args = parser.parse_args()
+
+    private, public = load_keys(args.algorithm)
+    signer = HeaderSigner(key_id='Test', secret=private,
+                          algorithm=args.algorithm,
+                          headers=['(request-target)', 'date'])
+    requests = []
+    for i in range(args.requests):
+        path = '/item/%d' % i
+        requests.append((signer.sign({'Date': DATE}, method='GET', path=path),
+                         'GET', path))
+
+    inline = RequestVerifier(
+        key_store=KeyStore(StaticKeyLoader({'Test': public})))
+
+    async def verify_inline(*request):
+        return inline.verify(*request)
+
+    async def resolve(key_id, algorithm):
+        return public
+
+    offloaded = AsyncVerifier(resolve)
+
+    print('%-10s %10s %12s %12s %12s' % (
+        'mode', 'req/s', 'stall p50', 'stall p99', 'stall max'))
+    for name, verify in (('inline', verify_inline),
+                         ('executor', offloaded.verify)):
+        elapsed, p50, p99, worst = asyncio.run(
+            measure(verify, requests, args.concurrency))
+        print('%-10s %10.0f %10.2fms %10.2fms %10.2fms' % (
+            name, len(requests) / elapsed, p50 * 1e3, p99 * 1e3,
+            worst * 1e3))
+
+
+if __name__ == '__main__':
+    main()
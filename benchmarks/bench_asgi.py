@@ -0,0 +1,114 @@
+"""
+Load test of the ASGI SignatureMiddleware: many concurrent requests through
+a bare ASGI application and through the middleware, reporting the p50/p99
+latency to the response and the latency the middleware adds.
+
+    python -m benchmarks.bench_asgi [--requests N] [--concurrency N]
+        [--algorithm ALG] [--body-chunks N]
+"""
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import DATE, load_keys
+from httpsig.aio import AsyncVerifier
+from httpsig.asgi import SignatureMiddleware
+from httpsig.digest import compute_digest
+from httpsig.sign import HeaderSigner
+
+CHUNK = b'x' * 4096
+
+
+async def app(scope, receive, send):
+    while (await receive()).get('more_body'):
+        pass
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': []})
+    await send({'type': 'http.response.body', 'body': b'ok'})
+
+
+def make_scopes(signer, count, body_chunks):
+    digest = compute_digest([CHUNK] * body_chunks)
+    scopes = []
+    for i in range(count):
+        path = '/item/%d' % i
+        headers = signer.sign(
+            [(b'host', b'example.com'), (b'date', DATE.encode('ascii')),
+             (b'digest', digest.encode('ascii'))],
+            method='POST', path=path)
+        scopes.append({'type': 'http', 'method': 'POST', 'path': path,
+                       'raw_path': path.encode('ascii'), 'query_string': b'',
+                       'headers': headers, 'server': ('example.com', 80)})
+    return scopes
+
+
+async def run(application, scopes, concurrency, body_chunks):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(scope):
+        async with semaphore:
+            messages = [{'type': 'http.request', 'body': CHUNK,
+                         'more_body': i < body_chunks - 1}
+                        for i in range(body_chunks)]
+            status = []
+
+            async def receive():
+                await asyncio.sleep(0)
+                return messages.pop(0)
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            start = time.perf_counter()
+            await application(scope, receive, send)
+            latencies.append(time.perf_counter() - start)
+            assert status == [200], status
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(scope) for scope in scopes])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return (len(scopes) / elapsed, latencies[len(latencies) // 2],
+            latencies[int(len(latencies) * 0.99)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=500)
+    parser.add_argument('--algorithm', default='rsa-sha256')
+    parser.add_argument('--body-chunks', type=int, default=4)
+    args = parser.parse_args()
+
+    private, public = load_keys(args.algorithm)
+    signer = HeaderSigner(
+        'Test', private, algorithm=args.algorithm,
+        headers=['(request-target)', 'host', 'date', 'digest'])
+    scopes = make_scopes(signer, args.requests, args.body_chunks)
+
+    async def resolve(key_id, algorithm):
+        return public
+
+    middleware = SignatureMiddleware(app, AsyncVerifier(resolve))
+
+    print('%-11s %10s %10s %10s' % ('app', 'req/s', 'p50', 'p99'))
+    results = {}
+    for name, application in (('bare', app), ('middleware', middleware)):
+        results[name] = asyncio.run(run(
+            application, scopes, args.concurrency, args.body_chunks))
+        rate, p50, p99 = results[name]
+        print('%-11s %10.0f %8.2fms %8.2fms' % (
+            name, rate, p50 * 1e3, p99 * 1e3))
+    print('%-11s %10s %8.2fms %8.2fms' % (
+        'added', '', (results['middleware'][1] - results['bare'][1]) * 1e3,
+        (results['middleware'][2] - results['bare'][2]) * 1e3))
+    totals = middleware.metrics.totals()
+    print('verification p50 %.3fms p99 %.3fms (%d ok)' % (
+        totals['latency']['p50'] * 1e3, totals['latency']['p99'] * 1e3,
+        totals['ok']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,35 @@
+"""
+Compare sign and verify throughput of the crypto backends for every
+algorithm they support.
+
+    python -m benchmarks.bench_backends [--min-time SECONDS]
+"""
+import argparse
+
+from httpsig.utils import ALGORITHMS
+
+from benchmarks.common import load_keys
+from benchmarks.suite import MESSAGE, backend_variants, measure
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--min-time', type=float, default=0.2)
+    args = parser.parse_args()
+
+    print('%-12s %-13s %14s %14s' % (
+        'algorithm', 'backend', 'sign ops/s', 'verify ops/s'))
+    for algorithm in sorted(ALGORITHMS):
+        private, public = load_keys(algorithm)
+        for name, signer, verifier in backend_variants(
+                algorithm, private, public):
+            signature = signer.sign(MESSAGE)
+            sign = measure(lambda: signer.sign(MESSAGE), args.min_time)
+            verify = measure(lambda: verifier._verify(MESSAGE, signature),
+                             args.min_time)
+            print('%-12s %-13s %14.0f %14.0f' % (
+                algorithm, name, sign['ops_per_sec'], verify['ops_per_sec']))
+
+
+if __name__ == '__main__':
+    main()
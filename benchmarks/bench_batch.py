@@ -0,0 +1,65 @@
+"""
+Compare serial verification with verify_many() on thread and process pools.
+
+    python -m benchmarks.bench_batch [--requests N] [--algorithm ALG]
+"""
+import argparse
+import multiprocessing
+
+from benchmarks.common import DATE, load_keys, timed
+from httpsig.keystore import KeyStore, StaticKeyLoader
+from httpsig.sign import HeaderSigner
+from httpsig.verify import RequestVerifier
+
+def make_requests(algorithm, count, keys=4):
+    private, public = load_keys(algorithm)
+    signers = [HeaderSigner(key_id='key%d' % i, secret=private,
+                            algorithm=algorithm,
+                            headers=['(request-target)', 'host', 'date'])
+               for i in range(keys)]
+    requests = []
+    for i in range(count):
+        path = '/item/%d' % i
+        signed = signers[i % keys].sign(
+            {'Host': 'example.com', 'Date': DATE}, method='POST', path=path)
+        requests.append((signed, 'POST', path))
+    loader = StaticKeyLoader(
+        {'key%d' % i: public for i in range(keys)})
+    return requests, loader
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--algorithm', default='rsa-sha256')
+    args = parser.parse_args()
+
+    requests, loader = make_requests(args.algorithm, args.requests)
+
+    def run_serial():
+        verifier = RequestVerifier(key_store=KeyStore(loader))
+        return [verifier.verify(*r) for r in requests]
+
+    results, serial = timed(run_serial)
+    assert all(results)
+    print('%-10s %7s %12s %8s' % ('mode', 'workers', 'req/s', 'speedup'))
+    print('%-10s %7d %12.0f %8.2f' % (
+        'serial', 1, len(requests) / serial, 1.0))
+
+    workers = 1
+    while workers <= multiprocessing.cpu_count():
+        for mode in ('threads', 'processes'):
+            def run():
+                verifier = RequestVerifier(key_store=KeyStore(loader))
+                return list(verifier.verify_many(
+                    requests, max_workers=workers,
+                    processes=mode == 'processes'))
+            results, elapsed = timed(run)
+            assert all(results)
+            print('%-10s %7d %12.0f %8.2f' % (
+                mode, workers, len(requests) / elapsed, serial / elapsed))
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare verifying requests carrying many headers given as a dict (copied
+into a CaseInsensitiveDict), as an ASGI-style list of byte pairs (RawHeaders)
+(also with names known to be lowercase) and as a WSGI environ
+(WSGIHeaders). Exits with an error if pairs are slower than a dict.
+
+    python -m benchmarks.bench_headers [--headers N] [--number N]
+"""
+import argparse
+import sys
+import timeit
+
+from httpsig.sign import HeaderSigner
+from httpsig.utils import RawHeaders, WSGIHeaders
+from httpsig.verify import RequestVerifier
+
+from benchmarks.common import DATE
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--headers', type=int, default=60)
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    headers = {'Host': 'example.com', 'Date': DATE}
+    headers.update(('X-Proxy-Header-%d' % i, 'value %d' % i)
+                   for i in range(args.headers - len(headers)))
+    signer = HeaderSigner('Test', b'secret', algorithm='hmac-sha256',
+                          headers=['(request-target)', 'host', 'date'])
+    headers = dict(signer.sign(headers, method='GET', path='/'))
+    verifier = RequestVerifier(secret=b'secret')
+
+    pairs = [(name.lower().encode('ascii'), value.encode('ascii'))
+             for name, value in headers.items()]
+    environ = dict(('HTTP_' + name.upper().replace('-', '_'), value)
+                   for name, value in headers.items())
+
+    inputs = [
+        ('dict', lambda: headers),
+        ('pairs', lambda: pairs),
+        ('pairs-lc', lambda: RawHeaders(pairs, lowercase=True)),
+        ('wsgi', lambda: WSGIHeaders(environ)),
+    ]
+    print('%d headers' % len(headers))
+    print('%-8s %10s %8s' % ('input', 'us/call', 'speedup'))
+    base = None
+    times = {}
+    for name, get in inputs:
+        assert verifier.verify(get(), method='GET', path='/')
+        elapsed = min(timeit.repeat(
+            lambda: verifier.verify(get(), method='GET', path='/'),
+            number=args.number, repeat=3))
+        base = base or elapsed
+        times[name] = elapsed
+        print('%-8s %10.2f %8.2f' % (
+            name, elapsed / args.number * 1e6, base / elapsed))
+    if times['pairs'] > times['dict']:
+        sys.exit('pairs are slower than a dict')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Measure how long importing httpsig takes, with ``python -X importtime``, in
+fresh interpreters, and which modules cost the most. Also reports the time
+to the first HMAC signature, and checks that it loads neither PyCryptodome
+nor PyNaCl.
+
+    python -m benchmarks.bench_import [--runs N] [--top N]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+FIRST_SIGNATURE = '''
+import sys
+from httpsig.sign import HeaderSigner
+HeaderSigner('Test', b'secret', 'hmac-sha256').sign({'Date': 'today'})
+print(' '.join(sorted(name for name in ('Crypto', 'nacl', 'cryptography',
+                                        'pkg_resources', 'importlib.metadata')
+                      if name in sys.modules)))
+'''
+
+
+def importtime(code):
+    """
+    Run `code` in a new interpreter with -X importtime and return
+        ({module: (self us, cumulative us)}, standard output).
+    """
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True, check=True)
+    modules = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(own), int(cumulative))
+    return modules, process.stdout.strip()
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--runs', type=int, default=11)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    totals = []
+    own_times = {}
+    for _ in range(args.runs):
+        modules, _ = importtime('import httpsig')
+        totals.append(modules['httpsig'][1])
+        for name, (own, _) in modules.items():
+            own_times.setdefault(name, []).append(own)
+    print('import httpsig: median %.1f ms, min %.1f ms over %d runs' % (
+        median(totals) / 1e3, min(totals) / 1e3, args.runs))
+
+    # Modules loaded by the interpreter itself are not httpsig's cost.
+    startup, _ = importtime('pass')
+    print('slowest modules (median self time):')
+    ranked = sorted(((median(times), name)
+                     for name, times in own_times.items()
+                     if name not in startup), reverse=True)
+    for own, name in ranked[:args.top]:
+        print('  %8.2f ms  %s' % (own / 1e3, name))
+
+    firsts = []
+    for _ in range(args.runs):
+        modules, loaded = importtime(FIRST_SIGNATURE)
+        firsts.append(modules['httpsig.sign'][1])
+    print('import httpsig.sign before the first HMAC signature: '
+          'median %.1f ms' % (median(firsts) / 1e3))
+    print('heavy modules loaded by HMAC signing: %s' % (loaded or 'none'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Measure the cost of the instrumentation hooks (httpsig.instrument): signing
+and verifying with no hook registered, against the same code without the
+hook checks, and with a PhaseMetrics hook registered.
+
+    python -m benchmarks.bench_instrument [--number N] [--algorithm ALG]
+"""
+import argparse
+import base64
+import timeit
+
+from httpsig import instrument
+from httpsig.metrics import PhaseMetrics
+from httpsig.sign import HeaderSigner
+from httpsig.utils import as_headers, compile_message
+from httpsig.verify import RequestVerifier
+
+from benchmarks.common import DATE, load_keys
+
+HEADERS = ['(request-target)', 'host', 'date']
+
+
+class BareVerifier(RequestVerifier):
+    """
+    RequestVerifier.verify() without the hook checks.
+    """
+    def verify(self, headers, method=None, path=None, host=None):
+        headers, params, auth_headers = self._parse(headers)
+        key = self.key_store.get(params.key_id, params.algorithm)
+        signing_str = compile_message(auth_headers).build(
+                headers, host, method, path)
+        return key._key.verify(signing_str,
+                               base64.b64decode(params.signature))
+
+
+def bare_sign_value(signer, headers):
+    """
+    HeaderSigner.sign_value() without the hook checks.
+    """
+    headers = as_headers(headers)
+    if not headers.get('date'):
+        raise Exception('missing required header "date"')
+    message = signer._message.build(headers, None, 'GET', '/', None)
+    return (signer._prefix_bytes +
+            base64.b64encode(signer._signer._key.sign(message)) +
+            signer._suffix_bytes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--number', type=int, default=20000)
+    parser.add_argument('--algorithm', default='hmac-sha256')
+    args = parser.parse_args()
+
+    private, public = load_keys(args.algorithm)
+    signer = HeaderSigner('Test', private, algorithm=args.algorithm,
+                          headers=HEADERS)
+    headers = signer.sign({'Host': 'example.com', 'Date': DATE},
+                          method='GET', path='/')
+    verifier = RequestVerifier(secret=public)
+    bare = BareVerifier(secret=public)
+
+    cases = [
+        ('sign', lambda: bare_sign_value(signer, headers),
+         lambda: signer.sign_value(headers, method='GET', path='/')),
+        ('verify', lambda: bare.verify(headers, method='GET', path='/'),
+         lambda: verifier.verify(headers, method='GET', path='/')),
+    ]
+    number = args.number
+
+    def us(*funcs):
+        # Interleaved rounds, so load changes affect every function alike.
+        best = [float('inf')] * len(funcs)
+        for _ in range(7):
+            for i, func in enumerate(funcs):
+                best[i] = min(best[i], timeit.timeit(func, number=number))
+        return [elapsed / number * 1e6 for elapsed in best]
+
+    print('%s, %d calls' % (args.algorithm, number))
+    print('%-8s %10s %10s %10s %10s' % (
+        'case', 'bare us', 'off us', 'off +%', 'hooked us'))
+    metrics = PhaseMetrics()
+    for name, bare_func, func in cases:
+        assert bare_func() and func()
+        bare_us, off_us = us(bare_func, func)
+        with instrument.hooked(metrics):
+            hooked_us, = us(func)
+        print('%-8s %10.2f %10.2f %10.1f %10.2f' % (
+            name, bare_us, off_us, (off_us / bare_us - 1) * 100, hooked_us))
+
+    for stats in metrics.snapshot():
+        print('%s %s:' % (stats['operation'], stats['key_id']))
+        for phase in instrument.PHASES + ('total',):
+            if phase in stats['phases']:
+                print('  %-8s mean %8.2f us' % (
+                    phase, stats['phases'][phase]['mean'] * 1e6))
+
+
+if __name__ == '__main__':
+    main()
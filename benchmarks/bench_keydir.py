@@ -0,0 +1,141 @@
+"""
+Measure KeyDirectory with many keys: initial load time and memory, reloads
+with nothing or 1% of the files changed, and lookups by keyId and by
+fingerprint.
+
+The keys are random, which is fine as they are only parsed when verifying:
+ed25519 keys in the three supported formats and 1024-bit RSA moduli as
+PKCS#1 PEM.
+
+    python -m benchmarks.bench_keydir [--keys N] [--rsa-fraction F]
+"""
+import argparse
+import base64
+import gc
+import os
+import random
+import shutil
+import struct
+import tempfile
+import timeit
+import tracemalloc
+
+from httpsig.keydir import KeyDirectory
+
+from benchmarks.common import timed
+
+SPKI_ED25519 = bytes(bytearray.fromhex('302a300506032b6570032100'))
+
+
+def der(tag, content):
+    if len(content) < 0x80:
+        return struct.pack('BB', tag, len(content)) + content
+    size = struct.pack('>I', len(content)).lstrip(b'\0')
+    return struct.pack('BB', tag, 0x80 | len(size)) + size + content
+
+
+def pem(label, data):
+    body = base64.b64encode(data)
+    lines = [body[i:i + 64] for i in range(0, len(body), 64)]
+    return b'\n'.join([b'-----BEGIN ' + label + b'-----'] + lines +
+                      [b'-----END ' + label + b'-----', b''])
+
+
+def key_file(i, rsa):
+    """
+    Return the name and content of the `i`th key file.
+    """
+    if rsa:
+        n = b'\0\xc0' + os.urandom(127)
+        body = der(0x30, der(0x02, n) + der(0x02, b'\x01\x00\x01'))
+        return 'rsa/%03d/key-%d.pem' % (i % 1000, i), pem(
+            b'RSA PUBLIC KEY', body)
+    raw = os.urandom(32)
+    kind = i % 3
+    if kind == 0:
+        return 'ed/%03d/key-%d.txt' % (i % 1000, i), base64.b64encode(raw)
+    if kind == 1:
+        blob = b'\0\0\0\x0bssh-ed25519\0\0\0\x20' + raw
+        return 'ed/%03d/key-%d.pub' % (i % 1000, i), (
+            b'ssh-ed25519 ' + base64.b64encode(blob) + b' bench\n')
+    return 'ed/%03d/key-%d.pem' % (i % 1000, i), pem(
+        b'PUBLIC KEY', SPKI_ED25519 + raw)
+
+
+def write_keys(path, count, rsa_fraction):
+    rng = random.Random(0)
+    names = []
+    for i in range(count):
+        name, data = key_file(i, rng.random() < rsa_fraction)
+        full = os.path.join(path, name)
+        if not os.path.isdir(os.path.dirname(full)):
+            os.makedirs(os.path.dirname(full))
+        with open(full, 'wb') as f:
+            f.write(data)
+        names.append(full)
+    return names
+
+
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--keys', type=int, default=100000)
+    parser.add_argument('--rsa-fraction', type=float, default=0.2)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+    try:
+        names, elapsed = timed(
+            lambda: write_keys(path, args.keys, args.rsa_fraction))
+        print('wrote %d key files in %.1fs' % (len(names), elapsed))
+
+        gc.collect()
+        before = rss()
+        keys, elapsed = timed(lambda: KeyDirectory(path))
+        grown = rss() - before
+        print('load: %.2fs (%.0f keys/s), %d keys, %d errors, '
+              'RSS +%.1f MB' % (elapsed, len(keys) / elapsed, len(keys),
+                                len(keys.errors), grown / 2.0 ** 20))
+
+        tracemalloc.start()
+        copy = KeyDirectory(path)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        print('memory: %.1f MB allocated, %.0f bytes per key' % (
+            size / 2.0 ** 20, float(size) / len(copy)))
+        del copy
+
+        _, elapsed = timed(keys.reload)
+        print('reload, nothing changed: %.2fs' % elapsed)
+        changed = names[::100]
+        for name in changed:
+            with open(name, 'rb') as f:
+                data = f.read()
+            with open(name + '.tmp', 'wb') as f:
+                f.write(data)
+            os.rename(name + '.tmp', name)
+        result, elapsed = timed(keys.reload)
+        print('reload, %d files replaced: %.2fs, %d ids changed' % (
+            len(changed), elapsed, len(result)))
+
+        entries = [keys.get(keys._key_id(name)) for name in names[:1000]]
+        key_ids = [(entry.key_id, entry.family) for entry in entries]
+        fingerprints = [(entry.fingerprint, entry.family)
+                        for entry in entries]
+        for label, lookups in (('keyId', key_ids),
+                               ('fingerprint', fingerprints)):
+            elapsed = min(timeit.repeat(
+                lambda: [keys(key_id, family) for key_id, family in lookups],
+                number=100, repeat=3))
+            print('lookup by %-12s %6.0f ns' % (
+                label + ':', elapsed / (100 * len(lookups)) * 1e9))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
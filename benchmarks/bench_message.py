@@ -0,0 +1,92 @@
+"""
+Compare building signing strings with the 1.3.0 generate_message() and a
+precompiled MessageBuilder, for 1, 5 and 20 signed headers.
+
+    python -m benchmarks.bench_message [--number N]
+"""
+import argparse
+import timeit
+
+from httpsig.utils import CaseInsensitiveDict, MessageBuilder
+
+
+def legacy_generate_message(required_headers, headers, host=None,
+                            method=None, path=None):
+    """
+    generate_message() as shipped in httpsig 1.3.0, for comparison.
+    """
+    headers = CaseInsensitiveDict(headers)
+
+    if not required_headers:
+        required_headers = ['date']
+
+    signable_list = []
+    for h in required_headers:
+        h = h.lower()
+        if h == '(request-target)':
+            if not method or not path:
+                raise Exception('method and path arguments required when ' +
+                                'using "(request-target)"')
+            signable_list.append('%s: %s %s' % (h, method.lower(), path))
+        elif h == 'host':
+            if not host:
+                if 'host' in headers:
+                    host = headers[h]
+                else:
+                    raise Exception('missing required header "%s"' % h)
+            signable_list.append('%s: %s' % (h, host))
+        elif h == 'date':
+            signable_list.append('%s: %s' % (h, headers[h]))
+        else:
+            if h not in headers:
+                raise Exception('missing required header "%s"' % h)
+            signable_list.append('%s: %s' % (h, headers[h]))
+
+    return '\n'.join(signable_list).encode("ascii")
+
+
+def make_case(count):
+    """
+    Return the signed header names and a header dict for `count` headers,
+        starting with (request-target), host and date.
+    """
+    names = ['(request-target)', 'Host', 'Date']
+    names += ['X-Header-%d' % i for i in range(count - len(names))]
+    names = names[:count]
+    headers = {'Host': 'example.com',
+               'Date': 'Thu, 05 Jan 2014 21:31:40 GMT',
+               'Content-Type': 'application/json'}
+    headers.update(('X-Header-%d' % i, 'value %d' % i) for i in range(20))
+    return names, headers
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    print('%-8s %-14s %12s %8s' % ('headers', 'builder', 'us/call',
+                                   'speedup'))
+    for count in (1, 5, 20):
+        names, headers = make_case(count)
+        kwargs = {'method': 'POST', 'path': '/foo?param=value'}
+        builder = MessageBuilder(names)
+        # HeaderSigner and the verifiers already hold a case-insensitive
+        # copy, which the builder uses as is.
+        prepared = CaseInsensitiveDict(headers)
+        assert (builder.build(prepared, **kwargs) ==
+                legacy_generate_message(names, headers, **kwargs))
+
+        legacy = min(timeit.repeat(
+            lambda: legacy_generate_message(names, headers, **kwargs),
+            number=args.number, repeat=3))
+        compiled = min(timeit.repeat(
+            lambda: builder.build(prepared, **kwargs),
+            number=args.number, repeat=3))
+        for name, elapsed in (('legacy', legacy), ('compiled', compiled)):
+            print('%-8d %-14s %12.2f %8.2f' % (
+                count, name, elapsed / args.number * 1e6, legacy / elapsed))
+
+
+if __name__ == '__main__':
+    main()
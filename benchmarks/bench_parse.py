@@ -0,0 +1,52 @@
+"""
+Compare parse_authorization_header() with parse_authorization_params() on
+realistic Authorization header values.
+
+    python -m benchmarks.bench_parse [--number N]
+"""
+import argparse
+import timeit
+
+from httpsig.utils import (parse_authorization_header,
+                           parse_authorization_params)
+
+HEADERS = {
+    'hmac, date only': (
+        'Signature keyId="Test",algorithm="hmac-sha256",'
+        'signature="uzvJuyRhtaHwByIHcbK5XSK3ryw/h+ZVEPyf0qKyXZs="'),
+    'rsa, 6 headers': (
+        'Signature keyId="Test",algorithm="rsa-sha256",'
+        'headers="(request-target) host date content-type digest '
+        'content-length",signature="Ef7MlxLXoBovhil3AlyjtBwAL9g4TN3tibLj7uu'
+        'NB3CROat/9KaeQ4hW2NiJ+pZ6HQEOx9vYZAyi+7cmIkmJszJCut5kQLAwuX+Ms/mUF'
+        'vpKlSo9StS2bMXDBNjOh4Auj774GFj4gwjS+3NhFeoqyr/MuN6HsEnkvn6zdgfE2i0='
+        '"'),
+    'created/expires': (
+        'Signature keyId="rsa-key-1",algorithm="hs2019",created=1402170695,'
+        'expires=1402170995,headers="(request-target) (created) (expires) '
+        'host date digest content-length",signature="Base64(RSA-SHA512('
+        'signing string))"'),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--number', type=int, default=20000)
+    args = parser.parse_args()
+
+    print('%-18s %-8s %10s %8s' % ('header', 'parser', 'us/call', 'speedup'))
+    for name, header in sorted(HEADERS.items()):
+        legacy = min(timeit.repeat(
+            lambda: parse_authorization_header(header),
+            number=args.number, repeat=3))
+        fast = min(timeit.repeat(
+            lambda: parse_authorization_params(header),
+            number=args.number, repeat=3))
+        for parser_name, elapsed in (('legacy', legacy), ('params', fast)):
+            print('%-18s %-8s %10.2f %8.2f' % (
+                name, parser_name, elapsed / args.number * 1e6,
+                legacy / elapsed))
+
+
+if __name__ == '__main__':
+    main()
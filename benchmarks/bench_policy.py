@@ -0,0 +1,124 @@
+"""
+Measure the pre-verification checks of httpsig.policy on attack traffic:
+requests forged against an RSA key, each failing one check, verified with a
+strict Policy and with one that only checks the required headers (as
+verifiers did before), which leaves them to the RSA check. Valid requests
+show the cost of the checks when they pass.
+
+    python -m benchmarks.bench_policy [--number N]
+"""
+import argparse
+import base64
+import timeit
+
+from httpsig import clock
+from httpsig.keystore import KeyStore, StaticKeyLoader
+from httpsig.policy import HEADERS, Policy
+from httpsig.sign import HeaderSigner
+from httpsig.verify import RequestVerifier
+
+from benchmarks.common import load_keys
+
+NOW = 1388957500
+SIGNED = ['(request-target)', '(created)', '(expires)', 'date']
+
+
+class HeadersOnly(Policy):
+    """
+    A Policy only checking that the required headers are signed.
+    """
+    def check(self, params, auth_headers, headers=None, now=None):
+        missing = self.required_headers.difference(auth_headers)
+        if missing:
+            raise self.reject(HEADERS, 'missing headers')
+
+
+def requests():
+    """
+    Return (name, headers) for a valid request and for forged ones.
+    """
+    private, _ = load_keys('rsa-sha256')
+    signer = HeaderSigner('client', private, algorithm='rsa-sha256',
+                          headers=SIGNED, expires_in=60)
+    date = clock.get_clock().http_date(NOW)
+
+    def sign(now=NOW, key_id=None):
+        previous = clock.set_clock(clock.FakeClock(now))
+        try:
+            headers = signer.sign({'Date': clock.get_clock().http_date()},
+                                  method='GET', path='/')
+        finally:
+            clock.set_clock(previous)
+        if key_id is not None:
+            headers['authorization'] = headers['authorization'].replace(
+                'keyId="client"', 'keyId="%s"' % key_id)
+        return headers
+
+    valid = sign()
+    value = valid['authorization']
+    signature = value.split('signature="')[1].split('"')[0]
+    short = base64.b64encode(base64.b64decode(signature)[:-1])
+    forged = []
+    for name, value in (
+            ('algorithm', value.replace('rsa-sha256', 'rsa-sha1')),
+            ('signature', value.replace(signature, short.decode('ascii')))):
+        headers = dict(valid)
+        headers['authorization'] = value
+        forged.append((name, headers))
+    # Signed 400s ago: still within max_age, but expired after 60s.
+    expired = sign(NOW - 400)
+    expired['date'] = date
+    stale = dict(valid)
+    stale['date'] = clock.get_clock().http_date(NOW - 3600)
+    return [('valid', valid),
+            ('key_id', sign(key_id='attacker'))] + forged + [
+            ('created', sign(NOW + 3600)),
+            ('expires', expired),
+            ('date', stale)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args()
+
+    _, public = load_keys('rsa-sha256')
+    previous = clock.set_clock(clock.FakeClock(NOW))
+    try:
+        cases = requests()
+        # Both verifiers know the attacker's keyId, so the loose one gets
+        # as far as the RSA check.
+        loader = StaticKeyLoader({'client': public, 'attacker': public})
+        strict = RequestVerifier(
+            key_store=KeyStore(loader),
+            policy=Policy(SIGNED, algorithms=['rsa-sha256'],
+                          key_ids=['client'], max_age=300))
+        loose = RequestVerifier(key_store=KeyStore(loader),
+                                policy=HeadersOnly(SIGNED))
+
+        def run(verifier, headers):
+            try:
+                return verifier.verify(headers, method='GET', path='/')
+            except Exception:
+                return False
+
+        print('%-10s %8s %12s %12s %8s' % (
+            'request', 'result', 'headers us', 'strict us', 'speedup'))
+        for name, headers in cases:
+            result = run(strict, headers)
+            times = []
+            for verifier in (loose, strict):
+                elapsed = min(timeit.repeat(
+                    lambda: run(verifier, headers),
+                    number=args.number, repeat=5))
+                times.append(elapsed / args.number * 1e6)
+            print('%-10s %8s %12.1f %12.1f %7.1fx' % (
+                name, result, times[0], times[1], times[0] / times[1]))
+        print('rejections: %s' % ', '.join(
+            '%s=%d' % item for item in sorted(strict.rejections.items())))
+    finally:
+        clock.set_clock(previous)
+
+
+if __name__ == '__main__':
+    main()
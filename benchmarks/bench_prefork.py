@@ -0,0 +1,128 @@
+"""
+Measure forked workers with and without keys preloaded in the master
+(httpsig.prefork): the time each worker takes to have every key ready, and
+its resident and private (unshared) memory afterwards.
+
+Each mode runs in a new master process, which loads a KeyDirectory of
+random keys (see bench_keydir), optionally preloads them, then forks the
+workers. Workers run a garbage collection before measuring, as a busy
+worker would. Linux only.
+
+    python -m benchmarks.bench_prefork [--keys N] [--workers N]
+"""
+import argparse
+import gc
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from httpsig import prefork
+from httpsig.keydir import KeyDirectory
+from httpsig.keystore import KeyStore
+
+from benchmarks.bench_keydir import write_keys
+
+MODES = ('lazy', 'preload', 'preload+freeze')
+
+
+def memory():
+    """
+    Return (RSS, private memory) of this process in bytes.
+    """
+    values = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                values[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return values['Rss'], values['Private_Clean'] + values['Private_Dirty']
+
+
+def worker(store, pairs, output):
+    start = time.perf_counter()
+    for key_id, algorithm in pairs:
+        store.get(key_id, algorithm)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    rss, private = memory()
+    os.write(output, (json.dumps(
+        {'warm': elapsed, 'rss': rss, 'private': private}) + '\n').encode())
+
+
+def master(path, mode, workers, output):
+    keys = KeyDirectory(path)
+    pairs = list(keys.key_pairs())
+    store = KeyStore(keys, maxsize=2 * len(pairs))
+    start = time.perf_counter()
+    if mode != 'lazy':
+        prefork.preload(store, pairs,
+                        freeze_objects=mode == 'preload+freeze')
+    preload = time.perf_counter() - start
+
+    read, write = os.pipe()
+    pids = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            os.close(read)
+            worker(store, pairs, write)
+            os._exit(0)
+        pids.append(pid)
+    os.close(write)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    with os.fdopen(read) as f:
+        results = [json.loads(line) for line in f]
+    os.write(output, (json.dumps(
+        {'preload': preload, 'workers': results}) + '\n').encode())
+
+
+def run(path, mode, workers):
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        try:
+            master(path, mode, workers, write)
+        finally:
+            os._exit(0)
+    os.close(write)
+    with os.fdopen(read) as f:
+        result = json.loads(f.read())
+    os.waitpid(pid, 0)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--keys', type=int, default=20000)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rsa-fraction', type=float, default=0.2)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+    try:
+        write_keys(path, args.keys, args.rsa_fraction)
+        print('%d keys, %d workers' % (args.keys, args.workers))
+        print('%-15s %10s %10s %10s %12s %14s' % (
+            'mode', 'preload s', 'warm s', 'RSS MB', 'private MB',
+            'all private MB'))
+        for mode in MODES:
+            result = run(path, mode, args.workers)
+            workers = result['workers']
+
+            def mean(name):
+                return sum(w[name] for w in workers) / len(workers)
+
+            print('%-15s %10.2f %10.3f %10.1f %12.1f %14.1f' % (
+                mode, result['preload'], mean('warm'),
+                mean('rss') / 2.0 ** 20, mean('private') / 2.0 ** 20,
+                sum(w['private'] for w in workers) / 2.0 ** 20))
+    finally:
+        shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Measure the replay guard (httpsig.replay) for several windows: the memory of
+its Bloom filters, and the cost of recording new signatures and of
+rejecting replayed ones, in process memory and in shared memory. For
+comparison, the memory a set of every signature seen during the window
+would need is estimated from a sample.
+
+    python -m benchmarks.bench_replay [--rate N] [--windows 60,300,900]
+        [--max-skew S]
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+from httpsig.replay import Replayed, ReplayGuard
+
+NOW = 1388957500
+
+
+def set_memory(count, sample=100000):
+    """
+    Return the bytes a set of `count` 32-byte signatures takes, estimated
+        from `sample` of them.
+    """
+    tracemalloc.start()
+    seen = set(os.urandom(32) for _ in range(sample))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del seen
+    return float(size) / sample * count
+
+
+def per_call(func, items):
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    return (time.perf_counter() - start) / len(items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--rate', type=int, default=50000,
+                        help='signatures per second the filters are sized '
+                             'for')
+    parser.add_argument('--windows', default='60,300,900')
+    parser.add_argument('--error-rate', type=float, default=0.001)
+    parser.add_argument('--buckets', type=int, default=10)
+    parser.add_argument('--max-skew', type=int, default=30)
+    parser.add_argument('--number', type=int, default=100000)
+    args = parser.parse_args()
+
+    signatures = [os.urandom(256) for _ in range(args.number)]
+    print('%d signatures/s, error rate %g, %d buckets, max skew %ds, '
+          '%d calls' % (args.rate, args.error_rate, args.buckets,
+                        args.max_skew, args.number))
+    print('%-8s %-7s %8s %6s %10s %10s %10s %12s' % (
+        'window', 'store', 'slots', 'hashes', 'memory MB', 'add us',
+        'replay us', 'set MB'))
+    for window in [int(w) for w in args.windows.split(',')]:
+        for shared in (False, True):
+            guard = ReplayGuard(window, args.rate, args.error_rate,
+                                args.buckets, args.max_skew, shared=shared)
+            store = guard.store
+
+            def add(signature):
+                guard.add(signature, NOW, NOW)
+
+            def replay(signature):
+                try:
+                    guard.add(signature, NOW, NOW)
+                except Replayed:
+                    pass
+                else:
+                    sys.exit('replay not detected')
+
+            added = per_call(add, signatures)
+            replayed = per_call(replay, signatures)
+            print('%-8d %-7s %8d %6d %10.1f %10.2f %10.2f %12s' % (
+                window, 'shared' if shared else 'local', store.slots,
+                store.hashes, store.memory / 2.0 ** 20, added * 1e6,
+                replayed * 1e6,
+                '' if shared else '%.0f' % (
+                    set_memory((window + args.max_skew) * args.rate) /
+                    2.0 ** 20)))
+            del guard, store
+
+
+if __name__ == '__main__':
+    main()
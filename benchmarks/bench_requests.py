@@ -0,0 +1,96 @@
+"""
+Measure the per-request cost of signing with HTTPSignatureAuth, against the
+1.3.0 implementation (urlparse, full header copy and update), on its own and
+on a keep-alive requests Session talking to a local HTTP server.
+
+    python -m benchmarks.bench_requests [--requests N] [--algorithm ALG]
+"""
+import argparse
+import threading
+import time
+import timeit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import requests
+
+from benchmarks.common import load_keys
+from httpsig.requests_auth import HTTPSignatureAuth
+
+HEADERS = ['(request-target)', 'host', 'date']
+
+
+class LegacyAuth(HTTPSignatureAuth):
+    """
+    HTTPSignatureAuth.__call__ as shipped in httpsig 1.3.0.
+    """
+    def __call__(self, r):
+        headers = self.header_signer.sign(
+                r.headers,
+                host=urlparse(r.url).netloc if self.uses_host else None,
+                method=r.method,
+                path=r.path_url)
+        r.headers.update(headers)
+        return r
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        # One write for the whole response: headers and body sent separately
+        # stall on delayed ACKs.
+        self.wfile.write(b'HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--algorithm', default='hmac-sha256')
+    args = parser.parse_args()
+
+    private, _ = load_keys(args.algorithm)
+    auths = [
+        ('none', None),
+        ('legacy', LegacyAuth('Test', private, args.algorithm, HEADERS)),
+        ('context', HTTPSignatureAuth('Test', private, args.algorithm,
+                                      HEADERS)),
+    ]
+
+    request = requests.Request(
+        'GET', 'http://example.com/api/items?page=2',
+        headers={'Accept': 'application/json',
+                 'User-Agent': 'bench'}).prepare()
+    print('%-8s %12s' % ('auth', 'us/call'))
+    for name, auth in auths[1:]:
+        elapsed = min(timeit.repeat(lambda: auth(request.copy()),
+                                    number=args.requests * 5, repeat=3))
+        print('%-8s %12.2f' % (name, elapsed / (args.requests * 5) * 1e6))
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        url = 'http://127.0.0.1:%d/api/items?page=2' % server.server_port
+        print('%-8s %12s %12s' % ('session', 'requests/s', 'us/request'))
+        for name, auth in auths:
+            with requests.Session() as session:
+                session.auth = auth
+                session.get(url)  # open the keep-alive connection
+                start = time.perf_counter()
+                for _ in range(args.requests):
+                    session.get(url)
+                elapsed = time.perf_counter() - start
+            print('%-8s %12.0f %12.1f' % (
+                name, args.requests / elapsed, elapsed / args.requests * 1e6))
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Compare serial HeaderSigner.sign() with pooled HeaderSigner.sign_many().
+
+    python -m benchmarks.bench_sign_many [--requests N] [--workers N]
+"""
+import argparse
+import multiprocessing
+
+from benchmarks.common import DATE, load_keys, timed
+from httpsig.sign import HeaderSigner
+
+ALGORITHMS = ('rsa-sha256', 'hmac-sha256', 'ed25519')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--workers', type=int,
+                        default=multiprocessing.cpu_count())
+    args = parser.parse_args()
+
+    requests = [({'Host': 'example.com', 'Date': DATE}, 'POST',
+                 '/item/%d' % i) for i in range(args.requests)]
+
+    print('%-12s %-10s %12s %8s' % ('algorithm', 'mode', 'req/s', 'speedup'))
+    for algorithm in ALGORITHMS:
+        signer = HeaderSigner(key_id='Test', secret=load_keys(algorithm)[0],
+                              algorithm=algorithm,
+                              headers=['(request-target)', 'host', 'date'])
+
+        def run_serial():
+            return [signer.sign(headers, method=method, path=path)
+                    for headers, method, path in requests]
+
+        def run_pooled():
+            return list(signer.sign_many(requests, max_workers=args.workers))
+
+        expected, serial = timed(run_serial)
+        results, pooled = timed(run_pooled)
+        assert results == expected
+        print('%-12s %-10s %12.0f %8.2f' % (
+            algorithm, 'serial', len(requests) / serial, 1.0))
+        print('%-12s %-10s %12.0f %8.2f' % (
+            algorithm, 'pool(%d)' % args.workers, len(requests) / pooled,
+            serial / pooled))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Measure the throughput of SignatureMiddleware against per-view glue that
+copies the HTTP_* environ keys into a dict and builds a HeaderVerifier,
+calling the WSGI applications in-process; with --server, also over HTTP
+through a local wsgiref server.
+
+    python -m benchmarks.bench_wsgi [--requests N] [--algorithm ALG]
+        [--extra-headers N] [--server]
+"""
+import argparse
+import threading
+import time
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+from benchmarks.common import DATE, load_keys
+from httpsig.keystore import KeyStore, StaticKeyLoader
+from httpsig.sign import HeaderSigner
+from httpsig.verify import HeaderVerifier, RequestVerifier
+from httpsig.wsgi import SignatureMiddleware, request_target
+
+HEADERS = ['(request-target)', 'host', 'date']
+
+
+def app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [b'ok']
+
+
+def glue_app(public, algorithm):
+    """
+    The hand-rolled verification the middleware replaces.
+    """
+    def glue(environ, start_response):
+        headers = dict((key[5:].replace('_', '-'), value)
+                       for key, value in environ.items()
+                       if key.startswith('HTTP_'))
+        try:
+            ok = HeaderVerifier(
+                headers, public, required_headers=HEADERS,
+                method=environ['REQUEST_METHOD'],
+                path=request_target(environ)).verify()
+        except Exception:
+            ok = False
+        if not ok:
+            start_response('401 Unauthorized', [])
+            return [b'']
+        return app(environ, start_response)
+    return glue
+
+
+def environ_for(signer, extra_headers):
+    signed = signer.sign({'Host': 'example.com', 'Date': DATE},
+                         method='GET', path='/resource?id=1')
+    environ = {'REQUEST_METHOD': 'GET',
+               'PATH_INFO': '/resource',
+               'QUERY_STRING': 'id=1',
+               'SERVER_NAME': 'example.com',
+               'SERVER_PORT': '80',
+               'wsgi.url_scheme': 'http',
+               'HTTP_HOST': 'example.com',
+               'HTTP_DATE': DATE,
+               'HTTP_AUTHORIZATION': signed['authorization']}
+    environ.update(('HTTP_X_PROXY_%d' % i, 'value %d' % i)
+                   for i in range(extra_headers))
+    return environ
+
+
+def in_process(application, environ, requests):
+    statuses = []
+
+    def start_response(status, headers):
+        statuses.append(status)
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        for _ in application(dict(environ), start_response):
+            pass
+    elapsed = time.perf_counter() - start
+    assert all(s.startswith('200') for s in statuses)
+    return requests / elapsed
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def over_http(application, private, algorithm, requests):
+    import requests as http
+    from httpsig.requests_auth import HTTPSignatureAuth
+
+    server = make_server('127.0.0.1', 0, application,
+                         handler_class=QuietHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    try:
+        auth = HTTPSignatureAuth(key_id='Test', secret=private,
+                                 algorithm=algorithm, headers=HEADERS)
+        url = 'http://127.0.0.1:%d/resource?id=1' % server.server_port
+        session = http.Session()
+        start = time.perf_counter()
+        for _ in range(requests):
+            assert session.get(url, auth=auth).status_code == 200
+        return requests / (time.perf_counter() - start)
+    finally:
+        server.shutdown()
+        server.server_close()
+        thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--algorithm', default='hmac-sha256')
+    parser.add_argument('--extra-headers', type=int, default=30)
+    parser.add_argument('--server', action='store_true')
+    args = parser.parse_args()
+
+    private, public = load_keys(args.algorithm)
+    signer = HeaderSigner('Test', private, algorithm=args.algorithm,
+                          headers=HEADERS)
+    verifier = RequestVerifier(
+        key_store=KeyStore(StaticKeyLoader({'Test': public})),
+        required_headers=HEADERS)
+    middleware = SignatureMiddleware(app, verifier)
+    glue = glue_app(public, args.algorithm)
+    environ = environ_for(signer, args.extra_headers)
+
+    print('%-12s %-10s %12s' % ('app', 'transport', 'requests/s'))
+    for name, application in (('glue', glue), ('middleware', middleware)):
+        print('%-12s %-10s %12.0f' % (
+            name, 'in-process',
+            in_process(application, environ, args.requests)))
+        if args.server:
+            print('%-12s %-10s %12.0f' % (
+                name, 'http',
+                over_http(application, private, args.algorithm,
+                          args.requests // 20)))
+    print(middleware.metrics.totals())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+"""
+Helpers shared by the benchmarks.
+"""
+import os
+import time
+
+TESTS = os.path.join(os.path.dirname(__file__), '..', 'httpsig', 'tests')
+DATE = 'Thu, 05 Jan 2014 21:31:40 GMT'
+
+
+def load_keys(algorithm):
+    """
+    Return (private, public) test keys for `algorithm`.
+    """
+    if algorithm.startswith('rsa'):
+        with open(os.path.join(TESTS, 'rsa_private.pem'), 'rb') as f:
+            private = f.read()
+        with open(os.path.join(TESTS, 'rsa_public.pem'), 'rb') as f:
+            public = f.read()
+        return private, public
+    if algorithm == 'ed25519':
+        with open(os.path.join(TESTS, 'ed25519_private.txt')) as f:
+            private = f.read()
+        with open(os.path.join(TESTS, 'ed25519_public.txt')) as f:
+            public = f.read()
+        return private, public
+    return b'secret', b'secret'
+
+
+def timed(func):
+    """
+    Return the result of `func()` and the seconds it took.
+    """
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
@@ -0,0 +1,61 @@
+"""
+Compare two benchmark runs written by ``python -m benchmarks``.
+
+    python -m benchmarks.compare old.json new.json [--threshold PERCENT]
+
+Exits with status 1 if any benchmark got slower by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+
+def compare(old, new, threshold):
+    """
+    Return (rows, regressions) comparing the `min_us` of benchmarks present
+        in both runs; a row is (id, old us, new us, change in percent).
+    """
+    old_results = dict((r['id'], r) for r in old['results'])
+    rows = []
+    regressions = []
+    for result in new['results']:
+        before = old_results.get(result['id'])
+        if before is None:
+            continue
+        change = (result['min_us'] / before['min_us'] - 1) * 100
+        row = (result['id'], before['min_us'], result['min_us'], change)
+        rows.append(row)
+        if change > threshold:
+            regressions.append(row)
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.compare', description=__doc__.strip())
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='slowdown in percent reported as a regression '
+                        '(default: 10)')
+    args = parser.parse_args(argv)
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    rows, regressions = compare(old, new, args.threshold)
+    for ident, before, after, change in rows:
+        flag = '  REGRESSION' if change > args.threshold else ''
+        print('%-60s %10.2f %10.2f %+8.1f%%%s' % (
+            ident, before, after, change, flag))
+    if regressions:
+        print('\n%d benchmark(s) slower by more than %g%%' % (
+            len(regressions), args.threshold))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
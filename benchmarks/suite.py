@@ -0,0 +1,216 @@
+"""
+The benchmark suite: sign, verify, message building and header parsing for
+every algorithm in httpsig.utils.ALGORITHMS, several RSA key sizes and
+several signed-header counts.
+"""
+import platform
+import sys
+import time
+import timeit
+
+from Crypto.PublicKey import RSA
+
+import httpsig
+from httpsig import backends
+from httpsig.sign import HeaderSigner, Signer, new_signer
+from httpsig.utils import (ALGORITHMS, CaseInsensitiveDict, HttpSigException,
+                           generate_message, parse_authorization_header,
+                           parse_authorization_params)
+from httpsig.verify import (HeaderVerifier, RequestVerifier, Verifier,
+                            new_verifier)
+
+from benchmarks.common import DATE, load_keys
+
+RSA_KEY_SIZES = (1024, 2048, 4096)
+HEADER_COUNTS = (1, 5, 20)
+MESSAGE = b'date: ' + DATE.encode('ascii')
+
+
+def header_case(count):
+    """
+    Return `count` signed header names and the request headers to sign.
+    """
+    names = ['date', '(request-target)', 'host']
+    names += ['x-header-%d' % i for i in range(count - len(names))]
+    names = names[:count]
+    headers = {'Host': 'example.com', 'Date': DATE}
+    headers.update(('X-Header-%d' % i, 'value %d' % i) for i in range(20))
+    return names, headers
+
+
+def key_variants(quick=False):
+    """
+    Yield (algorithm, key size, private key, public key) for every algorithm,
+        with RSA algorithms at every size in RSA_KEY_SIZES.
+    """
+    rsa_keys = {}
+    for size in RSA_KEY_SIZES[:1] if quick else RSA_KEY_SIZES:
+        if size == 1024:
+            rsa_keys[size] = load_keys('rsa')
+        else:
+            key = RSA.generate(size)
+            rsa_keys[size] = (key.export_key(),
+                              key.publickey().export_key())
+
+    for algorithm in sorted(ALGORITHMS):
+        if algorithm.startswith('rsa'):
+            for size, (private, public) in sorted(rsa_keys.items()):
+                yield algorithm, size, private, public
+        elif algorithm == 'ed25519':
+            yield (algorithm, 256) + load_keys(algorithm)
+        else:
+            yield (algorithm, None) + load_keys(algorithm)
+
+
+def backend_variants(algorithm, private, public):
+    """
+    Yield (backend name, Signer, Verifier) for every backend able to handle
+        `algorithm`.
+    """
+    for name in sorted(backends.BACKENDS):
+        if name == 'cryptography' and not backends.cryptography_available():
+            continue
+        try:
+            signer = Signer(private, algorithm=algorithm, backend=name)
+            verifier = Verifier(public, algorithm=algorithm, backend=name)
+        except HttpSigException:
+            continue
+        yield name, signer, verifier
+
+
+def cases(quick=False):
+    """
+    Yield (name, params, func) for every benchmark.
+    """
+    counts = HEADER_COUNTS[:2] if quick else HEADER_COUNTS
+
+    for algorithm, size, private, public in key_variants(quick):
+        key = {'algorithm': algorithm, 'key_size': size}
+
+        signer = Signer(private, algorithm=algorithm)
+        signature = signer.sign(MESSAGE)
+        verifier = Verifier(public, algorithm=algorithm)
+        assert verifier._verify(MESSAGE, signature)
+
+        fast_signer = new_signer(private, algorithm=algorithm)
+        fast_verifier = new_verifier(public, algorithm=algorithm)
+
+        yield 'Signer()', key, lambda: Signer(private, algorithm=algorithm)
+        yield 'new_signer().sign', key, lambda: fast_signer.sign(MESSAGE)
+        yield 'new_verifier().verify', key, (
+            lambda: fast_verifier.verify(MESSAGE, signature))
+        yield 'Signer.sign', key, lambda: signer.sign(MESSAGE)
+        yield 'Verifier._verify', key, (
+            lambda: verifier._verify(MESSAGE, signature))
+
+        for backend, signer, verifier in backend_variants(
+                algorithm, private, public):
+            params = dict(key, backend=backend)
+            yield 'Signer.sign', params, (
+                lambda signer=signer: signer.sign(MESSAGE))
+            yield 'Verifier._verify', params, (
+                lambda verifier=verifier: verifier._verify(MESSAGE, signature))
+
+        for count in counts:
+            names, headers = header_case(count)
+            params = dict(key, headers=count)
+            args = {'method': 'POST', 'path': '/foo?param=value'}
+
+            header_signer = HeaderSigner('Test', private, algorithm=algorithm,
+                                         headers=names)
+            signed = header_signer.sign(headers, **args)
+            request_verifier = RequestVerifier(
+                secret=public, required_headers=names)
+            assert request_verifier.verify(signed, **args)
+
+            raw_headers = CaseInsensitiveDict(dict(
+                (name, value.encode('ascii'))
+                for name, value in headers.items()))
+            raw_args = {'method': b'POST', 'path': b'/foo?param=value'}
+
+            yield 'HeaderSigner.sign', params, (
+                lambda: header_signer.sign(headers, **args))
+            yield 'HeaderSigner.sign_value', params, (
+                lambda: header_signer.sign_value(raw_headers, **raw_args))
+            yield 'HeaderVerifier()', params, (
+                lambda: HeaderVerifier(signed, public, **args))
+            yield 'HeaderVerifier.verify', params, (
+                lambda: HeaderVerifier(signed, public, **args).verify())
+            yield 'RequestVerifier.verify', params, (
+                lambda: request_verifier.verify(signed, **args))
+
+    for count in counts:
+        names, headers = header_case(count)
+        params = {'headers': count}
+        args = {'method': 'POST', 'path': '/foo?param=value'}
+        authorization = HeaderSigner(
+            'Test', b'secret', algorithm='hmac-sha256', headers=names).sign(
+                headers, **args)['authorization']
+
+        yield 'generate_message', params, (
+            lambda: generate_message(names, headers, **args))
+        yield 'parse_authorization_header', params, (
+            lambda: parse_authorization_header(authorization))
+        yield 'parse_authorization_params', params, (
+            lambda: parse_authorization_params(authorization))
+
+
+def measure(func, min_time=0.2, repeat=5):
+    """
+    Time `func`, returning statistics in microseconds per call.
+    """
+    timer = timeit.Timer(func)
+    # Calibrate so one round takes about `min_time` seconds.
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time / 10:
+            break
+        number *= 10
+    number = max(1, int(number * min_time / elapsed))
+    times = [t / number * 1e6 for t in timer.repeat(repeat, number)]
+    mean = sum(times) / len(times)
+    stdev = (sum((t - mean) ** 2 for t in times) / len(times)) ** 0.5
+    return {'min_us': min(times),
+            'mean_us': mean,
+            'stdev_us': stdev,
+            'ops_per_sec': 1e6 / min(times),
+            'number': number,
+            'repeat': repeat}
+
+
+def case_id(name, params):
+    """
+    Return a stable identifier for a benchmark, used to match runs.
+    """
+    return ' '.join([name] + ['%s=%s' % item for item in sorted(
+        params.items()) if item[1] is not None])
+
+
+def run(quick=False, match=None, min_time=0.2, repeat=5, log=None):
+    """
+    Run the suite and return the results as a JSON-serialisable dict.
+    """
+    results = []
+    for name, params, func in cases(quick):
+        ident = case_id(name, params)
+        if match and match not in ident:
+            continue
+        result = dict(measure(func, min_time, repeat), id=ident, name=name,
+                      params=params)
+        results.append(result)
+        if log:
+            log('%-60s %12.2f us %12.0f ops/s' % (
+                ident, result['min_us'], result['ops_per_sec']))
+
+    return {
+        'meta': {
+            'httpsig': getattr(httpsig, '__version__', None),
+            'python': sys.version.split()[0],
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        },
+        'results': results,
+    }
@@ -1,12 +1,49 @@
-from pkg_resources import get_distribution, DistributionNotFound
+import sys
 
 from .sign import Signer, HeaderSigner
-from .verify import Verifier, HeaderVerifier
+from .verify import Verifier, HeaderVerifier, RequestVerifier
+from .keystore import KeyStore
+
+
+def _installed_version():
+    """
+    Return the version of the installed distribution, or None.
+    """
+    try:
+        from importlib.metadata import version, PackageNotFoundError
+    except ImportError:
+        # Python < 3.8
+        from pkg_resources import get_distribution, DistributionNotFound
+        try:
+            return get_distribution(__name__).version
+        except DistributionNotFound:
+            return None
+    try:
+        return version(__name__)
+    except PackageNotFoundError:
+        return None
+
 
 try:
-    __version__ = get_distribution(__name__).version
-except DistributionNotFound:
-    # package is not installed
-    pass
+    # Written by setuptools_scm when the package is built.
+    from ._version import version as __version__
+except ImportError:
+    if sys.version_info >= (3, 7):
+        def __getattr__(name):
+            # Looked up on first use, as importlib.metadata is slow to
+            # import.
+            if name == '__version__':
+                version = _installed_version()
+                if version is not None:
+                    globals()['__version__'] = version
+                    return version
+            raise AttributeError(
+                "module %r has no attribute %r" % (__name__, name))
+    else:
+        __version__ = _installed_version()
+        if __version__ is None:
+            # package is not installed
+            del __version__
 
-__all__ = (Signer, HeaderSigner, Verifier, HeaderVerifier)
+__all__ = ('Signer', 'HeaderSigner', 'Verifier', 'HeaderVerifier',
+           'RequestVerifier', 'KeyStore')
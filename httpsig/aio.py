@@ -0,0 +1,171 @@
+"""
+Module to verify HTTP signatures from asyncio code.
+
+Header parsing runs on the event loop; key parsing and RSA/ed25519
+signature checks run in an executor so they do not block it.
+"""
+import asyncio
+import functools
+
+from .keystore import KeyStore
+from .verify import RequestVerifier
+
+
+class AsyncVerifier(object):
+    """
+    Verifies HTTP signatures of many requests from coroutines.
+
+    :arg key_resolver:     a coroutine function `key_resolver(key_id,
+        algorithm)` returning the HMAC secret or RSA/ed25519 *public* key for
+        `key_id`, or None if the keyId is unknown.
+    :arg required_headers: Optional. A list of headers required to be present
+        to validate, even if the signature is otherwise valid. Defaults to
+        ['date'].
+    :arg sign_header:      Optional. The header where the signature is.
+        Default is 'authorization'.
+    :arg executor:         Optional. The executor running key parsing and
+        signature checks. Defaults to the loop's default executor.
+    :arg max_concurrency:  Optional. The most verifications allowed in the
+        executor at once; further calls wait on the loop. Default is 64.
+    :arg key_store:        Optional. The KeyStore caching parsed keys. Its
+        loader is not used; keys come from :arg:key_resolver. Give it a
+        `stale_ttl` to have expired keys served while they are resolved
+        again in the background.
+    :arg inline:           Optional. The algorithm families (e.g. 'hmac')
+        whose signatures are checked on the loop, because they take less
+        time than a round trip to the executor. Defaults to ['hmac'].
+    :arg policy:           Optional. The httpsig.policy.Policy checked by
+        parse(), before any key is resolved. Replaces
+        :arg:required_headers.
+    :arg replay_guard:     Optional. The httpsig.replay.ReplayGuard
+        recording valid signatures, to reject them when replayed.
+
+    Concurrent misses for one keyId and algorithm are coalesced: a single
+        task resolves and parses the key, the others await it.
+    """
+    def __init__(self, key_resolver, required_headers=None,
+                 sign_header='authorization', executor=None,
+                 max_concurrency=64, key_store=None, inline=('hmac',),
+                 policy=None, replay_guard=None):
+        self.key_resolver = key_resolver
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self.inline = frozenset(inline)
+        self.key_store = key_store if key_store is not None else KeyStore()
+        self._verifier = RequestVerifier(
+                required_headers=required_headers, sign_header=sign_header,
+                key_store=self.key_store, policy=policy,
+                replay_guard=replay_guard)
+        self.policy = self._verifier.policy
+        self.required_headers = self._verifier.required_headers
+        # (loop, semaphore), see semaphore.
+        self._semaphore = None
+        # Key resolutions in progress, by (keyId, algorithm).
+        self._flights = {}
+
+    @property
+    def semaphore(self):
+        """
+        The semaphore bounding executor jobs on the running loop.
+        """
+        # A semaphore binds to the loop it is first awaited on: one is
+        # created for each loop the verifier is used from in turn, e.g.
+        # by successive asyncio.run() calls.
+        loop = asyncio.get_running_loop()
+        current = self._semaphore
+        if current is None or current[0] is not loop:
+            current = self._semaphore = (
+                loop, asyncio.Semaphore(self.max_concurrency))
+        return current[1]
+
+    async def _run(self, func, *args):
+        async with self.semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                    self.executor, functools.partial(func, *args))
+
+    async def get_key(self, key_id, algorithm):
+        """
+        Return the parsed key for `key_id`, resolving and parsing it on a
+            cache miss.
+
+        Raises HttpSigException if the keyId is unknown.
+        """
+        key, stale = self.key_store.lookup(key_id, algorithm)
+        if key is None:
+            return await self.load_key(key_id, algorithm)
+        if stale and (key_id, algorithm) not in self._flights:
+            asyncio.ensure_future(self._refresh(key_id, algorithm))
+        return key
+
+    def load_key(self, key_id, algorithm):
+        """
+        Resolve and parse the key for `key_id`, or join the resolution
+            already in progress. Returns an awaitable.
+
+        Cancelling one caller does not cancel the resolution the others
+            await.
+        """
+        flight_key = (key_id, algorithm)
+        flight = self._flights.get(flight_key)
+        if (flight is None or
+                flight.get_loop() is not asyncio.get_running_loop()):
+            flight = asyncio.ensure_future(self._resolve(key_id, algorithm))
+            self._flights[flight_key] = flight
+            flight.add_done_callback(
+                    lambda _: self._flights.pop(flight_key, None))
+        else:
+            self.key_store.coalesced += 1
+        return asyncio.shield(flight)
+
+    async def _resolve(self, key_id, algorithm):
+        secret = await self.key_resolver(key_id, algorithm)
+        return await self._run(self.key_store.put, key_id, algorithm, secret)
+
+    async def _refresh(self, key_id, algorithm):
+        try:
+            await self.load_key(key_id, algorithm)
+        except Exception:
+            # Counted like KeyStore.refresh(); the stale key is served
+            # until it expires.
+            self.key_store.refresh_errors += 1
+
+    def parse(self, headers):
+        """
+        Parse the signature of a request, on the loop.
+
+        Returns (headers, SignatureParams, signed header names), to be passed
+            to verify_parsed().
+        Raises httpsig.policy.Rejected if a check of the policy fails, e.g.
+            a required header is not found in the signature.
+        """
+        return self._verifier._parse(headers)
+
+    async def verify_parsed(self, parsed, method=None, path=None, host=None):
+        """
+        Verify a request parsed by parse(). Returns True or False.
+
+        Raises httpsig.replay.Replayed if the replay guard has seen the valid
+            signature before.
+        """
+        headers, params, auth_headers = parsed
+        key = await self.get_key(params.key_id, params.algorithm)
+        if key.sign_algorithm in self.inline:
+            return self._verifier._verify_parsed(
+                    key, headers, params, auth_headers, method, path, host)
+        return await self._run(
+                self._verifier._verify_parsed, key, headers, params,
+                auth_headers, method, path, host)
+
+    async def verify(self, headers, method=None, path=None, host=None):
+        """
+        Verify the signature of one request.
+
+        Takes the same arguments as RequestVerifier.verify().
+
+        Raises httpsig.policy.Rejected if a check of the policy fails, and
+            httpsig.replay.Replayed for a replayed signature.
+        Returns True or False.
+        """
+        return await self.verify_parsed(
+                self.parse(headers), method, path, host)
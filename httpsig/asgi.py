@@ -0,0 +1,153 @@
+"""
+ASGI middleware verifying the HTTP signature of every request before the
+application sees it, and the Digest header of its body as it is received.
+"""
+import time
+from urllib.parse import quote
+
+from . import metrics as _metrics
+from .digest import DigestVerifier
+from .utils import RawHeaders
+
+# Characters left as is when re-quoting the path (RFC 3986 pchar and '/').
+_PATH_SAFE = "/:@!$&'()*+,;=-._~"
+
+
+def request_target(scope):
+    """
+    Return the path and query of a request as sent, for '(request-target)',
+        as bytes. `raw_path` is used when the server provides it.
+    """
+    path = scope.get('raw_path')
+    if not path:
+        path = quote(scope.get('root_path', '') + scope['path'],
+                     safe=_PATH_SAFE).encode('ascii')
+    query = scope.get('query_string')
+    return path + b'?' + query if query else path
+
+
+def request_host(scope):
+    """
+    Return the host and port the request was sent to, for requests without
+        a Host header.
+    """
+    host, port = scope['server']
+    default = 443 if scope.get('scheme') in ('https', 'wss') else 80
+    return host if port == default else '%s:%d' % (host, port)
+
+
+class SignatureMiddleware(object):
+    """
+    Rejects requests without a valid HTTP signature with 401 Unauthorized;
+        other requests are passed to `app` with the keyId that signed them in
+        scope['httpsig.key_id']. Non-HTTP scopes are passed through.
+
+    Headers are read from scope['headers'] as bytes, without copying them.
+        When 'digest' is signed, the body is hashed as the application
+        receives it; if it does not match the Digest header, the application
+        gets an 'http.disconnect' instead of the last chunk, and the client
+        gets 401 unless a response was already started. A body that is never
+        read is not checked.
+
+    :arg app:      the ASGI application.
+    :arg verifier: an httpsig.aio.AsyncVerifier, resolving keys and running
+        expensive checks in its executor.
+    :arg metrics:  Optional. The VerificationMetrics updated for every
+        request; a new one by default, available as `self.metrics`.
+    :arg realm:    Optional. The realm sent in the WWW-Authenticate header of
+        401 responses.
+    :arg check_digest: Optional. Check signed Digest headers against the
+        body. Default is True.
+    """
+    def __init__(self, app, verifier, metrics=None, realm='httpsig',
+                 check_digest=True):
+        self.app = app
+        self.verifier = verifier
+        self.metrics = (metrics if metrics is not None
+                        else _metrics.VerificationMetrics())
+        self.check_digest = check_digest
+        self.digest_mismatches = 0
+        headers = ' '.join(sorted(verifier.required_headers))
+        self._challenge = ('Signature realm="%s",headers="%s"' % (
+            realm, headers)).encode('ascii')
+
+    async def verify(self, scope):
+        """
+        Verify the signature of the request in `scope`.
+
+        Returns (outcome, key_id, algorithm, digest verifier or None), where
+            outcome is one of httpsig.metrics.OUTCOMES.
+        """
+        key_id = algorithm = digest = None
+        try:
+            parsed = self.verifier.parse(
+                RawHeaders(scope['headers'], lowercase=True))
+            headers, params, auth_headers = parsed
+            key_id, algorithm = params.key_id, params.algorithm
+            host = None
+            if 'host' in auth_headers and 'host' not in headers:
+                host = request_host(scope)
+            ok = await self.verifier.verify_parsed(
+                parsed, scope['method'], request_target(scope), host)
+            if ok and self.check_digest and 'digest' in auth_headers:
+                digest = DigestVerifier(headers['digest'])
+        except Exception:
+            # Missing or malformed signature or Digest, missing headers,
+            # unknown key.
+            return _metrics.REJECTED, key_id, algorithm, None
+        outcome = _metrics.OK if ok else _metrics.INVALID
+        return outcome, key_id, algorithm, digest
+
+    async def unauthorized(self, send):
+        await send({'type': 'http.response.start',
+                    'status': 401,
+                    'headers': [(b'content-type', b'text/plain'),
+                                (b'www-authenticate', self._challenge)]})
+        await send({'type': 'http.response.body',
+                    'body': b'Invalid or missing signature.\n'})
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        outcome, key_id, algorithm, digest = await self.verify(scope)
+        self.metrics.record(
+            key_id, algorithm, outcome, time.perf_counter() - start)
+        if outcome != _metrics.OK:
+            return await self.unauthorized(send)
+
+        scope = dict(scope)
+        scope['httpsig.key_id'] = key_id
+        if digest is None:
+            return await self.app(scope, receive, send)
+        await self._call_checked(scope, receive, send, digest)
+
+    async def _call_checked(self, scope, receive, send, digest):
+        state = {'mismatch': False, 'started': False}
+
+        async def checked_receive():
+            message = await receive()
+            if message['type'] == 'http.request':
+                digest.update(message.get('body', b''))
+                if not message.get('more_body') and not digest.verify():
+                    self.digest_mismatches += 1
+                    state['mismatch'] = True
+                    return {'type': 'http.disconnect'}
+            return message
+
+        async def checked_send(message):
+            if state['mismatch']:
+                # The application sees a disconnected client.
+                return
+            if message['type'] == 'http.response.start':
+                state['started'] = True
+            await send(message)
+
+        try:
+            await self.app(scope, checked_receive, checked_send)
+        except Exception:
+            if not state['mismatch']:
+                raise
+        if state['mismatch'] and not state['started']:
+            await self.unauthorized(send)
@@ -0,0 +1,372 @@
+"""
+Crypto backends used by Signer and Verifier.
+
+A backend turns a secret into a key object for one algorithm family. Key
+objects have a `sign(data)` method returning the raw signature (private keys
+and HMAC secrets) and/or a `verify(data, signature)` method returning True or
+False (public keys and HMAC secrets); both take and return bytes.
+
+Available backends:
+
+* 'pycryptodome': HMAC and RSA with PyCryptodome, ed25519 with PyNaCl.
+* 'stdlib': HMAC only, with the standard library hmac and hashlib modules.
+* 'cryptography': HMAC with the standard library, RSA and ed25519 with the
+  OpenSSL-backed cryptography package, if installed.
+* 'auto': the standard library for HMAC, cryptography for RSA when
+  installed and PyCryptodome otherwise, PyNaCl for ed25519 when installed
+  and cryptography otherwise. This is the fastest combination measured by
+  benchmarks/bench_backends.py.
+
+Backends import their libraries on first use.
+"""
+import base64
+import hashlib
+import hmac
+
+from .utils import HttpSigException
+
+# The backend used when Signer/Verifier are not given one. Setting
+# httpsig.backends.DEFAULT_BACKEND changes it for all future instances.
+DEFAULT_BACKEND = 'auto'
+
+_HASHLIB_NAMES = {'sha1': 'sha1', 'sha256': 'sha256', 'sha512': 'sha512'}
+
+
+class Backend(object):
+    """
+    Base class of crypto backends. Unsupported families raise
+        HttpSigException.
+    """
+    name = None
+
+    def __reduce__(self):
+        # The shared instance of a named backend is pickled as its name, so
+        # unpickling in another process gets that process's instance.
+        if self.name in BACKENDS and _instances.get(self.name) is self:
+            return (get_backend, (self.name,))
+        return object.__reduce__(self)
+
+    def _unsupported(self, family):
+        raise HttpSigException(
+            'The "%s" backend does not support %s.' % (self.name, family))
+
+    def hmac_key(self, secret, hash_algorithm):
+        self._unsupported('hmac')
+
+    def rsa_private_key(self, secret, hash_algorithm):
+        self._unsupported('rsa')
+
+    def rsa_public_key(self, secret, hash_algorithm):
+        self._unsupported('rsa')
+
+    def ed25519_private_key(self, secret):
+        self._unsupported('ed25519')
+
+    def ed25519_public_key(self, secret):
+        self._unsupported('ed25519')
+
+
+class _StdlibHMACKey(object):
+    __slots__ = ('_secret', '_digestmod')
+
+    def __init__(self, secret, hash_algorithm):
+        try:
+            self._digestmod = _HASHLIB_NAMES[hash_algorithm]
+        except KeyError:
+            raise HttpSigException("Unsupported hash algorithm.")
+        self._secret = secret
+
+    if hasattr(hmac, 'digest'):
+        def sign(self, data):
+            return hmac.digest(self._secret, data, self._digestmod)
+    else:
+        # Python < 3.7
+        def sign(self, data):
+            return hmac.new(self._secret, data,
+                            getattr(hashlib, self._digestmod)).digest()
+
+    def verify(self, data, signature):
+        return hmac.compare_digest(self.sign(data), signature)
+
+
+class StdlibBackend(Backend):
+    """
+    HMAC with the standard library; no RSA or ed25519 support.
+    """
+    name = 'stdlib'
+
+    def hmac_key(self, secret, hash_algorithm):
+        return _StdlibHMACKey(secret, hash_algorithm)
+
+
+class _PyCryptodomeHMACKey(object):
+    __slots__ = ('_hmac',)
+
+    def __init__(self, secret, hash_algorithm):
+        from Crypto.Hash import HMAC
+        from .utils import HASHES
+        self._hmac = HMAC.new(secret, digestmod=HASHES[hash_algorithm])
+
+    def sign(self, data):
+        h = self._hmac.copy()
+        h.update(data)
+        return h.digest()
+
+    def verify(self, data, signature):
+        return hmac.compare_digest(self.sign(data), signature)
+
+
+class _PyCryptodomeRSAKey(object):
+    __slots__ = ('_rsa', '_hash')
+
+    def __init__(self, secret, hash_algorithm, private):
+        from Crypto.PublicKey import RSA
+        from Crypto.Signature import PKCS1_v1_5
+        from .utils import HASHES
+        try:
+            key = RSA.importKey(secret)
+        except (ValueError, IndexError, TypeError):
+            raise HttpSigException("Invalid key.")
+        if private and not key.has_private():
+            raise HttpSigException("Invalid key.")
+        self._rsa = PKCS1_v1_5.new(key)
+        self._hash = HASHES[hash_algorithm]
+
+    def sign(self, data):
+        return self._rsa.sign(self._hash.new(data))
+
+    def verify(self, data, signature):
+        return bool(self._rsa.verify(self._hash.new(data), signature))
+
+
+class _NaClEd25519PrivateKey(object):
+    __slots__ = ('_key',)
+
+    def __init__(self, secret):
+        from nacl.encoding import Base64Encoder
+        from nacl.signing import SigningKey
+        self._key = SigningKey(secret, encoder=Base64Encoder)
+
+    def sign(self, data):
+        return self._key.sign(data).signature
+
+
+class _NaClEd25519PublicKey(object):
+    __slots__ = ('_key',)
+
+    def __init__(self, secret):
+        from nacl.encoding import Base64Encoder
+        from nacl.signing import VerifyKey
+        self._key = VerifyKey(secret, encoder=Base64Encoder)
+
+    def verify(self, data, signature):
+        from nacl.exceptions import BadSignatureError
+        try:
+            self._key.verify(data, signature)
+            return True
+        except (BadSignatureError, ValueError):
+            return False
+
+
+class PyCryptodomeBackend(Backend):
+    """
+    HMAC and RSA with PyCryptodome, ed25519 with PyNaCl.
+    """
+    name = 'pycryptodome'
+
+    def hmac_key(self, secret, hash_algorithm):
+        return _PyCryptodomeHMACKey(secret, hash_algorithm)
+
+    def rsa_private_key(self, secret, hash_algorithm):
+        return _PyCryptodomeRSAKey(secret, hash_algorithm, private=True)
+
+    def rsa_public_key(self, secret, hash_algorithm):
+        return _PyCryptodomeRSAKey(secret, hash_algorithm, private=False)
+
+    def ed25519_private_key(self, secret):
+        return _NaClEd25519PrivateKey(secret)
+
+    def ed25519_public_key(self, secret):
+        return _NaClEd25519PublicKey(secret)
+
+
+def _load_cryptography_rsa_key(secret, private):
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    secret = secret.strip()
+    try:
+        if secret.startswith(b'ssh-rsa'):
+            key = serialization.load_ssh_public_key(secret)
+        elif secret.startswith(b'-----'):
+            if b'PRIVATE KEY' in secret.split(b'\n', 1)[0]:
+                key = serialization.load_pem_private_key(secret, None)
+            else:
+                key = serialization.load_pem_public_key(secret)
+        else:
+            try:
+                key = serialization.load_der_private_key(secret, None)
+            except ValueError:
+                key = serialization.load_der_public_key(secret)
+    except (ValueError, TypeError, IndexError):
+        raise HttpSigException("Invalid key.")
+
+    if isinstance(key, rsa.RSAPrivateKey):
+        # A private key can be used to verify, like with PyCryptodome.
+        return key if private else key.public_key()
+    if isinstance(key, rsa.RSAPublicKey) and not private:
+        return key
+    raise HttpSigException("Invalid key.")
+
+
+class _CryptographyRSAKey(object):
+    __slots__ = ('_key', '_padding', '_hash')
+
+    def __init__(self, secret, hash_algorithm, private):
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+        self._key = _load_cryptography_rsa_key(secret, private)
+        self._padding = padding.PKCS1v15()
+        self._hash = {'sha1': hashes.SHA1,
+                      'sha256': hashes.SHA256,
+                      'sha512': hashes.SHA512}[hash_algorithm]()
+
+    def sign(self, data):
+        return self._key.sign(data, self._padding, self._hash)
+
+    def verify(self, data, signature):
+        from cryptography.exceptions import InvalidSignature
+        try:
+            self._key.verify(signature, data, self._padding, self._hash)
+            return True
+        except InvalidSignature:
+            return False
+
+
+class _CryptographyEd25519Key(object):
+    __slots__ = ('_key',)
+
+    def __init__(self, secret, private):
+        from cryptography.hazmat.primitives.asymmetric import ed25519
+        try:
+            raw = base64.b64decode(secret)
+            if private:
+                self._key = ed25519.Ed25519PrivateKey.from_private_bytes(raw)
+            else:
+                self._key = ed25519.Ed25519PublicKey.from_public_bytes(raw)
+        except (ValueError, TypeError):
+            raise HttpSigException("Invalid key.")
+
+    def sign(self, data):
+        return self._key.sign(data)
+
+    def verify(self, data, signature):
+        from cryptography.exceptions import InvalidSignature
+        try:
+            self._key.verify(signature, data)
+            return True
+        except InvalidSignature:
+            return False
+
+
+class CryptographyBackend(StdlibBackend):
+    """
+    HMAC with the standard library, RSA and ed25519 with the OpenSSL-backed
+        cryptography package.
+    """
+    name = 'cryptography'
+
+    def rsa_private_key(self, secret, hash_algorithm):
+        return _CryptographyRSAKey(secret, hash_algorithm, private=True)
+
+    def rsa_public_key(self, secret, hash_algorithm):
+        return _CryptographyRSAKey(secret, hash_algorithm, private=False)
+
+    def ed25519_private_key(self, secret):
+        return _CryptographyEd25519Key(secret, private=True)
+
+    def ed25519_public_key(self, secret):
+        return _CryptographyEd25519Key(secret, private=False)
+
+
+def cryptography_available():
+    try:
+        import cryptography.hazmat.primitives.asymmetric.ed25519  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def nacl_available():
+    try:
+        import nacl.signing  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class AutoBackend(Backend):
+    """
+    The standard library for HMAC; cryptography for RSA when it is
+        installed, PyCryptodome otherwise; PyNaCl for ed25519 when it is
+        installed, cryptography otherwise.
+    """
+    name = 'auto'
+
+    def __init__(self):
+        self._stdlib = StdlibBackend()
+        self._rsa = None
+        self._ed25519 = None
+
+    @property
+    def rsa(self):
+        if self._rsa is None:
+            self._rsa = (CryptographyBackend() if cryptography_available()
+                         else PyCryptodomeBackend())
+        return self._rsa
+
+    @property
+    def ed25519(self):
+        if self._ed25519 is None:
+            self._ed25519 = (PyCryptodomeBackend() if nacl_available()
+                             else CryptographyBackend())
+        return self._ed25519
+
+    def hmac_key(self, secret, hash_algorithm):
+        return self._stdlib.hmac_key(secret, hash_algorithm)
+
+    def rsa_private_key(self, secret, hash_algorithm):
+        return self.rsa.rsa_private_key(secret, hash_algorithm)
+
+    def rsa_public_key(self, secret, hash_algorithm):
+        return self.rsa.rsa_public_key(secret, hash_algorithm)
+
+    def ed25519_private_key(self, secret):
+        return self.ed25519.ed25519_private_key(secret)
+
+    def ed25519_public_key(self, secret):
+        return self.ed25519.ed25519_public_key(secret)
+
+
+BACKENDS = {'auto': AutoBackend,
+            'pycryptodome': PyCryptodomeBackend,
+            'stdlib': StdlibBackend,
+            'cryptography': CryptographyBackend}
+_instances = {}
+
+
+def get_backend(backend=None):
+    """
+    Return a Backend given its name, a Backend (returned as is) or None for
+        DEFAULT_BACKEND.
+    """
+    if isinstance(backend, Backend):
+        return backend
+    name = backend or DEFAULT_BACKEND
+    instance = _instances.get(name)
+    if instance is None:
+        try:
+            instance = _instances[name] = BACKENDS[name]()
+        except KeyError:
+            raise HttpSigException('Unknown backend "%s".' % name)
+    return instance
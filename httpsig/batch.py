@@ -0,0 +1,229 @@
+"""
+Module to sign and verify many requests in parallel.
+"""
+import collections
+import itertools
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor,
+                                as_completed)
+
+from .utils import HttpSigException
+
+# The signer or verifier used by tasks running in a worker process, set once
+# per worker by _init_worker() so keys are parsed once per process.
+_worker_instance = None
+
+
+def _init_worker(instance):
+    global _worker_instance
+    _worker_instance = instance
+
+
+def _verify_group(verifier, key_id, algorithm, items):
+    """
+    Verify a list of (index, parsed request, (method, path, host)) sharing
+        one keyId and algorithm, looking the key up once.
+
+    Returns a list of (index, result); requests that fail to verify for any
+        reason count as failed.
+    """
+    if verifier is None:
+        verifier = _worker_instance
+    try:
+        key = verifier.key_store.get(key_id, algorithm)
+    except Exception:
+        return [(index, False) for index, _, _ in items]
+
+    results = []
+    for index, parsed, args in items:
+        try:
+            result = bool(verifier._verify_parsed(key, *(parsed + args)))
+        except Exception:
+            result = False
+        results.append((index, result))
+    return results
+
+
+def _sign_group(signer, items):
+    """
+    Sign a list of (index, (headers, method, path, host)).
+
+    Returns a list of (index, signed headers).
+    """
+    if signer is None:
+        signer = _worker_instance
+    results = []
+    for index, request in items:
+        headers, method, path, host = tuple(request) + (None,) * (
+            4 - len(request))
+        results.append((index, signer.sign(
+            headers, host=host, method=method, path=path)))
+    return results
+
+
+def _group_for_verify(verifier, chunk, batch_size):
+    """
+    Parse a chunk of (index, request) and split it into batches sharing
+        keyId and algorithm, at most `batch_size` long.
+
+    Requests whose signature cannot be parsed are left out.
+    """
+    groups = collections.OrderedDict()
+    for index, request in chunk:
+        try:
+            parsed = verifier._parse(request[0])
+        except Exception:
+            continue
+        params = parsed[1]
+        key = (params.key_id, params.algorithm)
+        groups.setdefault(key, []).append(
+            (index, parsed, tuple(request[1:])))
+
+    batches = []
+    for (key_id, algorithm), items in groups.items():
+        for start in range(0, len(items), batch_size):
+            batches.append(
+                (key_id, algorithm, items[start:start + batch_size]))
+    return batches
+
+
+def _executor(instance, max_workers, processes, executor):
+    """
+    Return the executor to use, whether it was created here, and the instance
+        to pass to each task (None when the workers already hold it).
+    """
+    if executor is not None:
+        return executor, False, instance
+    if processes:
+        executor = ProcessPoolExecutor(
+            max_workers, initializer=_init_worker, initargs=(instance,))
+        return executor, True, None
+    return ThreadPoolExecutor(max_workers), True, instance
+
+
+def _map_chunks(executor, task, make_batches, requests, chunk_size,
+                ordered=True, default=None):
+    """
+    Run `task` over `requests`, `chunk_size` requests at a time.
+
+    `make_batches(chunk)` turns a list of (index, request) into the argument
+        tuples of the tasks to submit; every task returns a list of
+        (index, result). Requests no task reported on get `default`.
+
+    Yields results in input order, or (index, result) pairs as tasks complete
+        when `ordered` is False.
+    """
+    def collect(pending):
+        base, size, futures = pending
+        if not ordered:
+            for future in as_completed(futures):
+                for item in future.result():
+                    yield item
+            return
+        results = [default] * size
+        for future in futures:
+            for index, result in future.result():
+                results[index - base] = result
+        for result in results:
+            yield result
+
+    requests = iter(requests)
+    pending = collections.deque()
+    base = 0
+    while True:
+        chunk = list(enumerate(
+            itertools.islice(requests, chunk_size), base))
+        if chunk:
+            futures = [executor.submit(task, *args)
+                       for args in make_batches(chunk)]
+            pending.append((base, len(chunk), futures))
+            base += len(chunk)
+        # Keep the next chunk queued while results of the previous one are
+        # handed out, so the workers never sit idle.
+        if len(pending) > 1 or (pending and not chunk):
+            for result in collect(pending.popleft()):
+                yield result
+        if not pending:
+            break
+
+
+def verify_many(verifier, requests, max_workers=None, processes=False,
+                executor=None, chunk_size=256, batch_size=16):
+    """
+    Verify many requests with a RequestVerifier, yielding True or False for
+        each one in input order.
+
+    Requests are consumed `chunk_size` at a time, so memory does not grow with
+        the number of requests. Each chunk is grouped by keyId and algorithm
+        and the groups are verified in parallel, looking each key up once.
+
+    :arg verifier:    a RequestVerifier.
+    :arg requests:    an iterable of (headers, method, path, host) tuples;
+        trailing items may be left out.
+    :arg max_workers: the number of worker threads or processes.
+    :arg processes:   verify in a process pool instead of a thread pool. The
+        verifier is pickled once per worker, so its key loader must be
+        picklable, and each worker parses the keys it needs once. Its replay
+        guard, if any, must use a shared store (see
+        httpsig.replay.ReplayStore), or each worker would accept the
+        replays of the others.
+    :arg executor:    an existing executor to use instead of creating one.
+        With a process pool the verifier is pickled with every task.
+    :arg chunk_size:  the number of requests read ahead from `requests`.
+    :arg batch_size:  the most requests sent to a worker in one task.
+    """
+    guard = verifier.replay_guard
+    if (guard is not None and not guard.store.shared and
+            (processes or isinstance(executor, ProcessPoolExecutor))):
+        raise HttpSigException(
+            "Verifying in processes needs a replay guard with a shared "
+            "store.")
+    executor, own_executor, task_verifier = _executor(
+        verifier, max_workers, processes, executor)
+
+    def make_batches(chunk):
+        return [(task_verifier,) + batch for batch in
+                _group_for_verify(verifier, chunk, batch_size)]
+
+    try:
+        for result in _map_chunks(executor, _verify_group, make_batches,
+                                  requests, chunk_size, default=False):
+            yield result
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+
+def sign_many(signer, requests, max_workers=None, processes=True,
+              executor=None, ordered=True, chunk_size=256, batch_size=16):
+    """
+    Sign many requests with a HeaderSigner, yielding the signed headers of
+        each one.
+
+    :arg signer:      a HeaderSigner.
+    :arg requests:    an iterable of (headers, method, path, host) tuples;
+        trailing items may be left out.
+    :arg max_workers: the number of worker processes or threads.
+    :arg processes:   sign in a process pool (the default) or, when False, a
+        thread pool. The signer is pickled once per worker, so each worker
+        parses the private key once.
+    :arg executor:    an existing executor to use instead of creating one.
+        With a process pool the signer is pickled with every task.
+    :arg ordered:     yield signed headers in input order; when False yield
+        (index, signed headers) pairs as soon as they are ready.
+    :arg chunk_size:  the number of requests read ahead from `requests`.
+    :arg batch_size:  the most requests sent to a worker in one task.
+    """
+    executor, own_executor, task_signer = _executor(
+        signer, max_workers, processes, executor)
+
+    def make_batches(chunk):
+        return [(task_signer, chunk[start:start + batch_size])
+                for start in range(0, len(chunk), batch_size)]
+
+    try:
+        for result in _map_chunks(executor, _sign_group, make_batches,
+                                  requests, chunk_size, ordered=ordered):
+            yield result
+    finally:
+        if own_executor:
+            executor.shutdown()
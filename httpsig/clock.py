@@ -0,0 +1,74 @@
+"""
+Module providing the time used for the Date and (created) headers.
+
+The current Clock can be replaced with set_clock(), e.g. by a FakeClock in
+tests.
+"""
+import time
+
+
+class Clock(object):
+    """
+    Whole-second clock that formats each second's Date header only once.
+
+    :arg time: Optional. A function returning the current Unix time, defaults
+        to time.time().
+    """
+    def __init__(self, time=time.time):
+        self._time = time
+        self._date = (None, None)
+
+    def now(self):
+        """
+        Return the current Unix time in whole seconds.
+        """
+        return int(self._time())
+
+    def http_date(self, timestamp=None):
+        """
+        Return `timestamp` (by default now) formatted for the Date header,
+            e.g. 'Thu, 05 Jan 2014 21:31:40 GMT'.
+        """
+        if timestamp is None:
+            timestamp = self.now()
+        # One (second, string) tuple, replaced as a whole so threads never
+        # see a string from another second.
+        second, date = self._date
+        if second != timestamp:
+            # Imported here, as email.utils is slow to import.
+            from email.utils import formatdate
+            date = formatdate(timeval=timestamp, localtime=False, usegmt=True)
+            self._date = (timestamp, date)
+        return date
+
+
+class FakeClock(Clock):
+    """
+    Clock standing still at `timestamp` until moved with advance().
+    """
+    def __init__(self, timestamp=0):
+        self.timestamp = timestamp
+        super(FakeClock, self).__init__(time=lambda: self.timestamp)
+
+    def advance(self, seconds):
+        self.timestamp += seconds
+
+
+_clock = Clock()
+
+
+def get_clock():
+    """
+    Return the clock used for Date and (created) values.
+    """
+    return _clock
+
+
+def set_clock(clock):
+    """
+    Replace the clock used for Date and (created) values, returning the
+        previous one.
+    """
+    global _clock
+    previous, _clock = _clock, clock
+    return previous
@@ -0,0 +1,169 @@
+"""
+Module to compute and check the Digest header of RFC 3230 (SHA-256 and
+SHA-512) without holding the body in memory.
+"""
+import base64
+import hashlib
+import hmac
+import mmap
+
+import six
+
+from .utils import HttpSigException
+
+DIGEST_ALGORITHMS = {'SHA-256': hashlib.sha256,
+                     'SHA-512': hashlib.sha512}
+DEFAULT_DIGEST_ALGORITHM = 'SHA-256'
+# Bytes read or hashed at a time from files and large buffers.
+CHUNK_SIZE = 64 * 1024
+
+
+def _new_hash(algorithm):
+    try:
+        return DIGEST_ALGORITHMS[algorithm.upper()]()
+    except KeyError:
+        raise HttpSigException(
+            'Unsupported digest algorithm "%s".' % algorithm)
+
+
+def _iter_buffer(view, chunk_size):
+    view = view.cast('B')
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+
+def iter_chunks(body, chunk_size=CHUNK_SIZE):
+    """
+    Yield the body in chunks without copying it as a whole.
+
+    `body` may be bytes (or str, encoded as UTF-8), any object supporting the
+        buffer protocol such as a bytearray or an mmap, a binary file object
+        or an iterable of such chunks. File objects are read from their
+        current position to the end into one reused buffer, so a chunk is
+        only valid until the next one is read.
+    """
+    if body is None:
+        return
+    if isinstance(body, six.text_type):
+        body = body.encode('utf8')
+    if isinstance(body, bytes):
+        yield body
+    elif isinstance(body, (bytearray, memoryview, mmap.mmap)):
+        for chunk in _iter_buffer(memoryview(body), chunk_size):
+            yield chunk
+    elif hasattr(body, 'readinto'):
+        buf = bytearray(chunk_size)
+        view = memoryview(buf)
+        while True:
+            n = body.readinto(buf)
+            if not n:
+                break
+            yield view[:n]
+    elif hasattr(body, 'read'):
+        while True:
+            chunk = body.read(chunk_size)
+            if not chunk:
+                break
+            if isinstance(chunk, six.text_type):
+                chunk = chunk.encode('utf8')
+            yield chunk
+    else:
+        try:
+            chunks = _iter_buffer(memoryview(body), chunk_size)
+        except TypeError:
+            # An iterable of chunks.
+            chunks = (part for chunk in body
+                      for part in iter_chunks(chunk, chunk_size))
+        for chunk in chunks:
+            yield chunk
+
+
+def compute_digest(body, algorithm=DEFAULT_DIGEST_ALGORITHM,
+                   chunk_size=CHUNK_SIZE):
+    """
+    Return the Digest header value for `body`, e.g. 'SHA-256=X48E9q...'.
+
+    `body` is hashed incrementally, see iter_chunks() for accepted types.
+    """
+    h = _new_hash(algorithm)
+    for chunk in iter_chunks(body, chunk_size):
+        h.update(chunk)
+    return '%s=%s' % (algorithm.upper(),
+                      base64.b64encode(h.digest()).decode('ascii'))
+
+
+def parse_digest_header(value):
+    """
+    Parse a Digest header into a dict of upper-case algorithm to base64
+        digest, e.g. {'SHA-256': 'X48E9q...'}.
+    """
+    if not isinstance(value, six.string_types):
+        value = value.decode('ascii')  # HTTP headers cannot be Unicode.
+    digests = {}
+    for item in value.split(','):
+        algorithm, sep, digest = item.strip().partition('=')
+        if sep and digest:
+            digests[algorithm.upper()] = digest
+    return digests
+
+
+class DigestVerifier(object):
+    """
+    Checks a request body against its Digest header as the body arrives.
+
+    Feed chunks to update() (or wrap the body with iter()), then call
+        verify(). Only the running hash is kept, so memory use does not
+        depend on the size of the body.
+
+    :arg digest_header: the Digest header value of the request.
+    :arg algorithms:    Optional. The accepted algorithms, strongest first.
+        The first one present in the header is checked. Defaults to
+        ['SHA-512', 'SHA-256'].
+    """
+    def __init__(self, digest_header, algorithms=None):
+        digests = parse_digest_header(digest_header)
+        for algorithm in algorithms or ('SHA-512', 'SHA-256'):
+            algorithm = algorithm.upper()
+            if algorithm in digests and algorithm in DIGEST_ALGORITHMS:
+                break
+        else:
+            raise HttpSigException("No supported digest algorithm.")
+
+        self.algorithm = algorithm
+        try:
+            self._expected = base64.b64decode(digests[algorithm])
+        except (TypeError, ValueError):
+            raise HttpSigException("Invalid digest.")
+        self._hash = _new_hash(algorithm)
+
+    def update(self, chunk):
+        self._hash.update(chunk)
+
+    def verify(self):
+        """
+        Return True if the body seen so far matches the Digest header.
+        """
+        return hmac.compare_digest(self._hash.digest(), self._expected)
+
+    def iter(self, body, chunk_size=CHUNK_SIZE):
+        """
+        Yield the chunks of `body` as bytes while hashing them. Raises
+            HttpSigException after the last chunk if the body does not match
+            the digest.
+        """
+        for chunk in iter_chunks(body, chunk_size):
+            self.update(chunk)
+            yield chunk if isinstance(chunk, bytes) else bytes(chunk)
+        if not self.verify():
+            raise HttpSigException("Digest mismatch.")
+
+
+def verify_digest(digest_header, body, algorithms=None):
+    """
+    Return True if `body` matches the Digest header, hashing it
+        incrementally.
+    """
+    verifier = DigestVerifier(digest_header, algorithms)
+    for chunk in iter_chunks(body):
+        verifier.update(chunk)
+    return verifier.verify()
@@ -0,0 +1,100 @@
+import asyncio
+import functools
+
+import httpx
+
+from . import clock
+from .digest import CHUNK_SIZE, DEFAULT_DIGEST_ALGORITHM, compute_digest
+from .sign import HeaderSigner
+from .utils import RawHeaders
+
+
+class HTTPSignatureAuth(httpx.Auth):
+    """
+    Sign httpx requests, from a Client or an AsyncClient, using the
+        http-signature scheme.
+
+    The signer is built once, and each request only gets its signature
+        header set (plus Date and Digest when they are signed and missing);
+        the other headers are read in place.
+
+    `key_id`, `secret`, `algorithm`, `headers`, `digest_algorithm` and
+        `expires_in` are as for httpsig.requests_auth.HTTPSignatureAuth. To
+        compute the Digest header, a streamed body (a file, an iterator or a
+        multipart form) is first read into memory with Request.read() or
+        aread(), and sent from there: set the Digest header yourself for
+        bodies too large for that.
+    `sign_header` is the header receiving the signature, 'authorization' by
+        default.
+    `executor` runs RSA and ed25519 signing (and hashing of large bodies)
+        for AsyncClient requests, so they do not block the event loop;
+        defaults to the loop's default executor.
+    `inline` lists the algorithm families signed on the loop, defaulting to
+        ['hmac'].
+    """
+    def __init__(self, key_id='', secret='', algorithm=None, headers=None,
+                 digest_algorithm=DEFAULT_DIGEST_ALGORITHM,
+                 sign_header='authorization', executor=None,
+                 inline=('hmac',), expires_in=None):
+        headers = headers or []
+        self.header_signer = HeaderSigner(
+                                key_id=key_id, secret=secret,
+                                algorithm=algorithm, headers=headers,
+                                sign_header=sign_header,
+                                expires_in=expires_in)
+        signed = self.header_signer._message.headers
+        self.uses_date = 'date' in signed
+        self.uses_digest = 'digest' in signed
+        self.digest_algorithm = digest_algorithm
+        self.executor = executor
+        self.sign_inline = (
+            self.header_signer.sign_algorithm in frozenset(inline))
+
+    def _digest(self, body):
+        return compute_digest(body, self.digest_algorithm)
+
+    def _prepare(self, request):
+        """
+        Add the Date header if it is signed and missing, and return the Unix
+            time to sign.
+        """
+        now = clock.get_clock().now()
+        if self.uses_date and 'date' not in request.headers:
+            request.headers['Date'] = clock.get_clock().http_date(now)
+        return now
+
+    def _signature(self, request, now):
+        # httpx always sets the Host header that is sent. Header values are
+        # set as text.
+        return self.header_signer.sign_value(
+            RawHeaders(request.headers.raw), method=request.method,
+            path=request.url.raw_path, now=now).decode('utf8')
+
+    def sync_auth_flow(self, request):
+        if self.uses_digest and 'digest' not in request.headers:
+            request.headers['Digest'] = self._digest(request.read())
+        now = self._prepare(request)
+        request.headers[self.header_signer.sign_header] = \
+            self._signature(request, now)
+        yield request
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+                self.executor, functools.partial(func, *args))
+
+    async def async_auth_flow(self, request):
+        if self.uses_digest and 'digest' not in request.headers:
+            body = await request.aread()
+            if len(body) <= CHUNK_SIZE:
+                digest = self._digest(body)
+            else:
+                digest = await self._run(self._digest, body)
+            request.headers['Digest'] = digest
+        now = self._prepare(request)
+        if self.sign_inline:
+            signature = self._signature(request, now)
+        else:
+            signature = await self._run(self._signature, request, now)
+        request.headers[self.header_signer.sign_header] = signature
+        yield request
@@ -0,0 +1,99 @@
+"""
+Opt-in timing of the phases of signing and verifying.
+
+Register a hook with add_hook() and every signature made or checked reports
+how long each phase took:
+
+    hook(operation, algorithm, key_id, timings)
+
+where `operation` is SIGN or VERIFY, `key_id` is None when unknown (e.g. for
+a bare Signer or Verifier) and `timings` maps phases (PHASES) to seconds.
+Only the phases that ran are reported. httpsig.metrics.PhaseMetrics
+aggregates them in histograms.
+
+Hooks run in the thread that signs or verifies, and their exceptions are
+not caught. When no hook is registered, the hot paths only test `hooks`.
+"""
+import contextlib
+import threading
+import time
+
+try:
+    _timer = time.perf_counter
+except AttributeError:
+    # Python 2
+    _timer = time.time
+
+SIGN = 'sign'
+VERIFY = 'verify'
+
+PARSE = 'parse'    # parsing the signature header and checking policy
+KEY = 'key'        # resolving and parsing the key
+BUILD = 'build'    # building the signing string
+CRYPTO = 'crypto'  # signing or checking the signature
+BASE64 = 'base64'  # encoding or decoding the signature
+PHASES = (PARSE, KEY, BUILD, CRYPTO, BASE64)
+
+# The registered hooks. Replaced rather than changed, so a report being sent
+# is not disturbed by hooks added or removed meanwhile.
+hooks = ()
+_lock = threading.Lock()
+
+
+def add_hook(hook):
+    """
+    Register `hook` to receive the phase timings of every signature.
+    """
+    global hooks
+    with _lock:
+        if hook not in hooks:
+            hooks = hooks + (hook,)
+
+
+def remove_hook(hook):
+    """
+    Unregister `hook`; unknown hooks are ignored.
+    """
+    global hooks
+    with _lock:
+        hooks = tuple(h for h in hooks if h != hook)
+
+
+@contextlib.contextmanager
+def hooked(hook):
+    """
+    Context manager registering `hook` for the duration of the block.
+    """
+    add_hook(hook)
+    try:
+        yield hook
+    finally:
+        remove_hook(hook)
+
+
+class PhaseTimer(object):
+    """
+    Times the phases of one operation: each call to mark() charges the time
+        since the previous one (or since the timer was started) to a phase.
+    """
+    __slots__ = ('operation', 'timings', '_last')
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.timings = {}
+        self._last = _timer()
+
+    def restart(self):
+        """
+        Do not charge the time since the last mark to any phase.
+        """
+        self._last = _timer()
+
+    def mark(self, phase):
+        now = _timer()
+        self.timings[phase] = self.timings.get(phase, 0.0) + now - self._last
+        self._last = now
+
+    def report(self, algorithm, key_id=None):
+        for hook in hooks:
+            hook(self.operation, algorithm, key_id, self.timings)
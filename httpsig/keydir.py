@@ -0,0 +1,357 @@
+"""
+Module to load verification keys from a directory, for use as a KeyStore
+loader.
+
+Each file holds one public key:
+
+* PEM, "PUBLIC KEY" (RSA or ed25519) or "RSA PUBLIC KEY";
+* OpenSSH, a "ssh-rsa ..." or "ssh-ed25519 ..." line as in a ``.pub`` file;
+* a base64-encoded raw ed25519 key, as used by Signer and Verifier.
+
+A key's keyId is its path relative to the directory, without a ``.pem``,
+``.pub``, ``.key`` or ``.txt`` extension and with '/' separators, e.g.
+``clients/alice-2024``. Every key can also be looked up by its OpenSSH
+SHA-256 fingerprint (as printed by ``ssh-keygen -l``), so clients can send
+the fingerprint of the key they sign with as keyId while several of their
+keys are valid during a rotation.
+
+Files are parsed once; reload() re-reads only files whose modification time,
+size or inode changed, and swaps in the new index at once, so lookups never wait
+for a reload.
+"""
+import base64
+import hashlib
+import os
+import struct
+import threading
+
+from .utils import HttpSigException
+
+KEY_EXTENSIONS = ('.pem', '.pub', '.key', '.txt')
+
+# The algorithms key_pairs() lists for each family by default.
+DEFAULT_ALGORITHMS = {'rsa': ('rsa-sha256',), 'ed25519': ('ed25519',)}
+
+# DER encodings of the algorithm OIDs of SubjectPublicKeyInfo structures.
+_RSA_OID = b'\x06\x09\x2a\x86\x48\x86\xf7\x0d\x01\x01\x01'
+_ED25519_OID = b'\x06\x03\x2b\x65\x70'
+
+
+def _ssh_string(value):
+    return struct.pack('>I', len(value)) + value
+
+
+def _ssh_fields(blob):
+    """
+    Return the length-prefixed fields of an OpenSSH key blob.
+    """
+    fields = []
+    offset = 0
+    while offset < len(blob):
+        length, = struct.unpack('>I', blob[offset:offset + 4])
+        fields.append(blob[offset + 4:offset + 4 + length])
+        offset += 4 + length
+    if offset != len(blob):
+        raise HttpSigException("Invalid OpenSSH key.")
+    return fields
+
+
+def _der_items(data):
+    """
+    Return the (tag, content) pairs of a DER sequence's content.
+    """
+    data = bytearray(data)
+    items = []
+    offset = 0
+    while offset < len(data):
+        tag = data[offset]
+        length = data[offset + 1]
+        offset += 2
+        if length & 0x80:
+            size = length & 0x7f
+            length = 0
+            for byte in data[offset:offset + size]:
+                length = length << 8 | byte
+            offset += size
+        if offset + length > len(data):
+            raise HttpSigException("Invalid DER data.")
+        items.append((tag, bytes(data[offset:offset + length])))
+        offset += length
+    return items
+
+
+def _der_rsa_blob(der):
+    """
+    Return the OpenSSH blob of a DER RSAPublicKey (SEQUENCE {n, e}).
+    """
+    (tag, content), = _der_items(der)
+    n, e = [value for _, value in _der_items(content)]
+    # DER and OpenSSH (mpint) both encode integers as minimal big-endian
+    # two's complement.
+    return _ssh_string(b'ssh-rsa') + _ssh_string(e) + _ssh_string(n)
+
+
+def _ed25519_blob(raw):
+    return _ssh_string(b'ssh-ed25519') + _ssh_string(raw)
+
+
+def _parse_pem(data):
+    lines = data.strip().splitlines()
+    label = lines[0].strip(b'- ')[len(b'BEGIN '):]
+    der = base64.b64decode(b''.join(
+        line for line in lines[1:-1] if b':' not in line))
+    if label == b'RSA PUBLIC KEY':
+        return 'rsa', data, _der_rsa_blob(der)
+    if label != b'PUBLIC KEY':
+        raise HttpSigException(
+            "Unsupported PEM key: %s." % label.decode('ascii', 'replace'))
+    (_, spki), = _der_items(der)
+    (_, algorithm), (_, bits) = _der_items(spki)
+    # The BIT STRING starts with its number of unused bits, always 0 here.
+    key = bits[1:]
+    if algorithm.startswith(_RSA_OID):
+        return 'rsa', data, _der_rsa_blob(key)
+    if algorithm == _ED25519_OID and len(key) == 32:
+        return 'ed25519', base64.b64encode(key), _ed25519_blob(key)
+    raise HttpSigException("Unsupported PEM key algorithm.")
+
+
+def _parse_openssh(data):
+    line = data.strip().splitlines()[0]
+    kind, blob = line.split()[:2]
+    blob = base64.b64decode(blob)
+    fields = _ssh_fields(blob)
+    if fields[0] != kind:
+        raise HttpSigException("Invalid OpenSSH key.")
+    if kind == b'ssh-rsa':
+        return 'rsa', line, blob
+    if kind == b'ssh-ed25519' and len(fields[1]) == 32:
+        return 'ed25519', base64.b64encode(fields[1]), blob
+    raise HttpSigException("Unsupported OpenSSH key.")
+
+
+def parse_public_key(data):
+    """
+    Parse a public key file's content (bytes).
+
+    Returns (family, secret, fingerprint): the algorithm family ('rsa' or
+        'ed25519'), the key in a form accepted by Verifier for that family,
+        and its OpenSSH SHA-256 fingerprint.
+    Raises HttpSigException for unsupported or malformed keys.
+    """
+    data = data.strip()
+    try:
+        if data.startswith(b'-----BEGIN '):
+            family, secret, blob = _parse_pem(data)
+        elif data.startswith(b'ssh-'):
+            family, secret, blob = _parse_openssh(data)
+        else:
+            raw = base64.b64decode(data)
+            if len(raw) != 32:
+                raise HttpSigException("Unsupported key file.")
+            family, secret, blob = 'ed25519', data, _ed25519_blob(raw)
+    except (ValueError, TypeError, IndexError, struct.error):
+        raise HttpSigException("Invalid key file.")
+    return family, secret, fingerprint(blob)
+
+
+def fingerprint(blob):
+    """
+    Return the OpenSSH SHA-256 fingerprint of a key blob, e.g.
+        'SHA256:ExiA/kCzfLSDlsIfB5h+g7Q3ym9F34KwQdv3jZWdxNI'.
+    """
+    digest = base64.b64encode(hashlib.sha256(blob).digest())
+    return 'SHA256:' + digest.decode('ascii').rstrip('=')
+
+
+class KeyEntry(object):
+    """
+    A key loaded from a file.
+    """
+    __slots__ = ('key_id', 'family', 'secret', 'fingerprint', 'path')
+
+    def __init__(self, key_id, family, secret, fingerprint, path):
+        self.key_id = key_id
+        self.family = family
+        self.secret = secret
+        self.fingerprint = fingerprint
+        self.path = path
+
+    def __repr__(self):
+        return '<KeyEntry %s %s %s>' % (
+            self.key_id, self.family, self.fingerprint)
+
+
+def _stat_key(path):
+    # A file replaced by a rename gets a new inode, even with the same size
+    # and modification time.
+    st = os.stat(path)
+    return getattr(st, 'st_mtime_ns', st.st_mtime), st.st_size, st.st_ino
+
+
+class KeyDirectory(object):
+    """
+    Public keys read from the files under `path`, looked up by keyId or
+        fingerprint. Use an instance as the loader of a KeyStore:
+
+        keys = KeyDirectory('/etc/myapp/keys')
+        store = KeyStore(keys)
+
+    :arg path:      the directory, searched recursively. Hidden files and
+        directories are skipped.
+    :arg on_change: Optional. Called after each later reload with the set of
+        keyIds and fingerprints added, changed or removed, e.g. to
+        invalidate them in the KeyStore.
+
+    Files that cannot be parsed are skipped and listed in `errors`, by path.
+    """
+    def __init__(self, path, on_change=None):
+        self.path = path
+        self._prefix = os.path.join(path, '')
+        self.on_change = None
+        self.errors = {}
+        # {path: (stat key, KeyEntry or None)}, only used by reload().
+        self._files = {}
+        # (by keyId, by fingerprint), replaced as a whole by reload().
+        self._index = ({}, {})
+        self._lock = threading.Lock()
+        self._stop = None
+        self.reload()
+        self.on_change = on_change
+
+    def __len__(self):
+        return len(self._index[0])
+
+    def __call__(self, key_id, algorithm):
+        """
+        Return the key for `key_id` (a keyId or a fingerprint) if it suits
+            `algorithm`, or None.
+        """
+        entry = self.get(key_id)
+        if entry is None or not (algorithm or '').startswith(entry.family):
+            return None
+        return entry.secret
+
+    def get(self, key_id):
+        """
+        Return the KeyEntry for a keyId or fingerprint, or None.
+        """
+        by_id, by_fingerprint = self._index
+        entry = by_id.get(key_id)
+        if entry is None:
+            entry = by_fingerprint.get(key_id)
+        return entry
+
+    def key_pairs(self, algorithms=None, fingerprints=False):
+        """
+        Yield a (keyId, algorithm) pair for every key and every algorithm of
+            its family, e.g. for KeyStore.preload().
+
+        :arg algorithms:   Optional. The algorithms to list, by family;
+            DEFAULT_ALGORITHMS by default.
+        :arg fingerprints: Optional. Also list each key by fingerprint.
+        """
+        if algorithms is None:
+            algorithms = DEFAULT_ALGORITHMS
+        for entry in list(self._index[0].values()):
+            for algorithm in algorithms.get(entry.family, ()):
+                yield entry.key_id, algorithm
+                if fingerprints:
+                    yield entry.fingerprint, algorithm
+
+    def _key_id(self, path):
+        # Paths come from os.walk(self.path), so they start with it.
+        key_id = path[len(self._prefix):]
+        root, ext = os.path.splitext(key_id)
+        if ext.lower() in KEY_EXTENSIONS:
+            key_id = root
+        return key_id.replace(os.sep, '/')
+
+    def _scan(self):
+        for root, dirs, files in os.walk(self.path):
+            dirs[:] = [name for name in dirs if not name.startswith('.')]
+            for name in files:
+                if not name.startswith('.'):
+                    yield os.path.join(root, name)
+
+    def _load(self, path):
+        with open(path, 'rb') as f:
+            family, secret, fp = parse_public_key(f.read())
+        return KeyEntry(self._key_id(path), family, secret, fp, path)
+
+    def reload(self):
+        """
+        Re-read the files added or changed since the last reload, and drop
+            the removed ones.
+
+        Returns the set of keyIds and fingerprints that changed.
+        """
+        with self._lock:
+            old_files = self._files
+            files = {}
+            errors = {}
+            changed = set()
+            for path in self._scan():
+                try:
+                    stat = _stat_key(path)
+                except OSError:
+                    # Removed while scanning.
+                    continue
+                old = old_files.get(path)
+                if old is not None and old[0] == stat:
+                    files[path] = old
+                    if path in self.errors:
+                        errors[path] = self.errors[path]
+                    continue
+                try:
+                    entry = self._load(path)
+                except (HttpSigException, IOError, OSError) as e:
+                    entry = None
+                    errors[path] = str(e)
+                files[path] = (stat, entry)
+                for item in (old, files[path]):
+                    if item is not None and item[1] is not None:
+                        changed.update((item[1].key_id, item[1].fingerprint))
+            for path, (_, entry) in old_files.items():
+                if path not in files and entry is not None:
+                    changed.update((entry.key_id, entry.fingerprint))
+
+            if changed:
+                by_id = {}
+                by_fingerprint = {}
+                for _, entry in files.values():
+                    if entry is not None:
+                        by_id[entry.key_id] = entry
+                        by_fingerprint[entry.fingerprint] = entry
+                self._index = (by_id, by_fingerprint)
+            self._files = files
+            self.errors = errors
+
+        if changed and self.on_change is not None:
+            self.on_change(changed)
+        return changed
+
+    def start(self, interval=10):
+        """
+        Reload every `interval` seconds in a daemon thread, until stop().
+            Errors, e.g. a missing directory, keep the previous keys.
+        """
+        if self._stop is not None:
+            return
+        self._stop = stop = threading.Event()
+
+        def poll():
+            while not stop.wait(interval):
+                try:
+                    self.reload()
+                except Exception:
+                    pass
+
+        thread = threading.Thread(target=poll)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        if self._stop is not None:
+            self._stop.set()
+            self._stop = None
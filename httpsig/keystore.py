@@ -0,0 +1,366 @@
+"""
+Module to cache parsed verification keys between requests.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from .utils import HttpSigException
+from .verify import new_verifier
+
+try:
+    _monotonic = time.monotonic
+except AttributeError:
+    # Python 2
+    _monotonic = time.time
+
+# Marker stored in the cache for keyIds the loader did not know about.
+_UNKNOWN = object()
+
+
+class _Flight(object):
+    """
+    One load of a key, awaited by every thread that missed it meanwhile.
+    """
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def result(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def _check_secret(secret, algorithm):
+    # Raises HttpSigException if `secret` cannot verify `algorithm`.
+    if algorithm is not None:
+        new_verifier(secret, algorithm)
+
+
+class StaticKeyLoader(object):
+    """
+    Key loader returning secrets from a fixed mapping of keyId to secret.
+
+    With `algorithm`, secrets are only returned for that algorithm, and each
+        is checked to suit it here; otherwise the verifiers refuse public
+        keys as HMAC secrets.
+
+    Unlike a lambda or closure this can be pickled, so stores using it can be
+    shipped to worker processes.
+    """
+    def __init__(self, keys, algorithm=None):
+        self.keys = dict(keys)
+        self.algorithm = algorithm
+        for secret in self.keys.values():
+            _check_secret(secret, algorithm)
+
+    def __call__(self, key_id, algorithm):
+        if self.algorithm is not None and algorithm != self.algorithm:
+            return None
+        return self.keys.get(key_id)
+
+
+class FixedKeyLoader(object):
+    """
+    Key loader returning the same secret whatever the keyId, only for
+        `algorithm` when given (see StaticKeyLoader).
+    """
+    def __init__(self, secret, algorithm=None):
+        self.secret = secret
+        self.algorithm = algorithm
+        _check_secret(secret, algorithm)
+
+    def __call__(self, key_id, algorithm):
+        if self.algorithm is not None and algorithm != self.algorithm:
+            return None
+        return self.secret
+
+
+class KeyStore(object):
+    """
+    Maps a keyId and algorithm to a ready-to-use verifier (see
+        httpsig.verify.new_verifier()), so keys are parsed once instead of
+        on every request.
+
+    :arg loader:       a callable `loader(key_id, algorithm)` returning the
+        HMAC secret or RSA/ed25519 *public* key for `key_id`, or None if the
+        keyId is unknown.
+    :arg maxsize:      the maximum number of cached entries (including
+        unknown keyIds); the least recently used entry is evicted first.
+    :arg ttl:          seconds a parsed key stays cached, or None to keep it
+        until evicted.
+    :arg negative_ttl: seconds an unknown keyId is remembered before the
+        loader is asked again. 0 disables negative caching.
+    :arg backend:      the crypto backend parsing keys, see httpsig.backends.
+    :arg stale_ttl:    seconds past `ttl` an expired key is still served
+        while it is reloaded in the background (stale-while-revalidate), or
+        None to reload it before answering.
+
+    Concurrent misses for one keyId and algorithm are coalesced: one thread
+        calls the loader and parses the key, the others wait for it.
+    """
+    def __init__(self, loader=None, maxsize=1024, ttl=None, negative_ttl=60,
+                 backend=None, stale_ttl=None):
+        self.loader = loader
+        self.backend = backend
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+        self.stale_hits = 0
+        self.refresh_errors = 0
+        self._cache = OrderedDict()
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # Only the configuration is pickled; a store shipped to a worker
+        # process starts with an empty cache and parses keys there.
+        return {'loader': self.loader,
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'negative_ttl': self.negative_ttl,
+                'backend': self.backend,
+                'stale_ttl': self.stale_ttl}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __len__(self):
+        return len(self._cache)
+
+    @property
+    def stats(self):
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'coalesced': self.coalesced,
+                'stale_hits': self.stale_hits,
+                'refresh_errors': self.refresh_errors,
+                'size': len(self._cache)}
+
+    def _lookup(self, key):
+        """
+        Return (value, stale) for `key`, or (None, False) on a miss; `value`
+            may be _UNKNOWN.
+        """
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                value, expires = entry
+                stale = False
+                if expires is not None:
+                    now = _monotonic()
+                    if expires <= now:
+                        stale = (self.stale_ttl is not None and
+                                 value is not _UNKNOWN and
+                                 expires + self.stale_ttl > now)
+                        if not stale:
+                            del self._cache[key]
+                            self.misses += 1
+                            return None, False
+                        self.stale_hits += 1
+                # Re-insert to mark the entry as most recently used.
+                self._cache[key] = self._cache.pop(key)
+                self.hits += 1
+                return value, stale
+            self.misses += 1
+            return None, False
+
+    def _store(self, key, value, ttl):
+        expires = None if ttl is None else _monotonic() + ttl
+        with self._lock:
+            self._cache.pop(key, None)
+            self._cache[key] = (value, expires)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+                self.evictions += 1
+
+    def put(self, key_id, algorithm, secret):
+        """
+        Parse `secret` and cache the resulting verifier for `key_id`.
+
+        A `secret` of None marks the keyId as unknown for `negative_ttl`
+            seconds and raises HttpSigException.
+        """
+        key = (key_id, algorithm)
+        if secret is None:
+            if self.negative_ttl:
+                self._store(key, _UNKNOWN, self.negative_ttl)
+            raise HttpSigException("Unknown key.")
+        verifier = new_verifier(secret, algorithm, self.backend)
+        self._store(key, verifier, self.ttl)
+        return verifier
+
+    def preload(self, keys):
+        """
+        Load and parse `keys`, an iterable of (key_id, algorithm) pairs, e.g.
+            in a server's master process so that the workers it forks share
+            the parsed keys (see httpsig.prefork). Unknown keyIds are skipped.
+
+        Returns the number of keys loaded; beyond `maxsize` the first ones
+            are evicted again.
+        """
+        count = 0
+        for key_id, algorithm in keys:
+            try:
+                self.get(key_id, algorithm)
+            except HttpSigException:
+                continue
+            count += 1
+        return count
+
+    def invalidate(self, key_id=None, algorithm=None):
+        """
+        Drop cached entries for `key_id` (all algorithms unless `algorithm`
+            is given), or the whole cache when `key_id` is None.
+        """
+        with self._lock:
+            if key_id is None:
+                self._cache.clear()
+                return
+            for key in list(self._cache):
+                if key[0] == key_id and algorithm in (None, key[1]):
+                    del self._cache[key]
+
+    def lookup(self, key_id, algorithm):
+        """
+        Return (verifier, stale) for `key_id` and `algorithm`, without
+            calling the loader: the verifier is None on a miss, and `stale`
+            is True when it is past its `ttl` but within `stale_ttl`, and
+            should be reloaded.
+
+        Raises HttpSigException if the keyId is cached as unknown.
+        """
+        value, stale = self._lookup((key_id, algorithm))
+        if value is _UNKNOWN:
+            raise HttpSigException("Unknown key.")
+        return value, stale
+
+    def peek(self, key_id, algorithm):
+        """
+        Return the cached verifier for `key_id` and `algorithm`, or None on a
+            miss, without calling the loader.
+
+        Raises HttpSigException if the keyId is cached as unknown.
+        """
+        return self.lookup(key_id, algorithm)[0]
+
+    def get(self, key_id, algorithm):
+        """
+        Return the cached verifier for `key_id` and `algorithm`, loading and
+            parsing the key on a miss. A stale key is returned as is and
+            reloaded in a background thread.
+
+        Raises HttpSigException if the keyId is unknown.
+        """
+        verifier, stale = self.lookup(key_id, algorithm)
+        if verifier is None:
+            return self.load(key_id, algorithm)
+        if stale:
+            self.refresh(key_id, algorithm)
+        return verifier
+
+    def _join(self, key):
+        """
+        Return (flight, leader): the load of `key` in progress, or a new one
+            that the caller (the leader) must run.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = _Flight()
+            entry = self._cache.get(key)
+            if entry is not None and (entry[1] is None or
+                                      entry[1] > _monotonic()):
+                # Loaded by another thread since the caller's miss.
+                if entry[0] is _UNKNOWN:
+                    flight.error = HttpSigException("Unknown key.")
+                else:
+                    flight.value = entry[0]
+                flight.done.set()
+                return flight, False
+            self._flights[key] = flight
+            return flight, True
+
+    def _fly(self, key, flight):
+        try:
+            secret = self.loader(*key) if self.loader else None
+            flight.value = self.put(key[0], key[1], secret)
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+    def load(self, key_id, algorithm):
+        """
+        Call the loader for `key_id` and `algorithm` and cache the parsed
+            key, or wait for the load already in progress in another
+            thread.
+
+        Raises HttpSigException if the keyId is unknown.
+        """
+        key = (key_id, algorithm)
+        flight, leader = self._join(key)
+        if leader:
+            self._fly(key, flight)
+        return flight.result()
+
+    def refresh(self, key_id, algorithm):
+        """
+        Reload `key_id` and `algorithm` in a background thread, unless a
+            load is already in progress. Errors are counted in
+            `refresh_errors`; a keyId the loader no longer knows becomes
+            unknown.
+        """
+        key = (key_id, algorithm)
+        flight, leader = self._join(key)
+        if not leader:
+            return
+        thread = threading.Thread(target=self._refresh, args=(key, flight))
+        thread.daemon = True
+        thread.start()
+
+    def _refresh(self, key, flight):
+        self._fly(key, flight)
+        if flight.error is not None:
+            with self._lock:
+                self.refresh_errors += 1
+
+
+class FixedKeyStore(KeyStore):
+    """
+    A KeyStore whose loader returns the same key whatever the keyId, e.g. a
+        FixedKeyLoader. Keys are cached by algorithm only, so the keyIds of
+        requests neither parse the key again nor evict it.
+    """
+    def put(self, key_id, algorithm, secret):
+        return super(FixedKeyStore, self).put(None, algorithm, secret)
+
+    def invalidate(self, key_id=None, algorithm=None):
+        with self._lock:
+            for key in list(self._cache):
+                if algorithm in (None, key[1]):
+                    del self._cache[key]
+
+    def lookup(self, key_id, algorithm):
+        return super(FixedKeyStore, self).lookup(None, algorithm)
+
+    def load(self, key_id, algorithm):
+        return super(FixedKeyStore, self).load(None, algorithm)
+
+    def refresh(self, key_id, algorithm):
+        return super(FixedKeyStore, self).refresh(None, algorithm)
@@ -0,0 +1,201 @@
+"""
+Module to collect verification counters and latencies, e.g. from the WSGI
+middleware.
+"""
+import bisect
+import threading
+
+# Upper bounds, in seconds, of the latency histogram buckets: 1us to ~8s in
+# powers of two. Slower observations go to a last, unbounded bucket.
+LATENCY_BUCKETS = tuple(1e-6 * 2 ** i for i in range(24))
+
+# Outcomes of a verification.
+OK = 'ok'
+INVALID = 'invalid'    # the signature did not match
+REJECTED = 'rejected'  # no signature check: bad header, unknown key...
+OUTCOMES = (OK, INVALID, REJECTED)
+
+# The key used for keyIds and algorithms past `max_keys`.
+OTHER = ('(other)', '(other)')
+
+
+class Histogram(object):
+    """
+    A fixed-bucket latency histogram: constant memory, cheap to update and
+        good enough for percentiles to within a factor of two.
+    """
+    __slots__ = ('buckets', 'counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.total += other.total
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def percentile(self, p):
+        """
+        Return the upper bound of the bucket holding the `p`th percentile (0
+            to 100), capped by the largest observation, or None if empty.
+        """
+        if not self.count:
+            return None
+        rank = max(1, p / 100.0 * self.count)
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                break
+        if i < len(self.buckets):
+            return min(self.buckets[i], self.max)
+        return self.max
+
+    def as_dict(self):
+        return {'count': self.count,
+                'mean': self.mean,
+                'min': self.min,
+                'max': self.max,
+                'p50': self.percentile(50),
+                'p90': self.percentile(90),
+                'p99': self.percentile(99)}
+
+
+class VerificationMetrics(object):
+    """
+    Thread-safe counters and latency histograms of verifications, per keyId
+        and algorithm.
+
+    :arg max_keys: the most (keyId, algorithm) pairs tracked separately;
+        further ones are counted under OTHER, so requests with made-up
+        keyIds cannot grow memory without bound.
+    """
+    def __init__(self, max_keys=1024):
+        self.max_keys = max_keys
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, key_id, algorithm, outcome, seconds):
+        """
+        Record one verification of `outcome` (OK, INVALID or REJECTED) that
+            took `seconds`. `key_id` and `algorithm` are None when the
+            signature could not be parsed.
+        """
+        key = (key_id, algorithm)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= self.max_keys:
+                    key = OTHER
+                    stats = self._stats.get(key)
+                if stats is None:
+                    stats = self._stats[key] = (
+                        dict.fromkeys(OUTCOMES, 0), Histogram())
+            stats[0][outcome] += 1
+            stats[1].add(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def snapshot(self):
+        """
+        Return a list of dicts with the counters and latency statistics (in
+            seconds) of each keyId and algorithm.
+        """
+        with self._lock:
+            return [dict(counts, key_id=key[0], algorithm=key[1],
+                         latency=histogram.as_dict())
+                    for key, (counts, histogram) in self._stats.items()]
+
+    def totals(self):
+        """
+        Return the counters and latency statistics of all verifications.
+        """
+        counts = dict.fromkeys(OUTCOMES, 0)
+        histogram = Histogram()
+        with self._lock:
+            for key_counts, key_histogram in self._stats.values():
+                for outcome in OUTCOMES:
+                    counts[outcome] += key_counts[outcome]
+                histogram.merge(key_histogram)
+        return dict(counts, latency=histogram.as_dict())
+
+
+class PhaseMetrics(object):
+    """
+    A hook for httpsig.instrument aggregating phase timings in latency
+        histograms, per operation, algorithm and keyId. Thread-safe.
+
+        metrics = PhaseMetrics()
+        httpsig.instrument.add_hook(metrics)
+
+    :arg max_keys: the most (operation, algorithm, keyId) triples tracked
+        separately; further ones are counted under keyId and algorithm
+        OTHER.
+    """
+    def __init__(self, max_keys=1024):
+        self.max_keys = max_keys
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, operation, algorithm, key_id, timings):
+        key = (operation, algorithm, key_id)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= self.max_keys:
+                    key = (operation,) + OTHER
+                    stats = self._stats.get(key)
+                if stats is None:
+                    stats = self._stats[key] = {}
+            total = 0.0
+            for phase, seconds in timings.items():
+                histogram = stats.get(phase)
+                if histogram is None:
+                    histogram = stats[phase] = Histogram()
+                histogram.add(seconds)
+                total += seconds
+            histogram = stats.get('total')
+            if histogram is None:
+                histogram = stats['total'] = Histogram()
+            histogram.add(total)
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def snapshot(self):
+        """
+        Return a list of dicts with the latency statistics (in seconds) of
+            each phase, and of their 'total', per operation, algorithm and
+            keyId.
+        """
+        with self._lock:
+            return [dict(operation=key[0], algorithm=key[1], key_id=key[2],
+                         phases=dict((phase, histogram.as_dict())
+                                     for phase, histogram in stats.items()))
+                    for key, stats in self._stats.items()]
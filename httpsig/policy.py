@@ -0,0 +1,235 @@
+"""
+Module to reject requests that cannot verify before any crypto runs.
+
+A Policy runs cheap checks, in the order of STAGES, on the parsed signature
+of a request. It is run by RequestVerifier and HeaderVerifier before the key
+is looked up and the signing string is built. Most bad requests are turned
+away by a dictionary lookup or an integer comparison, without an RSA
+operation. Each stage counts the requests it rejected.
+"""
+import threading
+
+import six
+
+from . import clock
+from .utils import ALGORITHMS, HttpSigException
+
+# The checks, in the order they run.
+ALGORITHM = 'algorithm'  # algorithm unknown or not allowed
+KEY_ID = 'key_id'        # keyId not allowed
+HEADERS = 'headers'      # a required header is not signed
+SIGNATURE = 'signature'  # signature of the wrong size for the algorithm
+CREATED = 'created'      # (created) missing, in the future or too old
+EXPIRES = 'expires'      # (expires) missing or past
+DATE = 'date'            # Date header outside the allowed window
+STAGES = (ALGORITHM, KEY_ID, HEADERS, SIGNATURE, CREATED, EXPIRES, DATE)
+
+# The (smallest, largest) size in bytes of a signature, by algorithm. RSA
+# signatures are as long as the modulus: 1024 to 8192 bits.
+SIGNATURE_SIZES = {'hmac-sha1': (20, 20),
+                   'hmac-sha256': (32, 32),
+                   'hmac-sha512': (64, 64),
+                   'rsa-sha1': (128, 1024),
+                   'rsa-sha256': (128, 1024),
+                   'rsa-sha512': (128, 1024),
+                   'ed25519': (64, 64)}
+
+
+class Rejected(HttpSigException):
+    """
+    A request rejected by a Policy check; `stage` is one of STAGES.
+    """
+    def __init__(self, stage, message):
+        super(Rejected, self).__init__(message)
+        self.stage = stage
+
+
+def decoded_size(signature):
+    """
+    Return the number of bytes a base64 `signature` (text or bytes) decodes
+        to, without decoding it, or None if its length is not valid base64.
+    """
+    size = len(signature)
+    if size % 4:
+        return None
+    if not isinstance(signature, six.string_types):
+        signature = signature.decode('ascii', 'replace')
+    return size // 4 * 3 - (len(signature) - len(signature.rstrip('=')))
+
+
+def _timestamp(value):
+    # (created) is an integer, but (expires) may have a fraction.
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class Policy(object):
+    """
+    Checks run on every request before its signature is verified.
+
+    :arg required_headers: Optional. A list of headers required to be signed.
+        Defaults to ['date'].
+    :arg algorithms:       Optional. The algorithms accepted, by default all
+        of httpsig.utils.ALGORITHMS.
+    :arg key_ids:          Optional. The keyIds accepted: a set (or any
+        container), or a function `key_ids(key_id)` returning whether one is
+        accepted. By default any keyId is looked up.
+    :arg max_skew:         Optional. Seconds the clocks of signers may be
+        ahead or behind: a (created) or Date further in the future, or an
+        (expires) further in the past, is rejected. Default is 300.
+    :arg max_age:          Optional. Seconds a signature is accepted after
+        its (created) time or, when 'date' is signed, its Date header,
+        plus :arg:max_skew. Dates are not checked by default.
+
+    A (created) or (expires) signed by the request must be given as the
+        `created` or `expires` parameter of its signature.
+
+    `rejections` counts the requests rejected by each stage.
+    """
+    def __init__(self, required_headers=None, algorithms=None, key_ids=None,
+                 max_skew=300, max_age=None):
+        required_headers = required_headers or ['date']
+        self.required_headers = frozenset(s.lower() for s in required_headers)
+        self.algorithms = frozenset(
+            ALGORITHMS if algorithms is None else algorithms)
+        unknown = self.algorithms - ALGORITHMS
+        if unknown:
+            raise HttpSigException(
+                "Unsupported algorithm(s): %s." % ', '.join(sorted(unknown)))
+        if key_ids is None or callable(key_ids):
+            self._key_ids = key_ids
+        else:
+            self._key_ids = key_ids.__contains__
+        self.max_skew = max_skew
+        self.max_age = max_age
+        self.rejections = dict.fromkeys(STAGES, 0)
+        self._lock = threading.Lock()
+        self._parse_date = DateParser()
+
+    def __getstate__(self):
+        # Locks cannot be pickled: a copy, e.g. in a worker process, gets
+        # its own lock and date cache.
+        state = self.__dict__.copy()
+        del state['_lock'], state['_parse_date']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._parse_date = DateParser()
+
+    def reject(self, stage, message):
+        """
+        Count a rejection by `stage` and return the Rejected to raise.
+        """
+        with self._lock:
+            self.rejections[stage] += 1
+        return Rejected(stage, message)
+
+    def check_algorithm(self, algorithm):
+        """
+        Raise Rejected if `algorithm` is not allowed.
+        """
+        if algorithm not in self.algorithms:
+            raise self.reject(ALGORITHM, "Unsupported algorithm.")
+
+    def check(self, params, auth_headers, headers=None, now=None):
+        """
+        Run every check on a request.
+
+        :arg params:       the SignatureParams of the request.
+        :arg auth_headers: the list of signed headers.
+        :arg headers:      Optional. The case-insensitive headers of the
+            request, needed to check its Date.
+        :arg now:          Optional. The current Unix time, read from the
+            clock when a check needs it.
+
+        Raises Rejected at the first failed check.
+        """
+        algorithm = params.algorithm
+        self.check_algorithm(algorithm)
+
+        if self._key_ids is not None and not self._key_ids(params.key_id):
+            raise self.reject(KEY_ID, "Unknown keyId.")
+
+        missing = self.required_headers.difference(auth_headers)
+        if missing:
+            raise self.reject(HEADERS, '{} is a required header(s)'.format(
+                ', '.join(sorted(missing))))
+
+        size = decoded_size(params.signature or '')
+        smallest, largest = SIGNATURE_SIZES[algorithm]
+        if size is None or not smallest <= size <= largest:
+            raise self.reject(SIGNATURE, "Invalid signature size.")
+
+        signs_created = '(created)' in auth_headers
+        signs_expires = '(expires)' in auth_headers
+        check_date = self.max_age is not None and 'date' in auth_headers
+        if not (signs_created or signs_expires or check_date or
+                params.created is not None or params.expires is not None):
+            return
+        if now is None:
+            now = clock.get_clock().now()
+
+        if signs_created or params.created is not None:
+            created = _timestamp(params.created)
+            if created is None:
+                raise self.reject(CREATED, "Missing or invalid created.")
+            if created > now + self.max_skew:
+                raise self.reject(CREATED, "Signature created in the future.")
+            if (self.max_age is not None and
+                    created < now - self.max_age - self.max_skew):
+                raise self.reject(CREATED, "Signature too old.")
+
+        if signs_expires or params.expires is not None:
+            expires = _timestamp(params.expires)
+            if expires is None:
+                raise self.reject(EXPIRES, "Missing or invalid expires.")
+            if expires < now - self.max_skew:
+                raise self.reject(EXPIRES, "Signature expired.")
+
+        if check_date:
+            date = self._parse_date(
+                headers.get('date') if headers is not None else None)
+            if date is None:
+                raise self.reject(DATE, "Missing or invalid Date header.")
+            if not (now - self.max_age - self.max_skew <= date <=
+                    now + self.max_skew):
+                raise self.reject(DATE, "Date header out of range.")
+
+
+def parse_date(value):
+    """
+    Return the Unix time of a Date header value, or None.
+    """
+    if not value:
+        return None
+    if not isinstance(value, six.string_types):
+        value = bytes(value).decode('ascii', 'replace')
+    # Imported here, as email.utils is slow to import.
+    from email.utils import mktime_tz, parsedate_tz
+    parsed = parsedate_tz(value)
+    if parsed is None:
+        return None
+    return mktime_tz(parsed)
+
+
+class DateParser(object):
+    """
+    parse_date() remembering the last value parsed: requests signed in the
+        same second share their Date.
+    """
+    __slots__ = ('_last',)
+
+    def __init__(self):
+        # (Date header, Unix time), replaced as a whole.
+        self._last = (None, None)
+
+    def __call__(self, value):
+        last, date = self._last
+        if value != last:
+            date = parse_date(value)
+            self._last = (value, date)
+        return date
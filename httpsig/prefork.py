@@ -0,0 +1,42 @@
+"""
+Module to prepare keys in a server's master process before it forks its
+workers (gunicorn with ``preload_app``, uWSGI without ``lazy-apps``...).
+
+Keys parsed in the master are inherited by every worker, which then shares
+their memory pages copy-on-write instead of parsing each key again on its
+first request.
+"""
+import gc
+
+
+def freeze():
+    """
+    Move every object tracked by the garbage collector to a permanent
+        generation (Python 3.7+), so collections in the workers do not write
+        to them and copy their pages. Does nothing on older Pythons.
+    """
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
+
+
+def preload(store, keys=None, algorithms=None, freeze_objects=True):
+    """
+    Parse keys into `store`, a KeyStore, before forking.
+
+    :arg keys:       Optional. The (keyId, algorithm) pairs to load. Defaults
+        to every key of the store's loader, which must then be a
+        httpsig.keydir.KeyDirectory.
+    :arg algorithms: Optional. With the default `keys`, the algorithms to
+        parse each key for, by family; see KeyDirectory.key_pairs().
+    :arg freeze_objects: Optional. Call freeze() afterwards. Default is
+        True.
+
+    Returns the number of keys loaded.
+    """
+    if keys is None:
+        keys = store.loader.key_pairs(algorithms)
+    count = store.preload(keys)
+    if freeze_objects:
+        freeze()
+    return count
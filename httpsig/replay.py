@@ -0,0 +1,252 @@
+"""
+Module to reject replayed signatures with a fixed amount of memory.
+
+A ReplayGuard remembers the signatures verified during a window of time in
+Bloom filters, one per bucket of time, each reused once its bucket leaves
+the window. Memory depends on the window, the expected request rate and the
+false-positive rate, not on traffic. A false positive rejects a fresh
+signature as replayed; a replay within the window is always rejected.
+
+Each signature is filed under the time it was signed, its (created) or Date,
+which must be signed. Signatures older than the window are rejected, as
+they could no longer be told apart from replays.
+
+The filters are kept by a ReplayStore. BloomStore keeps them in the memory
+of the process or, with `shared`, in memory shared with the processes forked
+after it is created. Other stores, e.g. a server on a local socket used by
+several servers, implement ReplayStore.add().
+"""
+import abc
+import base64
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+
+import six
+
+from . import clock
+from .policy import DateParser
+from .utils import HttpSigException
+
+# Reasons to reject a signature.
+REPLAY = 'replay'  # seen before, or a false positive
+WINDOW = 'window'  # signed outside of the window
+TIME = 'time'      # no signed (created) or Date
+REASONS = (REPLAY, WINDOW, TIME)
+
+# The bucket number at the start of each slot of a BloomStore.
+_TAG = struct.Struct('>q')
+_EMPTY = -1
+
+
+class Replayed(HttpSigException):
+    """
+    A signature rejected by a ReplayGuard; `reason` is one of REASONS.
+    """
+    def __init__(self, reason, message):
+        super(Replayed, self).__init__(message)
+        self.reason = reason
+
+
+def bloom_size(capacity, error_rate):
+    """
+    Return the (number of bits, number of hashes) of a Bloom filter holding
+        `capacity` keys with a false-positive rate of `error_rate`.
+    """
+    bits = -capacity * math.log(error_rate) / math.log(2) ** 2
+    bits = max(8, int(math.ceil(bits / 8.0)) * 8)
+    hashes = max(1, int(round(bits / float(capacity) * math.log(2))))
+    return bits, hashes
+
+
+if hasattr(hashlib, 'blake2b'):
+    def _digest(key, salt):
+        return hashlib.blake2b(key, digest_size=16, key=salt).digest()
+else:
+    # Python 2
+    def _digest(key, salt):
+        return hashlib.sha256(salt + key).digest()[:16]
+
+
+@six.add_metaclass(abc.ABCMeta)
+class ReplayStore(object):
+    """
+    Abstract base class of the storage of a ReplayGuard: a set of keys per
+        bucket of time, of which only the latest `slots` are kept.
+
+    `shared` is True when the processes forked after the store is created
+        all use it, so that they can verify requests with one ReplayGuard.
+    """
+    slots = None
+    shared = False
+
+    @abc.abstractmethod
+    def add(self, bucket, key):
+        """
+        Add `key` (bytes) to `bucket`, an integer increasing with time.
+            Adding to a bucket newer than all others may drop the oldest.
+
+        Returns False if the key was (probably) added to the bucket before,
+            or if the bucket was dropped; True otherwise.
+        """
+
+
+class BloomStore(ReplayStore):
+    """
+    A Bloom filter of `capacity` keys with a false-positive rate of
+        `error_rate` for each of `slots` buckets, allocated up front.
+
+    Keys are hashed with a random salt, so they cannot be chosen to collide.
+
+    :arg shared: Optional. Keep the filters in an anonymous shared mmap,
+        locked by a multiprocessing.Lock, so that processes forked after the
+        store is created (e.g. the workers of a preforking server) share
+        them.
+    """
+    def __init__(self, slots, capacity, error_rate=0.001, shared=False):
+        self.slots = slots
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.shared = shared
+        self.bits, self.hashes = bloom_size(capacity, error_rate)
+        # Each slot holds its bucket number, then its filter.
+        self._stride = _TAG.size + self.bits // 8
+        size = slots * self._stride
+        if shared:
+            import multiprocessing
+            self._data = mmap.mmap(-1, size)
+            self._lock = multiprocessing.Lock()
+        else:
+            self._data = bytearray(size)
+            self._lock = threading.Lock()
+        for slot in range(slots):
+            _TAG.pack_into(self._data, slot * self._stride, _EMPTY)
+        self._salt = os.urandom(16)
+        self._hashes = tuple(range(self.hashes))
+
+    @property
+    def memory(self):
+        """
+        The bytes used by the filters.
+        """
+        return self.slots * self._stride
+
+    def add(self, bucket, key):
+        h1, h2 = struct.unpack('<QQ', _digest(key, self._salt))
+        # Double hashing: the i-th bit is h1 + i * h2; an odd h2 never
+        # cycles early, whatever the number of bits.
+        h2 |= 1
+        bits = self.bits
+        data = self._data
+        with self._lock:
+            start = (bucket % self.slots) * self._stride
+            tag, = _TAG.unpack_from(data, start)
+            if tag != bucket:
+                if tag > bucket:
+                    # The bucket's slot was reused by a later one.
+                    return False
+                data[start + _TAG.size:start + self._stride] = \
+                    b'\0' * (self._stride - _TAG.size)
+                _TAG.pack_into(data, start, bucket)
+            start += _TAG.size
+            added = False
+            for i in self._hashes:
+                bit = (h1 + i * h2) % bits
+                index = start + (bit >> 3)
+                mask = 1 << (bit & 7)
+                byte = data[index]
+                if not byte & mask:
+                    data[index] = byte | mask
+                    added = True
+            return added
+
+
+class ReplayGuard(object):
+    """
+    Rejects signatures verified before within a window of time.
+
+    :arg window:     seconds a signature is remembered after the time it was
+        signed; older signatures are rejected. Use at least the `max_age`
+        plus `max_skew` of the verifier's Policy.
+    :arg rate:       the most signatures expected per second, which sizes
+        the filters. Beyond it the false-positive rate grows.
+    :arg error_rate: Optional. The false-positive rate at :arg:rate. Default
+        is 0.001.
+    :arg buckets:    Optional. The number of buckets the window is split
+        into: memory is reused one bucket at a time. Default is 10.
+    :arg max_skew:   Optional. Seconds a signature may be signed in the
+        future, which adds to the buckets kept. Default is 300.
+    :arg shared:     Optional. Create the BloomStore in shared memory, see
+        BloomStore.
+    :arg store:      Optional. The ReplayStore to use instead of a new
+        BloomStore. It must keep at least `slots` buckets.
+
+    `rejections` counts the signatures rejected by reason, in this process.
+        Verifying in a process pool (see httpsig.batch.verify_many()) needs a
+        shared store.
+    """
+    def __init__(self, window=300, rate=1000, error_rate=0.001, buckets=10,
+                 max_skew=300, shared=False, store=None):
+        self.window = window
+        self.max_skew = max_skew
+        self.width = float(window) / buckets
+        # Enough slots for every bucket from `window` ago to `max_skew`
+        # ahead, including the partial ones at both ends.
+        self.slots = buckets + int(math.ceil(max_skew / self.width)) + 1
+        if store is None:
+            store = BloomStore(self.slots,
+                               max(1, int(math.ceil(rate * self.width))),
+                               error_rate, shared)
+        elif store.slots is not None and store.slots < self.slots:
+            raise HttpSigException(
+                "The replay store must keep %d buckets." % self.slots)
+        self.store = store
+        self.rejections = dict.fromkeys(REASONS, 0)
+        self._lock = threading.Lock()
+        self._parse_date = DateParser()
+
+    def _reject(self, reason, message):
+        with self._lock:
+            self.rejections[reason] += 1
+        return Replayed(reason, message)
+
+    def add(self, signature, signed_at, now=None):
+        """
+        Record a verified `signature` (decoded, as bytes) signed at the Unix
+            time `signed_at`.
+
+        Raises Replayed if the signature was recorded before, or if it was
+            signed outside of the window.
+        """
+        if now is None:
+            now = clock.get_clock().now()
+        if not now - self.window <= signed_at <= now + self.max_skew:
+            raise self._reject(WINDOW, "Signature outside of the window.")
+        if not self.store.add(int(signed_at // self.width), signature):
+            raise self._reject(REPLAY, "Replayed signature.")
+
+    def check(self, params, auth_headers, headers, now=None):
+        """
+        Record the verified signature of a request, see add().
+
+        It was signed at its created parameter when '(created)' is signed,
+            or else at its Date header when 'date' is signed.
+
+        :arg params:       the SignatureParams of the request.
+        :arg auth_headers: the list of signed headers.
+        :arg headers:      the case-insensitive headers of the request.
+        """
+        signed_at = None
+        if '(created)' in auth_headers and params.created is not None:
+            try:
+                signed_at = float(params.created)
+            except ValueError:
+                pass
+        elif 'date' in auth_headers:
+            signed_at = self._parse_date(headers.get('date'))
+        if signed_at is None:
+            raise self._reject(TIME, "The signature has no signed time.")
+        self.add(base64.b64decode(params.signature), signed_at, now)
@@ -1,12 +1,29 @@
+import re
+
 import requests.auth
-try:
-    # Python 3
-    from urllib.parse import urlparse
-except ImportError:
-    # Python 2
-    from urlparse import urlparse
+import six
 
+from . import clock
+from .digest import DEFAULT_DIGEST_ALGORITHM, compute_digest
 from .sign import HeaderSigner
+from .utils import HttpSigException
+
+# Splits a prepared URL into origin (scheme and netloc), netloc and the path
+# and query, leaving out any fragment.
+_URL_RE = re.compile(r'([^:/?#]+://([^/?#]*))([^#]*)')
+_MAX_HOSTS = 256
+
+
+class HostContext(object):
+    """
+    What HTTPSignatureAuth prepares once per scheme and host: the host
+        signed as 'host' and the MessageBuilder bound to it.
+    """
+    __slots__ = ('host', 'message')
+
+    def __init__(self, host, message):
+        self.host = host
+        self.message = message
 
 
 class HTTPSignatureAuth(requests.auth.AuthBase):
@@ -20,21 +37,91 @@ class HTTPSignatureAuth(requests.auth.AuthBase):
     `algorithm` is one of the six specified algorithms
       headers is a list of http headers to be included in the signing string,
       defaulting to "Date" alone.
+    `digest_algorithm` is the algorithm used to fill in the Digest header
+      when "digest" is signed and the request has none, 'SHA-256' or
+      'SHA-512'. File bodies are hashed in chunks and rewound.
+    `expires_in` is the number of seconds signatures are valid for,
+      required to sign '(expires)'.
+
+    Set on a Session, the URL of each request is split without urlparse and
+      the signing state of its host is prepared once (see HostContext). Only
+      the signature header (and Date and Digest, when signed and missing) is
+      written to the request.
     """
-    def __init__(self, key_id='', secret='', algorithm=None, headers=None):
+    def __init__(self, key_id='', secret='', algorithm=None, headers=None,
+                 digest_algorithm=DEFAULT_DIGEST_ALGORITHM, expires_in=None):
         headers = headers or []
         self.header_signer = HeaderSigner(
                                 key_id=key_id, secret=secret,
-                                algorithm=algorithm, headers=headers)
+                                algorithm=algorithm, headers=headers,
+                                expires_in=expires_in)
         self.uses_host = 'host' in [h.lower() for h in headers]
+        self.uses_digest = 'digest' in [h.lower() for h in headers]
+        self.uses_date = 'date' in self.header_signer._message.headers
+        self.uses_clock = self.header_signer._message.uses_clock
+        self.digest_algorithm = digest_algorithm
+        self._hosts = {}
+
+    def host_context(self, origin, netloc):
+        """
+        Return the (cached) HostContext for requests to `origin`.
+        """
+        context = self._hosts.get(origin)
+        if context is None:
+            if len(self._hosts) >= _MAX_HOSTS:
+                self._hosts.clear()
+            message = self.header_signer._message
+            if self.uses_host:
+                # 'Host' header unavailable in request object at this
+                # point, so the host comes from the url.
+                message = message.bind(netloc)
+            context = self._hosts[origin] = HostContext(netloc, message)
+        return context
+
+    def body_digest(self, body):
+        """
+        Return the Digest header value for a prepared request body.
+        """
+        if hasattr(body, 'read'):
+            if not hasattr(body, 'seek'):
+                raise HttpSigException(
+                    "Cannot compute the digest of a body that cannot be "
+                    "rewound.")
+            position = body.tell()
+            try:
+                return compute_digest(body, self.digest_algorithm)
+            finally:
+                body.seek(position)
+        if body is not None and not isinstance(
+                body, (six.binary_type, six.text_type, bytearray, memoryview)):
+            # A generator would be consumed before it is sent.
+            raise HttpSigException(
+                "Cannot compute the digest of a streamed body.")
+        if isinstance(body, six.text_type):
+            # http.client sends str bodies as latin-1, not UTF-8.
+            try:
+                body = body.encode('latin-1')
+            except UnicodeEncodeError:
+                raise HttpSigException(
+                    "Cannot send a str body that is not latin-1; encode "
+                    "it first.")
+        return compute_digest(body, self.digest_algorithm)
 
     def __call__(self, r):
-        headers = self.header_signer.sign(
-                r.headers,
-                # 'Host' header unavailable in request object at this point
-                # if 'host' header is needed, extract it from the url
-                host=urlparse(r.url).netloc if self.uses_host else None,
-                method=r.method,
-                path=r.path_url)
-        r.headers.update(headers)
+        origin, netloc, path = _URL_RE.match(r.url).groups()
+        if not path.startswith('/'):
+            path = '/' + path
+        context = self.host_context(origin, netloc)
+
+        if self.uses_digest and 'digest' not in r.headers:
+            r.headers['Digest'] = self.body_digest(r.body)
+        now = clock.get_clock().now() if self.uses_clock else None
+        if self.uses_date and not r.headers.get('date'):
+            r.headers['Date'] = clock.get_clock().http_date(now)
+
+        signer = self.header_signer
+        value = signer.signature_value(context.message.build(
+                r.headers, method=r.method, path=path, now=now,
+                expires=None if now is None else signer.expires(now)), now)
+        r.headers[signer.sign_header] = value.decode('utf8')
         return r
@@ -1,94 +1,172 @@
+import abc
 import base64
 import six
 
-from Crypto.Hash import HMAC
-from Crypto.PublicKey import RSA
-from Crypto.Signature import PKCS1_v1_5
-from nacl.signing import SigningKey
-from nacl.encoding import Base64Encoder
-
+from . import clock, instrument
+from .backends import get_backend
 from .utils import *
 
 
 DEFAULT_SIGN_ALGORITHM = "hmac-sha256"
 
 
-class Signer(object):
+def _split_algorithm(algorithm):
     """
-    When using an RSA algo, the secret is a PEM-encoded private key.
-    When using an HMAC algo, the secret is the HMAC signing secret.
-    When using ed25519 algo, the secret is the base64-encoded private key
+    Return the signature and hash parts of an algorithm name, e.g.
+        ('rsa', 'sha256') or ('ed25519', None).
+    """
+    if algorithm is None:
+        algorithm = DEFAULT_SIGN_ALGORITHM
 
-    Password-protected keyfiles are not supported.
+    assert algorithm in ALGORITHMS, "Unknown algorithm"
+    sign_algorithm, _, hash_algorithm = algorithm.partition('-')
+    return sign_algorithm, hash_algorithm or None
+
+
+@six.add_metaclass(abc.ABCMeta)
+class BaseSigner(object):
     """
-    def __init__(self, secret, algorithm=None):
-        if algorithm is None:
-            algorithm = DEFAULT_SIGN_ALGORITHM
+    Abstract base class of the signers specialized for one algorithm family.
 
-        assert algorithm in ALGORITHMS, "Unknown algorithm"
+    Subclasses set `sign_algorithm` and implement `_load_key(backend,
+        secret)`; the key is parsed once here and `sign()` takes bytes only,
+        so nothing is checked or dispatched per call. Use new_signer() to
+        get the right class for an algorithm.
+    """
+    __slots__ = ('hash_algorithm', 'backend', '_secret', '_key')
+    sign_algorithm = None
+
+    def __init__(self, secret, hash_algorithm=None, backend=None):
+        self.hash_algorithm = hash_algorithm
+        self.backend = get_backend(backend)
+        self._secret = secret
         if isinstance(secret, six.string_types):
             secret = secret.encode("ascii")
+        self._key = self._load_key(self.backend, secret)
+
+    def __reduce__(self):
+        # Crypto objects cannot be pickled; rebuild from the secret.
+        return (self.__class__,
+                (self._secret, self.hash_algorithm, self.backend))
 
-        self._rsa = None
-        self._hash = None
-        self._ed25519 = None
-        splitted = algorithm.split('-')
-        if len(splitted) > 1:
-            self.sign_algorithm, self.hash_algorithm = splitted
-        else:
-            self.sign_algorithm, self.hash_algorithm = splitted[0], None
-
-        if self.sign_algorithm == 'rsa':
-            try:
-                rsa_key = RSA.importKey(secret)
-                self._rsa = PKCS1_v1_5.new(rsa_key)
-                self._hash = HASHES[self.hash_algorithm]
-            except ValueError:
-                raise HttpSigException("Invalid key.")
-
-        elif self.sign_algorithm == 'hmac':
-            self._hash = HMAC.new(secret,
-                                  digestmod=HASHES[self.hash_algorithm])
-        
-        elif self.sign_algorithm == 'ed25519':
-            self._ed25519 = SigningKey(secret, encoder=Base64Encoder)
-            
     @property
     def algorithm(self):
+        if self.hash_algorithm is None:
+            return self.sign_algorithm
         return '%s-%s' % (self.sign_algorithm, self.hash_algorithm)
 
-    def _sign_rsa(self, data):
-        if isinstance(data, six.string_types):
-            data = data.encode("ascii")
-        h = self._hash.new()
-        h.update(data)
-        return self._rsa.sign(h)
+    @abc.abstractmethod
+    def _load_key(self, backend, secret):
+        """
+        Return the key object of the backend for `secret` (bytes).
+        """
+
+    def sign(self, data):
+        """
+        Return the base64-encoded signature of `data`, which must be bytes.
+        """
+        return self.sign_bytes(data).decode("ascii")
+
+    def sign_bytes(self, data):
+        """
+        Return the base64-encoded signature of `data` as bytes.
+        """
+        if instrument.hooks:
+            timer = instrument.PhaseTimer(instrument.SIGN)
+            signature = self._sign_timed(data, timer)
+            timer.report(self.algorithm)
+            return signature
+        return base64.b64encode(self._key.sign(data))
+
+    def _sign_timed(self, data, timer):
+        signature = self._key.sign(data)
+        timer.mark(instrument.CRYPTO)
+        signature = base64.b64encode(signature)
+        timer.mark(instrument.BASE64)
+        return signature
+
+
+class HMACSigner(BaseSigner):
+    __slots__ = ()
+    sign_algorithm = 'hmac'
+
+    def _load_key(self, backend, secret):
+        return backend.hmac_key(secret, self.hash_algorithm)
+
+
+class RSASigner(BaseSigner):
+    __slots__ = ()
+    sign_algorithm = 'rsa'
+
+    def _load_key(self, backend, secret):
+        return backend.rsa_private_key(secret, self.hash_algorithm)
+
+
+class Ed25519Signer(BaseSigner):
+    __slots__ = ()
+    sign_algorithm = 'ed25519'
+
+    def _load_key(self, backend, secret):
+        return backend.ed25519_private_key(secret)
+
+
+SIGNERS = {'hmac': HMACSigner, 'rsa': RSASigner, 'ed25519': Ed25519Signer}
+
+
+def new_signer(secret, algorithm=None, backend=None):
+    """
+    Return the signer class specialized for `algorithm`, built with `secret`
+        (see Signer for the accepted secrets).
+    """
+    sign_algorithm, hash_algorithm = _split_algorithm(algorithm)
+    try:
+        cls = SIGNERS[sign_algorithm]
+    except KeyError:
+        raise HttpSigException("Unsupported algorithm.")
+    return cls(secret, hash_algorithm, backend)
 
-    def _sign_hmac(self, data):
-        if isinstance(data, six.string_types):
-            data = data.encode("ascii")
-        hmac = self._hash.copy()
-        hmac.update(data)
-        return hmac.digest()
-    
-    def _sign_ed25519(self, data):
-        if isinstance(data, six.string_types):
-            data = data.encode("ascii")
-        return self._ed25519.sign(data).signature
+
+class Signer(object):
+    """
+    When using an RSA algo, the secret is a PEM-encoded private key.
+    When using an HMAC algo, the secret is the HMAC signing secret.
+    When using ed25519 algo, the secret is the base64-encoded private key
+
+    Password-protected keyfiles are not supported.
+
+    `backend` is the crypto backend name (see httpsig.backends), defaulting
+        to httpsig.backends.DEFAULT_BACKEND.
+
+    The work is done by the specialized signer returned by new_signer(); this
+        class accepts text as well as bytes.
+    """
+    def __init__(self, secret, algorithm=None, backend=None):
+        self._use(self._new(secret, algorithm, backend))
+
+    _new = staticmethod(new_signer)
+
+    def _use(self, signer):
+        # Wrap `signer`, a specialized signer built by _new() or shared,
+        # e.g. by a KeyStore.
+        self._signer = signer
+        self.sign_algorithm = signer.sign_algorithm
+        self.hash_algorithm = signer.hash_algorithm
+        self.backend = signer.backend
+
+    def __reduce__(self):
+        # Pickled as the key material, not the crypto objects.
+        signer = self._signer
+        return (self.__class__,
+                (signer._secret, signer.algorithm, signer.backend))
+
+    @property
+    def algorithm(self):
+        return self._signer.algorithm
 
     def sign(self, data):
         if isinstance(data, six.string_types):
             data = data.encode("ascii")
-        signed = None
-        if self._rsa:
-            signed = self._sign_rsa(data)
-        elif self._hash:
-            signed = self._sign_hmac(data)
-        elif self._ed25519:
-            signed = self._sign_ed25519(data)
-        if not signed:
-            raise SystemError('No valid encryptor found.')
-        return base64.b64encode(signed).decode("ascii")
+        return self._signer.sign(data)
 
 
 class HeaderSigner(Signer):
@@ -106,33 +184,181 @@ class HeaderSigner(Signer):
         string, defaulting to ['date'].
     :arg sign_header: header used to include signature, defaulting to
        'authorization'.
+    :arg backend:   the crypto backend name, see httpsig.backends.
+    :arg expires_in: seconds the signature is valid for, required to sign
+        '(expires)'.
+
+    When '(created)' or '(expires)' is signed, its time is sent as the
+        `created` or `expires` parameter of the signature.
     """
-    def __init__(self, key_id, secret, algorithm=None, headers=None, sign_header='authorization'):
+    def __init__(self, key_id, secret, algorithm=None, headers=None,
+                 sign_header='authorization', backend=None, expires_in=None):
         if algorithm is None:
             algorithm = DEFAULT_SIGN_ALGORITHM
 
-        super(HeaderSigner, self).__init__(secret=secret, algorithm=algorithm)
+        super(HeaderSigner, self).__init__(
+                secret=secret, algorithm=algorithm, backend=backend)
+        # Kept so the signer can be pickled as its arguments rather than
+        # its crypto objects, e.g. to send it to worker processes.
+        self._args = (key_id, secret, algorithm, headers, sign_header,
+                      self.backend, expires_in)
+        self.key_id = key_id
         self.headers = headers or ['date']
+        self._message = MessageBuilder(self.headers)
+        self._signs_created = '(created)' in self._message.headers
+        self.expires_in = None
+        if '(expires)' in self._message.headers:
+            if expires_in is None:
+                raise HttpSigException(
+                    "expires_in is required to sign '(expires)'.")
+            self.expires_in = expires_in
         self.signature_template = build_signature_template(
                                     key_id, algorithm, headers, sign_header)
         self.sign_header = sign_header
+        # The template around the signature, as text and as bytes.
+        self._prefix, _, self._suffix = \
+            self.signature_template.rpartition('%s')
+        self._prefix_bytes = self._prefix.encode('utf8')
+        self._suffix_bytes = self._suffix.encode('utf8')
+
+    def __reduce__(self):
+        return (self.__class__, self._args)
 
     def sign(self, headers, host=None, method=None, path=None):
         """
         Add Signature Authorization header to case-insensitive header dict.
 
-        `headers` is a case-insensitive dict of mutable headers.
+        `headers` is a case-insensitive dict of mutable headers, or a list of
+            (name, value) pairs (see RawHeaders).
         `host` is a override for the 'host' header (defaults to value in
             headers).
         `method` is the HTTP method (required when using '(request-target)').
         `path` is the HTTP path (required when using '(request-target)').
+
+        Returns a copy of `headers` with the signature header (and a
+            generated Date, if needed) added; a list of pairs gets them
+            appended, as bytes if its names are bytes.
         """
-        headers = CaseInsensitiveDict(headers)
-        required_headers = self.headers or ['date']
-        signable = generate_message(
-                    required_headers, headers, host, method, path)
+        if isinstance(headers, (list, tuple, RawHeaders)):
+            return self._sign_pairs(headers, host, method, path)
 
-        signature = super(HeaderSigner, self).sign(signable)
-        headers[self.sign_header] = self.signature_template % signature
+        headers = CaseInsensitiveDict(headers)
+        now = None
+        if self._message.uses_clock:
+            now = clock.get_clock().now()
+            if 'date' in self._message.headers and not headers.get('date'):
+                # Send the Date that gets signed.
+                headers['date'] = clock.get_clock().http_date(now)
+        signature = self._signature(headers, host, method, path, now)
+        headers[self.sign_header] = (
+            self._prefix + signature.decode('ascii') + self._suffix +
+            self.time_params(now))
 
         return headers
+
+    def _sign_pairs(self, headers, host, method, path):
+        raw = headers if isinstance(headers, RawHeaders) else \
+            RawHeaders(headers)
+        added = []
+        now = None
+        if self._message.uses_clock:
+            now = clock.get_clock().now()
+            if 'date' in self._message.headers and not raw.get('date'):
+                # The builder signs the same Date for `now`.
+                added.append(('date', clock.get_clock().http_date(now)))
+        signature = self._signature(raw, host, method, path, now)
+        added.append((self.sign_header,
+                      self._prefix + signature.decode('ascii') + self._suffix +
+                      self.time_params(now)))
+        if raw._bytes_names:
+            added = [(name.encode('ascii'), value.encode('utf8'))
+                     for name, value in added]
+        return list(raw.pairs) + added
+
+    def sign_value(self, headers, host=None, method=None, path=None,
+                   now=None):
+        """
+        Return the value of the signature header as bytes, without copying
+            or changing `headers`.
+
+        `headers` may be a mapping or a list of (name, value) pairs, see
+            as_headers(). Header values may be text, bytes or memoryviews,
+            e.g. the raw values of a server request. When 'date' is signed,
+            `headers` must contain it; use sign() to have one generated.
+        `now` is the Unix time signed as '(created)', read from the clock
+            when not given.
+        """
+        headers = as_headers(headers)
+        if 'date' in self._message.headers and not headers.get('date'):
+            raise Exception('missing required header "date"')
+        if now is None and self._message.uses_clock:
+            now = clock.get_clock().now()
+        return (self._prefix_bytes +
+                self._signature(headers, host, method, path, now) +
+                self._suffix_bytes + self.time_params(now).encode('ascii'))
+
+    def expires(self, now):
+        """
+        Return the '(expires)' time of a signature made at `now`, or None.
+        """
+        if self.expires_in is None:
+            return None
+        return now + self.expires_in
+
+    def time_params(self, now):
+        """
+        Return the created and expires parameters of a signature made at
+            `now`, as text to append to the signature header, if signed.
+        """
+        params = ''
+        if self._signs_created:
+            params += ',created=%d' % now
+        if self.expires_in is not None:
+            params += ',expires=%d' % self.expires(now)
+        return params
+
+    def _signature(self, headers, host, method, path, now):
+        """
+        Return the base64-encoded signature of a request as bytes.
+        """
+        expires = None if now is None else self.expires(now)
+        if instrument.hooks:
+            timer = instrument.PhaseTimer(instrument.SIGN)
+            message = self._message.build(
+                headers, host, method, path, now, expires)
+            timer.mark(instrument.BUILD)
+            signature = self._signer._sign_timed(message, timer)
+            timer.report(self._signer.algorithm, self.key_id)
+            return signature
+        return self._signer.sign_bytes(
+            self._message.build(headers, host, method, path, now, expires))
+
+    def signature_value(self, message, now=None):
+        """
+        Return the value of the signature header, as bytes, for a signing
+            string built by this signer's MessageBuilder (or a bound copy).
+
+        `now` is the time the message was built for, needed when
+            '(created)' or '(expires)' is signed.
+        """
+        if instrument.hooks:
+            timer = instrument.PhaseTimer(instrument.SIGN)
+            signature = self._signer._sign_timed(message, timer)
+            timer.report(self._signer.algorithm, self.key_id)
+        else:
+            signature = self._signer.sign_bytes(message)
+        value = self._prefix_bytes + signature + self._suffix_bytes
+        if now is not None:
+            value += self.time_params(now).encode('ascii')
+        return value
+
+    def sign_many(self, requests, **kwargs):
+        """
+        Sign many requests in parallel, yielding the signed headers of each.
+
+        `requests` is an iterable of (headers, method, path, host) tuples;
+            trailing items may be left out. See httpsig.batch.sign_many()
+            for the other arguments.
+        """
+        from .batch import sign_many
+        return sign_many(self, requests, **kwargs)
@@ -1,3 +1,23 @@
+import sys
+
+from .test_backends import *
+from .test_batch import *
+from .test_clock import *
+from .test_digest import *
+from .test_instrument import *
+from .test_keydir import *
+from .test_keystore import *
+from .test_policy import *
+from .test_prefork import *
+from .test_replay import *
+from .test_requests_auth import *
 from .test_signature import *
 from .test_utils import *
 from .test_verify import *
+from .test_wsgi import *
+
+# These use async def, and asyncio as of Python 3.7.
+if sys.version_info >= (3, 7):
+    from .test_aio import *
+    from .test_asgi import *
+    from .test_httpx_auth import *
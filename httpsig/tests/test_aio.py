@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from httpsig.aio import AsyncVerifier
+from httpsig.keystore import KeyStore
+from httpsig.sign import HeaderSigner
+from httpsig.tests.test_keystore import KeyService
+from httpsig.utils import HttpSigException
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """Thread pool recording the most tasks it ever ran at once."""
+
+    def __init__(self, *args, **kwargs):
+        super(CountingExecutor, self).__init__(*args, **kwargs)
+        self._lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def submit(self, fn, *args, **kwargs):
+        def run():
+            with self._lock:
+                self.running += 1
+                self.peak = max(self.peak, self.running)
+            try:
+                # hold the slot long enough for other tasks to pile up
+                time.sleep(0.001)
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+        return super(CountingExecutor, self).submit(run)
+
+
+class TestAsyncVerifier(unittest.TestCase):
+    header_date = 'Thu, 05 Jan 2014 21:31:40 GMT'
+
+    def setUp(self):
+        with open(os.path.join(
+                os.path.dirname(__file__), 'rsa_private.pem'), 'rb') as f:
+            private_key = f.read()
+        with open(os.path.join(
+                os.path.dirname(__file__), 'rsa_public.pem'), 'rb') as f:
+            self.public_key = f.read()
+        self.signer = HeaderSigner(
+            key_id='Test', secret=private_key, algorithm='rsa-sha256',
+            headers=['(request-target)', 'date'])
+        self.resolved = []
+
+    async def resolve(self, key_id, algorithm):
+        self.resolved.append(key_id)
+        await asyncio.sleep(0)
+        return self.public_key if key_id == 'Test' else None
+
+    def sign(self, path):
+        return self.signer.sign(
+            {'Date': self.header_date}, method='GET', path=path)
+
+    def test_verify(self):
+        verifier = AsyncVerifier(self.resolve)
+
+        async def run():
+            signed = self.sign('/a')
+            self.assertTrue(await verifier.verify(
+                signed, method='GET', path='/a'))
+            self.assertFalse(await verifier.verify(
+                signed, method='GET', path='/b'))
+
+        asyncio.run(run())
+        self.assertEqual(self.resolved, ['Test'])
+
+    def test_several_loops(self):
+        verifier = AsyncVerifier(self.resolve, max_concurrency=1)
+        signed = self.sign('/a')
+
+        async def run():
+            return await asyncio.gather(*[
+                verifier.verify(signed, method='GET', path='/a')
+                for _ in range(3)])
+
+        for _ in range(2):
+            self.assertEqual(asyncio.run(run()), [True] * 3)
+
+    def test_unknown_key(self):
+        verifier = AsyncVerifier(self.resolve)
+        signer = HeaderSigner(key_id='nobody', secret=b'secret',
+                              algorithm='hmac-sha256')
+
+        async def run():
+            signed = signer.sign({'Date': self.header_date})
+            for _ in range(2):
+                with self.assertRaises(HttpSigException):
+                    await verifier.verify(signed)
+
+        asyncio.run(run())
+        self.assertEqual(self.resolved, ['nobody'])
+
+    def test_bounded_concurrency_and_loop_stall(self):
+        executor = CountingExecutor(max_workers=16)
+        verifier = AsyncVerifier(self.resolve, executor=executor,
+                                 max_concurrency=4)
+        requests = [(self.sign('/item/%d' % i), 'GET', '/item/%d' % i)
+                    for i in range(200)]
+        stalls = []
+
+        async def ticker(done):
+            # Measures how late the loop wakes a 1ms sleep; a verification
+            # running on the loop would show up as a long gap.
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.001)
+                stalls.append(time.perf_counter() - start - 0.001)
+
+        async def run():
+            await verifier.get_key('Test', 'rsa-sha256')
+            done = asyncio.Event()
+            tick = asyncio.ensure_future(ticker(done))
+            results = await asyncio.gather(
+                *[verifier.verify(*r) for r in requests])
+            done.set()
+            await tick
+            return results
+
+        try:
+            results = asyncio.run(run())
+        finally:
+            executor.shutdown()
+
+        self.assertTrue(all(results))
+        self.assertLessEqual(executor.peak, 4)
+        self.assertTrue(stalls)
+        self.assertLess(max(stalls), 0.1)
+
+    def test_single_flight(self):
+        service = KeyService({'Test': self.public_key}, delay=0.02)
+        verifier = AsyncVerifier(service.resolve)
+
+        async def run():
+            return await asyncio.gather(
+                *[verifier.verify(self.sign('/a'), method='GET', path='/a')
+                  for _ in range(100)])
+
+        self.assertTrue(all(asyncio.run(run())))
+        self.assertEqual(service.fetches, 1)
+        self.assertEqual(verifier.key_store.coalesced, 99)
+
+    def test_stale_while_revalidate(self):
+        service = KeyService({'Test': self.public_key}, delay=0.02)
+        store = KeyStore(ttl=0, stale_ttl=60)
+        verifier = AsyncVerifier(service.resolve, key_store=store)
+
+        async def run():
+            first = await verifier.get_key('Test', 'rsa-sha256')
+            keys = await asyncio.gather(
+                *[verifier.get_key('Test', 'rsa-sha256') for _ in range(10)])
+            self.assertTrue(all(key is first for key in keys))
+            await asyncio.sleep(0.2)
+            self.assertIsNot(store.peek('Test', 'rsa-sha256'), first)
+
+        asyncio.run(run())
+        self.assertEqual(service.fetches, 2)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+import asyncio
+import os
+import sys
+import unittest
+
+from httpsig import metrics
+from httpsig.aio import AsyncVerifier
+from httpsig.asgi import SignatureMiddleware, request_target
+from httpsig.digest import compute_digest
+from httpsig.sign import HeaderSigner
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+HEADERS = ['(request-target)', 'host', 'date']
+DATE = 'Thu, 05 Jan 2014 21:31:40 GMT'
+
+
+async def echo(scope, receive, send):
+    """
+    Sends back the keyId and the body, or records a disconnect.
+    """
+    body = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            scope['disconnected'].append(True)
+            raise IOError('client disconnected')
+        body.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': [(b'content-type', b'text/plain')]})
+    await send({'type': 'http.response.body',
+                'body': scope['httpsig.key_id'].encode('ascii') + b' ' +
+                b''.join(body)})
+
+
+class TestSignatureMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(
+                os.path.dirname(__file__), 'rsa_private.pem'), 'rb') as f:
+            self.private_key = f.read()
+        with open(os.path.join(
+                os.path.dirname(__file__), 'rsa_public.pem'), 'rb') as f:
+            self.public_key = f.read()
+
+        async def resolve(key_id, algorithm):
+            return {'rsa': self.public_key, 'hmac': b'secret'}.get(key_id)
+
+        self.middleware = SignatureMiddleware(
+            echo, AsyncVerifier(resolve, required_headers=HEADERS))
+
+    def request(self, key_id='hmac', chunks=(b'',), headers=None,
+                digest=None, path='/foo', query=b''):
+        signed_headers = list(HEADERS)
+        raw = [(b'host', b'example.com'), (b'date', DATE.encode('ascii'))]
+        if digest is not None:
+            signed_headers.append('digest')
+            raw.append((b'digest', digest.encode('ascii')))
+        if key_id:
+            secret, algorithm = {
+                'rsa': (self.private_key, 'rsa-sha256'),
+                'hmac': (b'secret', 'hmac-sha256')}[key_id]
+            signer = HeaderSigner(key_id, secret, algorithm=algorithm,
+                                  headers=signed_headers)
+            target = path.encode('ascii') + (b'?' + query if query else b'')
+            raw = signer.sign(raw, method='POST', path=target)
+        scope = {'type': 'http', 'method': 'POST', 'path': path,
+                 'query_string': query, 'headers': raw,
+                 'server': ('example.com', 80), 'disconnected': []}
+        messages = [{'type': 'http.request', 'body': chunk,
+                     'more_body': i < len(chunks) - 1}
+                    for i, chunk in enumerate(chunks)]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(self.middleware(scope, receive, send))
+        return sent[0]['status'], sent[1]['body'], scope
+
+    def test_valid(self):
+        for key_id in ('hmac', 'rsa'):
+            status, body, _ = self.request(key_id, query=b'a=1')
+            self.assertEqual(status, 200)
+            self.assertEqual(body, key_id.encode('ascii') + b' ')
+
+    def test_rejected(self):
+        status, body, _ = self.request(key_id=None)
+        self.assertEqual(status, 401)
+        totals = self.middleware.metrics.totals()
+        self.assertEqual(totals[metrics.REJECTED], 1)
+
+    def test_streaming_digest(self):
+        chunks = [b'{"hello": ', b'"world"', b'}']
+        status, body, scope = self.request(
+            'rsa', chunks=chunks, digest=compute_digest(b''.join(chunks)))
+        self.assertEqual(status, 200)
+        self.assertEqual(body, b'rsa {"hello": "world"}')
+
+        status, body, scope = self.request(
+            'rsa', chunks=chunks, digest=compute_digest(b'something else'))
+        self.assertEqual(status, 401)
+        self.assertEqual(scope['disconnected'], [True])
+        self.assertEqual(self.middleware.digest_mismatches, 1)
+
+    def test_other_scopes(self):
+        called = []
+
+        async def app(scope, receive, send):
+            called.append(scope['type'])
+
+        middleware = SignatureMiddleware(app, self.middleware.verifier)
+        asyncio.run(middleware({'type': 'lifespan'}, None, None))
+        self.assertEqual(called, ['lifespan'])
+
+    def test_request_target(self):
+        self.assertEqual(request_target({'path': '/a b', 'query_string': b''}),
+                         b'/a%20b')
+        self.assertEqual(request_target({'path': '/a/b', 'raw_path': b'/a%2Fb',
+                                         'query_string': b'x=1'}),
+                         b'/a%2Fb?x=1')
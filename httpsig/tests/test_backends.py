@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+import os
+import subprocess
+import sys
+import unittest
+
+from httpsig import backends
+from httpsig.sign import HeaderSigner, Signer
+from httpsig.utils import HttpSigException
+from httpsig.verify import Verifier
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+ASYMMETRIC_BACKENDS = ['pycryptodome', 'auto']
+if backends.cryptography_available():
+    ASYMMETRIC_BACKENDS.append('cryptography')
+HMAC_BACKENDS = ASYMMETRIC_BACKENDS + ['stdlib']
+
+
+def read(name, mode='rb'):
+    with open(os.path.join(os.path.dirname(__file__), name), mode) as f:
+        return f.read()
+
+
+class TestBackends(unittest.TestCase):
+    header_date = 'Thu, 05 Jan 2014 21:31:40 GMT'
+    message = b'date: Thu, 05 Jan 2014 21:31:40 GMT'
+
+    def test_rsa_vectors(self):
+        # Same vectors as test_signature.TestSign.
+        unsigned = {
+            'Host': 'example.com',
+            'Date': self.header_date,
+            'Content-Type': 'application/json',
+            'Digest': 'SHA-256=X48E9qOokqqrvdts8nOJRJN3OWDUoyWxBf7kbu9DBPE=',
+            'Content-Length': '18',
+        }
+        headers = ['(request-target)', 'host', 'date', 'content-type',
+                   'digest', 'content-length']
+        expected = 'Ef7MlxLXoBovhil3AlyjtBwAL9g4TN3tibLj7uuNB3CROat/9KaeQ4hW2NiJ+pZ6HQEOx9vYZAyi+7cmIkmJszJCut5kQLAwuX+Ms/mUFvpKlSo9StS2bMXDBNjOh4Auj774GFj4gwjS+3NhFeoqyr/MuN6HsEnkvn6zdgfE2i0='  # noqa: E501
+        for backend in ASYMMETRIC_BACKENDS:
+            hs = HeaderSigner(key_id='Test', secret=read('rsa_private.pem'),
+                              algorithm='rsa-sha256', headers=headers,
+                              backend=backend)
+            signed = hs.sign(unsigned, method='POST',
+                             path='/foo?param=value&pet=dog')
+            self.assertIn('signature="%s"' % expected,
+                          signed['authorization'], backend)
+
+    def test_cross_backend(self):
+        cases = [
+            ('rsa-sha1', read('rsa_private.pem'), read('rsa_public.pem'),
+             ASYMMETRIC_BACKENDS),
+            ('rsa-sha512', read('rsa_private.pem'), read('rsa_public.pem'),
+             ASYMMETRIC_BACKENDS),
+            ('ed25519', read('ed25519_private.txt', 'r'),
+             read('ed25519_public.txt', 'r'), ASYMMETRIC_BACKENDS),
+            ('hmac-sha1', b'secret', b'secret', HMAC_BACKENDS),
+            ('hmac-sha256', b'secret', b'secret', HMAC_BACKENDS),
+            ('hmac-sha512', b'secret', b'secret', HMAC_BACKENDS),
+        ]
+        for algorithm, private, public, names in cases:
+            signatures = set()
+            for signing in names:
+                signature = Signer(private, algorithm=algorithm,
+                                   backend=signing).sign(self.message)
+                signatures.add(signature)
+                for verifying in names:
+                    verifier = Verifier(public, algorithm=algorithm,
+                                        backend=verifying)
+                    self.assertTrue(
+                        verifier._verify(self.message, signature),
+                        (algorithm, signing, verifying))
+                    self.assertFalse(
+                        verifier._verify(self.message + b'!', signature),
+                        (algorithm, signing, verifying))
+            # all of these schemes are deterministic
+            self.assertEqual(len(signatures), 1, algorithm)
+
+    def test_stdlib_has_no_rsa(self):
+        with self.assertRaises(HttpSigException):
+            Signer(read('rsa_private.pem'), algorithm='rsa-sha256',
+                   backend='stdlib')
+
+    def test_invalid_keys(self):
+        for backend in ASYMMETRIC_BACKENDS:
+            with self.assertRaises(HttpSigException):
+                Signer(b'not a key', algorithm='rsa-sha256', backend=backend)
+            with self.assertRaises(HttpSigException):
+                # a public key cannot sign
+                Signer(read('rsa_public.pem'), algorithm='rsa-sha256',
+                       backend=backend).sign(self.message)
+
+    def test_get_backend(self):
+        self.assertIs(backends.get_backend('stdlib'),
+                      backends.get_backend('stdlib'))
+        backend = backends.PyCryptodomeBackend()
+        self.assertIs(backends.get_backend(backend), backend)
+        self.assertEqual(backends.get_backend().name,
+                         backends.DEFAULT_BACKEND)
+        with self.assertRaises(HttpSigException):
+            backends.get_backend('nope')
+
+    def test_lazy_imports(self):
+        # HMAC signing loads no crypto library, nor pkg_resources.
+        code = (
+            "import sys, httpsig\n"
+            "httpsig.HeaderSigner('Test', b'secret').sign({'Date': 'now'})\n"
+            "print(' '.join(m for m in ('Crypto', 'nacl', 'cryptography', "
+            "'pkg_resources') if m in sys.modules))\n")
+        output = subprocess.check_output(
+            [sys.executable, '-c', code],
+            cwd=os.path.join(os.path.dirname(__file__), '..', '..'))
+        self.assertEqual(output.strip(), b'')
@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+import os
+import sys
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from httpsig.keystore import KeyStore, StaticKeyLoader
+from httpsig.sign import HeaderSigner
+from httpsig.verify import RequestVerifier
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+class TestVerifyMany(unittest.TestCase):
+    header_date = 'Thu, 05 Jan 2014 21:31:40 GMT'
+
+    def setUp(self):
+        with open(os.path.join(
+                os.path.dirname(__file__), 'rsa_private.pem'), 'rb') as f:
+            rsa_private = f.read()
+        with open(os.path.join(
+                os.path.dirname(__file__), 'rsa_public.pem'), 'rb') as f:
+            rsa_public = f.read()
+
+        signers = [
+            HeaderSigner(key_id='rsa', secret=rsa_private,
+                         algorithm='rsa-sha256',
+                         headers=['(request-target)', 'date']),
+            HeaderSigner(key_id='hmac', secret=b'secret',
+                         algorithm='hmac-sha256',
+                         headers=['(request-target)', 'date']),
+        ]
+        self.verifier = RequestVerifier(
+            key_store=KeyStore(StaticKeyLoader(
+                {'rsa': rsa_public, 'hmac': b'secret'})),
+            required_headers=['(request-target)', 'date'])
+
+        self.requests = []
+        self.expected = []
+        for i in range(50):
+            path = '/item/%d' % i
+            signed = signers[i % 2].sign(
+                {'Date': self.header_date}, method='GET', path=path)
+            if i % 3 == 0:
+                # tampered path
+                self.requests.append((signed, 'GET', path + '/x'))
+                self.expected.append(False)
+            else:
+                self.requests.append((signed, 'GET', path))
+                self.expected.append(True)
+        # garbage signature header and an unknown keyId
+        self.requests.append(({'Authorization': 'Signature x'}, 'GET', '/'))
+        self.expected.append(False)
+        unknown = HeaderSigner(key_id='nobody', secret=b'secret',
+                               algorithm='hmac-sha256',
+                               headers=['(request-target)', 'date'])
+        self.requests.append((unknown.sign(
+            {'Date': self.header_date}, method='GET', path='/'), 'GET', '/'))
+        self.expected.append(False)
+
+    def test_threads(self):
+        results = list(self.verifier.verify_many(
+            iter(self.requests), max_workers=4, chunk_size=16, batch_size=4))
+        self.assertEqual(results, self.expected)
+        self.assertEqual(len(self.verifier.key_store), 3)
+
+    def test_processes(self):
+        results = list(self.verifier.verify_many(
+            self.requests, max_workers=2, processes=True, chunk_size=16))
+        self.assertEqual(results, self.expected)
+
+    def test_existing_executor(self):
+        with ThreadPoolExecutor(2) as executor:
+            results = list(self.verifier.verify_many(
+                self.requests, executor=executor))
+        self.assertEqual(results, self.expected)
+
+    def test_empty(self):
+        self.assertEqual(list(self.verifier.verify_many([])), [])
+
+
+class TestSignMany(unittest.TestCase):
+    header_date = 'Thu, 05 Jan 2014 21:31:40 GMT'
+
+    def setUp(self):
+        with open(os.path.join(
+                os.path.dirname(__file__), 'rsa_private.pem'), 'rb') as f:
+            self.signer = HeaderSigner(
+                key_id='Test', secret=f.read(), algorithm='rsa-sha256',
+                headers=['(request-target)', 'host', 'date'])
+        self.requests = [
+            ({'Date': self.header_date}, 'GET', '/item/%d' % i, 'example.com')
+            for i in range(40)]
+        self.expected = [self.signer.sign(headers, host=host, method=method,
+                                          path=path)
+                         for headers, method, path, host in self.requests]
+
+    def test_processes(self):
+        results = list(self.signer.sign_many(
+            iter(self.requests), max_workers=2, chunk_size=16, batch_size=4))
+        self.assertEqual(results, self.expected)
+
+    def test_threads_unordered(self):
+        results = list(self.signer.sign_many(
+            self.requests, processes=False, ordered=False, batch_size=4))
+        self.assertEqual(sorted(index for index, _ in results),
+                         list(range(len(self.requests))))
+        for index, signed in results:
+            self.assertEqual(signed, self.expected[index])
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+import os
+import sys
+import unittest
+
+from httpsig import clock
+from httpsig.sign import HeaderSigner
+from httpsig.utils import MessageBuilder
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+class TestClock(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = clock.FakeClock(1388957500)
+        self.previous = clock.set_clock(self.clock)
+
+    def tearDown(self):
+        clock.set_clock(self.previous)
+
+    def test_http_date(self):
+        self.assertEqual(self.clock.http_date(),
+                         'Sun, 05 Jan 2014 21:31:40 GMT')
+        self.assertEqual(self.clock.http_date(1388957501),
+                         'Sun, 05 Jan 2014 21:31:41 GMT')
+
+    def test_http_date_cached_per_second(self):
+        first = self.clock.http_date()
+        self.assertIs(self.clock.http_date(), first)
+        self.clock.advance(0.5)
+        self.assertIs(self.clock.http_date(), first)
+        self.clock.advance(0.5)
+        self.assertIsNot(self.clock.http_date(), first)
+
+    def test_system_clock(self):
+        self.assertIsInstance(self.previous.now(), int)
+        self.assertTrue(self.previous.http_date().endswith(' GMT'))
+
+    def test_date_and_created_agree(self):
+        builder = MessageBuilder(['date', '(created)'])
+        self.assertEqual(builder.build({}), (
+            b'date: Sun, 05 Jan 2014 21:31:40 GMT\n'
+            b'(created): 1388957500'))
+        self.assertEqual(builder.build({}, now=1388957501), (
+            b'date: Sun, 05 Jan 2014 21:31:41 GMT\n'
+            b'(created): 1388957501'))
+
+    def test_signer_uses_clock(self):
+        hs = HeaderSigner(key_id='Test', secret=b'secret',
+                          algorithm='hmac-sha256')
+        signed = hs.sign({})
+        self.assertEqual(signed['Date'], 'Sun, 05 Jan 2014 21:31:40 GMT')
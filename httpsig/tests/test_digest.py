@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+import io
+import mmap
+import os
+import sys
+import tempfile
+import unittest
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+from httpsig.digest import (DigestVerifier, compute_digest, iter_chunks,
+                            parse_digest_header, verify_digest)
+from httpsig.utils import HttpSigException, parse_authorization_header
+
+if requests is not None:
+    from httpsig.requests_auth import HTTPSignatureAuth
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+BODY = b'{"hello": "world"}'
+# From the HTTP Signatures draft.
+SHA256 = 'SHA-256=X48E9qOokqqrvdts8nOJRJN3OWDUoyWxBf7kbu9DBPE='
+
+
+class TestDigest(unittest.TestCase):
+
+    def test_bytes(self):
+        self.assertEqual(compute_digest(BODY), SHA256)
+        self.assertEqual(compute_digest(BODY.decode('ascii')), SHA256)
+
+    def test_sha512(self):
+        self.assertTrue(compute_digest(BODY, 'sha-512').startswith(
+            'SHA-512='))
+        with self.assertRaises(HttpSigException):
+            compute_digest(BODY, 'MD5')
+
+    def test_chunked_sources(self):
+        self.assertEqual(compute_digest(io.BytesIO(BODY), chunk_size=4),
+                         SHA256)
+        self.assertEqual(compute_digest(bytearray(BODY), chunk_size=4),
+                         SHA256)
+        self.assertEqual(
+            compute_digest(iter([BODY[:5], bytearray(BODY[5:])])), SHA256)
+        self.assertEqual(compute_digest(b''), compute_digest(None))
+
+    def test_mmap(self):
+        with tempfile.TemporaryFile() as f:
+            f.write(BODY)
+            f.flush()
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                self.assertEqual(compute_digest(m, chunk_size=4), SHA256)
+            finally:
+                m.close()
+
+    def test_file_chunks_bounded(self):
+        chunks = list(len(c) for c in iter_chunks(
+            io.BytesIO(b'x' * 10), chunk_size=4))
+        self.assertEqual(chunks, [4, 4, 2])
+
+    def test_parse(self):
+        self.assertEqual(
+            parse_digest_header('sha-256=abc=, SHA-512=def'),
+            {'SHA-256': 'abc=', 'SHA-512': 'def'})
+
+    def test_streaming_verifier(self):
+        verifier = DigestVerifier(SHA256)
+        for i in range(0, len(BODY), 3):
+            verifier.update(BODY[i:i + 3])
+        self.assertTrue(verifier.verify())
+        self.assertTrue(verify_digest(SHA256, io.BytesIO(BODY)))
+        self.assertFalse(verify_digest(SHA256, BODY + b' '))
+
+    def test_iter(self):
+        verifier = DigestVerifier(SHA256)
+        self.assertEqual(b''.join(verifier.iter(io.BytesIO(BODY), 4)), BODY)
+        with self.assertRaises(HttpSigException):
+            list(DigestVerifier(SHA256).iter(BODY + b' '))
+
+    def test_algorithm_choice(self):
+        header = SHA256 + ',' + compute_digest(BODY, 'SHA-512')
+        self.assertEqual(DigestVerifier(header).algorithm, 'SHA-512')
+        self.assertEqual(
+            DigestVerifier(header, algorithms=['SHA-256']).algorithm,
+            'SHA-256')
+        with self.assertRaises(HttpSigException):
+            DigestVerifier('MD5=abc')
+
+
+@unittest.skipIf(requests is None, 'requests is not installed')
+class TestRequestsAuthDigest(unittest.TestCase):
+
+    def setUp(self):
+        self.auth = HTTPSignatureAuth(
+            key_id='Test', secret=b'secret', algorithm='hmac-sha256',
+            headers=['date', 'digest'])
+
+    def prepare(self, data):
+        return requests.Request(
+            'POST', 'http://example.com/foo', data=data,
+            headers={'Date': 'Thu, 05 Jan 2014 21:31:40 GMT'}).prepare()
+
+    def test_bytes_body(self):
+        r = self.auth(self.prepare(BODY))
+        self.assertEqual(r.headers['Digest'], SHA256)
+        params = parse_authorization_header(r.headers['Authorization'])[1]
+        self.assertEqual(params['headers'], 'date digest')
+
+    def test_text_body_is_latin1(self):
+        r = self.auth(self.prepare(u'\xe9'))
+        self.assertEqual(r.headers['Digest'], compute_digest(b'\xe9'))
+        with self.assertRaises(HttpSigException):
+            self.auth(self.prepare(u'\u20ac'))
+
+    def test_file_body_is_rewound(self):
+        body = io.BytesIO(BODY)
+        r = self.auth(self.prepare(body))
+        self.assertEqual(r.headers['Digest'], SHA256)
+        self.assertEqual(body.read(), BODY)
+
+    def test_existing_digest_kept(self):
+        r = self.prepare(BODY)
+        r.headers['Digest'] = 'SHA-512=abc'
+        self.assertEqual(self.auth(r).headers['Digest'], 'SHA-512=abc')
+
+    def test_generator_body(self):
+        with self.assertRaises(HttpSigException):
+            self.auth(self.prepare(iter([BODY])))
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+import asyncio
+import io
+import os
+import sys
+import unittest
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from httpsig.utils import RawHeaders
+from httpsig.verify import RequestVerifier
+from httpsig.digest import verify_digest
+
+if httpx is not None:
+    from httpsig.httpx_auth import HTTPSignatureAuth
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+HEADERS = ['(request-target)', 'host', 'date', 'digest']
+
+
+@unittest.skipIf(httpx is None, 'httpx is not installed')
+class TestHTTPXAuth(unittest.TestCase):
+
+    def setUp(self):
+        with open(os.path.join(
+                os.path.dirname(__file__), 'rsa_private.pem'), 'rb') as f:
+            self.private_key = f.read()
+        with open(os.path.join(
+                os.path.dirname(__file__), 'rsa_public.pem'), 'rb') as f:
+            self.public_key = f.read()
+        self.received = []
+
+    def handler(self, secret):
+        verifier = RequestVerifier(secret=secret, required_headers=HEADERS)
+
+        def handle(request):
+            self.received.append(request)
+            ok = (verify_digest(request.headers['digest'], request.content)
+                  and verifier.verify(RawHeaders(request.headers.raw),
+                                      method=request.method,
+                                      path=request.url.raw_path))
+            return httpx.Response(200 if ok else 401)
+        return handle
+
+    def auth(self, secret, algorithm):
+        return HTTPSignatureAuth(key_id='Test', secret=secret,
+                                 algorithm=algorithm, headers=HEADERS)
+
+    def test_client(self):
+        for algorithm, private, public in (
+                ('hmac-sha256', b'secret', b'secret'),
+                ('rsa-sha256', self.private_key, self.public_key)):
+            transport = httpx.MockTransport(self.handler(public))
+            with httpx.Client(transport=transport,
+                              auth=self.auth(private, algorithm)) as client:
+                response = client.post('https://example.com/a%20b?x=1',
+                                       content=b'{"hello": "world"}',
+                                       headers={'X-Other': 'kept'})
+            self.assertEqual(response.status_code, 200, algorithm)
+
+        request = self.received[-1]
+        self.assertEqual(request.headers['x-other'], 'kept')
+        self.assertTrue(request.headers['authorization'].startswith(
+            'Signature keyId="Test"'))
+        self.assertEqual(request.headers['digest'],
+                         'SHA-256=X48E9qOokqqrvdts8nOJRJN3OWDUoyWxBf7kbu9DBPE=')
+
+    def test_expires(self):
+        transport = httpx.MockTransport(self.handler(b'secret'))
+        auth = HTTPSignatureAuth(key_id='Test', secret=b'secret',
+                                 algorithm='hmac-sha256',
+                                 headers=HEADERS + ['(expires)'],
+                                 expires_in=60)
+        with httpx.Client(transport=transport, auth=auth) as client:
+            response = client.get('https://example.com/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(',expires=',
+                      self.received[-1].headers['authorization'])
+
+    def test_async_client(self):
+        transport = httpx.MockTransport(self.handler(self.public_key))
+        auth = self.auth(self.private_key, 'rsa-sha256')
+        self.assertFalse(auth.sign_inline)
+
+        async def run():
+            async with httpx.AsyncClient(transport=transport,
+                                         auth=auth) as client:
+                return await asyncio.gather(*[
+                    client.get('https://example.com/item/%d' % i)
+                    for i in range(10)])
+
+        responses = asyncio.run(run())
+        self.assertEqual([r.status_code for r in responses], [200] * 10)
+
+    def test_streamed_body(self):
+        transport = httpx.MockTransport(self.handler(b'secret'))
+
+        def body():
+            yield b'{"hello": '
+            yield b'"world"}'
+
+        with httpx.Client(transport=transport,
+                          auth=self.auth(b'secret', 'hmac-sha256')) as client:
+            # Streamed bodies are read, hashed, then sent whole.
+            f = io.BytesIO(b'skipped {"hello": "world"}')
+            f.seek(8)
+            for content in (f, [b'{"hello": ', b'"world"}'], body()):
+                response = client.post('https://example.com/',
+                                       content=content)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.received[-1].headers['digest'],
+                                 'SHA-256=X48E9qOokqqrvdts8nOJRJN3OWDUoyWxBf7'
+                                 'kbu9DBPE=')
+            response = client.post('https://example.com/',
+                                   files={'f': io.BytesIO(b'data')})
+            self.assertEqual(response.status_code, 200)
+
+    def test_async_multipart_body(self):
+        transport = httpx.MockTransport(self.handler(b'secret'))
+        auth = self.auth(b'secret', 'hmac-sha256')
+
+        async def run():
+            async with httpx.AsyncClient(transport=transport,
+                                         auth=auth) as client:
+                return await client.post(
+                    'https://example.com/',
+                    files={'f': io.BytesIO(b'x' * 100000)})
+
+        self.assertEqual(asyncio.run(run()).status_code, 200)
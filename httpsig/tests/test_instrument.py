@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+import os
+import sys
+import unittest
+
+from httpsig import instrument
+from httpsig.keystore import KeyStore, StaticKeyLoader
+from httpsig.metrics import OTHER, PhaseMetrics
+from httpsig.sign import HeaderSigner, Signer
+from httpsig.verify import HeaderVerifier, RequestVerifier, Verifier
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+class Recorder(object):
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, operation, algorithm, key_id, timings):
+        self.calls.append((operation, algorithm, key_id, dict(timings)))
+
+
+class TestInstrument(unittest.TestCase):
+    header_date = 'Thu, 05 Jan 2014 21:31:40 GMT'
+
+    def setUp(self):
+        self.signer = HeaderSigner(
+            'Test', b'secret', algorithm='hmac-sha256',
+            headers=['(request-target)', 'host', 'date'])
+        self.headers = self.signer.sign(
+            {'Host': 'example.com', 'Date': self.header_date},
+            method='GET', path='/')
+        self.recorder = Recorder()
+        instrument.add_hook(self.recorder)
+
+    def tearDown(self):
+        instrument.remove_hook(self.recorder)
+
+    def assertPhases(self, call, operation, algorithm, key_id, phases):
+        self.assertEqual(call[:3], (operation, algorithm, key_id))
+        self.assertEqual(sorted(call[3]), sorted(phases))
+        for seconds in call[3].values():
+            self.assertGreaterEqual(seconds, 0)
+
+    def test_hooks(self):
+        instrument.add_hook(self.recorder)
+        self.assertEqual(instrument.hooks, (self.recorder,))
+        instrument.remove_hook(self.recorder)
+        instrument.remove_hook(self.recorder)
+        self.assertEqual(instrument.hooks, ())
+        with instrument.hooked(self.recorder):
+            self.assertEqual(instrument.hooks, (self.recorder,))
+        self.assertEqual(instrument.hooks, ())
+
+    def test_no_hooks(self):
+        instrument.remove_hook(self.recorder)
+        self.signer.sign_value(self.headers, method='GET', path='/')
+        RequestVerifier(secret=b'secret').verify(
+            self.headers, method='GET', path='/')
+        self.assertEqual(self.recorder.calls, [])
+
+    def test_signer(self):
+        Signer(b'secret', 'hmac-sha256').sign('data')
+        value = self.signer.sign_value(self.headers, method='GET', path='/')
+        self.assertEqual(
+            value.decode('ascii'), self.headers['authorization'])
+        first, second = self.recorder.calls
+        self.assertPhases(first, 'sign', 'hmac-sha256', None,
+                          ['crypto', 'base64'])
+        self.assertPhases(second, 'sign', 'hmac-sha256', 'Test',
+                          ['build', 'crypto', 'base64'])
+
+    def test_verifier(self):
+        signature = Signer(b'secret', 'hmac-sha256').sign('data')
+        del self.recorder.calls[:]
+        self.assertTrue(
+            Verifier(b'secret', 'hmac-sha256')._verify('data', signature))
+        self.assertPhases(self.recorder.calls[0], 'verify', 'hmac-sha256',
+                          None, ['crypto', 'base64'])
+
+    def test_header_verifier(self):
+        verifier = HeaderVerifier(self.headers, b'secret',
+                                  method='GET', path='/')
+        self.assertTrue(verifier.verify())
+        self.assertPhases(self.recorder.calls[-1], 'verify', 'hmac-sha256',
+                          'Test', instrument.PHASES)
+
+    def test_request_verifier(self):
+        store = KeyStore(StaticKeyLoader({'Test': b'secret'}))
+        verifier = RequestVerifier(key_store=store)
+        self.assertTrue(verifier.verify(self.headers, method='GET', path='/'))
+        self.assertEqual(len(self.recorder.calls), 1)
+        self.assertPhases(self.recorder.calls[0], 'verify', 'hmac-sha256',
+                          'Test', instrument.PHASES)
+
+    def test_phase_metrics(self):
+        metrics = PhaseMetrics(max_keys=1)
+        with instrument.hooked(metrics):
+            for _ in range(3):
+                self.signer.sign_value(self.headers, method='GET', path='/')
+            Signer(b'secret', 'hmac-sha256').sign('data')
+        snapshot = sorted(metrics.snapshot(), key=lambda s: str(s['key_id']))
+        self.assertEqual(len(snapshot), 2)
+        other, test = snapshot
+        self.assertEqual((other['algorithm'], other['key_id']), OTHER)
+        self.assertEqual(other['phases']['total']['count'], 1)
+        self.assertEqual(test['operation'], 'sign')
+        self.assertEqual(sorted(test['phases']),
+                         ['base64', 'build', 'crypto', 'total'])
+        self.assertEqual(test['phases']['crypto']['count'], 3)
+        metrics.reset()
+        self.assertEqual(metrics.snapshot(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
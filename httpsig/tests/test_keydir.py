@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+import base64
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+from httpsig.keydir import KeyDirectory, parse_public_key
+from httpsig.keystore import KeyStore
+from httpsig.sign import HeaderSigner
+from httpsig.utils import HttpSigException
+from httpsig.verify import RequestVerifier
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+RSA_FINGERPRINT = 'SHA256:ExiA/kCzfLSDlsIfB5h+g7Q3ym9F34KwQdv3jZWdxNI'
+ED25519_FINGERPRINT = 'SHA256:8vRkoUANh96kc94mqE3n1dZz4jI4KPaVBAA1sSpq3bQ'
+
+
+def read(name):
+    with open(os.path.join(os.path.dirname(__file__), name), 'rb') as f:
+        return f.read()
+
+
+class TestKeyDirectory(unittest.TestCase):
+    header_date = 'Thu, 05 Jan 2014 21:31:40 GMT'
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.rsa_pem = read('rsa_public.pem')
+        self.ed25519 = read('ed25519_public.txt')
+        raw = base64.b64decode(self.ed25519)
+        self.ed25519_ssh = (
+            b'ssh-ed25519 ' +
+            base64.b64encode(b'\0\0\0\x0bssh-ed25519\0\0\0\x20' + raw) +
+            b' alice@example.com\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def write(self, name, data):
+        path = os.path.join(self.path, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_parse_formats(self):
+        self.assertEqual(parse_public_key(self.rsa_pem),
+                         ('rsa', self.rsa_pem.strip(), RSA_FINGERPRINT))
+        self.assertEqual(parse_public_key(self.ed25519),
+                         ('ed25519', self.ed25519.strip(),
+                          ED25519_FINGERPRINT))
+        self.assertEqual(parse_public_key(self.ed25519_ssh),
+                         ('ed25519', self.ed25519.strip(),
+                          ED25519_FINGERPRINT))
+        for data in (b'', b'garbage', read('rsa_private.pem'),
+                     b'ssh-rsa AAAA'):
+            with self.assertRaises(HttpSigException):
+                parse_public_key(data)
+
+    def test_lookup(self):
+        self.write('clients/alice-2024.pem', self.rsa_pem)
+        self.write('clients/alice-2025.pub', self.ed25519_ssh)
+        self.write('bob', self.ed25519)
+        self.write('broken.pem', b'-----BEGIN PUBLIC KEY-----\nxx\n')
+        self.write('.hidden', self.ed25519)
+        keys = KeyDirectory(self.path)
+
+        self.assertEqual(len(keys), 3)
+        self.assertEqual(list(keys.errors),
+                         [os.path.join(self.path, 'broken.pem')])
+        self.assertEqual(keys('clients/alice-2024', 'rsa-sha256'),
+                         self.rsa_pem.strip())
+        self.assertEqual(keys(RSA_FINGERPRINT, 'rsa-sha512'),
+                         self.rsa_pem.strip())
+        self.assertEqual(keys('clients/alice-2025', 'ed25519'),
+                         self.ed25519.strip())
+        self.assertEqual(keys.get('bob').fingerprint, ED25519_FINGERPRINT)
+        self.assertIsNone(keys('clients/alice-2024', 'ed25519'))
+        self.assertIsNone(keys('clients/alice-2024', 'hmac-sha256'))
+        self.assertIsNone(keys('nobody', 'rsa-sha256'))
+        self.assertIsNone(keys('.hidden', 'ed25519'))
+
+    def test_reload(self):
+        alice = self.write('alice.pem', self.rsa_pem)
+        self.write('bob.txt', self.ed25519)
+        changes = []
+        keys = KeyDirectory(self.path, on_change=changes.append)
+        bob = keys.get('bob')
+
+        self.assertEqual(keys.reload(), set())
+        self.assertEqual(changes, [])
+
+        os.remove(alice)
+        self.write('carol.pub', self.ed25519_ssh)
+        changed = keys.reload()
+        self.assertEqual(changed, set(['alice', RSA_FINGERPRINT, 'carol',
+                                       ED25519_FINGERPRINT]))
+        self.assertEqual(changes, [changed])
+        self.assertIsNone(keys.get('alice'))
+        self.assertIsNone(keys.get(RSA_FINGERPRINT))
+        self.assertEqual(keys.get('carol').family, 'ed25519')
+        # Unchanged files are not parsed again.
+        self.assertIs(keys.get('bob'), bob)
+
+    def test_key_store(self):
+        self.write('alice.pem', self.rsa_pem)
+        keys = KeyDirectory(self.path)
+        store = KeyStore(keys)
+        verifier = RequestVerifier(key_store=store)
+        for key_id in ('alice', RSA_FINGERPRINT):
+            signer = HeaderSigner(key_id, read('rsa_private.pem'),
+                                  algorithm='rsa-sha256')
+            signed = signer.sign({'Date': self.header_date})
+            self.assertTrue(verifier.verify(signed))
+
+        keys.on_change = lambda ids: [store.invalidate(i) for i in ids]
+        os.remove(os.path.join(self.path, 'alice.pem'))
+        keys.reload()
+        with self.assertRaises(HttpSigException):
+            verifier.verify(signed)
+
+    def test_polling(self):
+        keys = KeyDirectory(self.path)
+        keys.start(interval=0.01)
+        try:
+            self.write('alice.pem', self.rsa_pem)
+            deadline = time.time() + 5
+            while keys.get('alice') is None:
+                self.assertLess(time.time(), deadline)
+                time.sleep(0.01)
+        finally:
+            keys.stop()
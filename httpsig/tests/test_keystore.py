@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+import os
+import sys
+import threading
+import time
+import unittest
+
+import httpsig.keystore as keystore
+from httpsig.keystore import (FixedKeyLoader, FixedKeyStore, KeyStore,
+                              StaticKeyLoader)
+from httpsig.sign import HeaderSigner
+from httpsig.utils import HttpSigException
+from httpsig.verify import HeaderVerifier
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+class CountingLoader(StaticKeyLoader):
+
+    def __init__(self, keys):
+        super(CountingLoader, self).__init__(keys)
+        self.calls = 0
+
+    def __call__(self, key_id, algorithm):
+        self.calls += 1
+        return super(CountingLoader, self).__call__(key_id, algorithm)
+
+
+class KeyService(object):
+    """
+    Stand-in for a remote key service: answers slowly and counts fetches.
+    """
+    def __init__(self, keys, delay=0.05):
+        self.keys = dict(keys)
+        self.delay = delay
+        self.fetches = 0
+        self._lock = threading.Lock()
+
+    def _count(self):
+        with self._lock:
+            self.fetches += 1
+
+    def __call__(self, key_id, algorithm):
+        self._count()
+        time.sleep(self.delay)
+        return self.keys.get(key_id)
+
+    async def resolve(self, key_id, algorithm):
+        import asyncio
+        self._count()
+        await asyncio.sleep(self.delay)
+        return self.keys.get(key_id)
+
+
+def burst(func, count=50):
+    """
+    Call `func` from `count` threads at once; return results and exceptions.
+    """
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(i):
+        barrier.wait()
+        try:
+            results[i] = func()
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TestKeyStore(unittest.TestCase):
+    header_date = 'Thu, 05 Jan 2014 21:31:40 GMT'
+
+    def setUp(self):
+        public_key_path = os.path.join(
+            os.path.dirname(__file__), 'rsa_public.pem')
+        with open(public_key_path, 'rb') as f:
+            self.public_key = f.read()
+        private_key_path = os.path.join(
+            os.path.dirname(__file__), 'rsa_private.pem')
+        with open(private_key_path, 'rb') as f:
+            self.private_key = f.read()
+
+        self.now = 1000.0
+        self._monotonic = keystore._monotonic
+        keystore._monotonic = lambda: self.now
+
+    def tearDown(self):
+        keystore._monotonic = self._monotonic
+
+    def test_hit_and_miss(self):
+        loader = CountingLoader({'Test': self.public_key})
+        store = KeyStore(loader)
+        first = store.get('Test', 'rsa-sha256')
+        second = store.get('Test', 'rsa-sha256')
+        self.assertIs(first, second)
+        self.assertEqual(loader.calls, 1)
+        self.assertEqual(store.hits, 1)
+        self.assertEqual(store.misses, 1)
+
+    def test_algorithm_is_part_of_key(self):
+        loader = CountingLoader({'Test': self.public_key})
+        store = KeyStore(loader)
+        self.assertIsNot(store.get('Test', 'rsa-sha256'),
+                         store.get('Test', 'rsa-sha512'))
+        self.assertEqual(loader.calls, 2)
+
+    def test_pinned_algorithm(self):
+        loader = StaticKeyLoader({'rsa': self.public_key, 'hmac': b'secret'})
+        self.assertEqual(loader('rsa', 'rsa-sha512'), self.public_key)
+        # Public keys are refused when parsed as HMAC secrets.
+        with self.assertRaises(HttpSigException):
+            KeyStore(loader).get('rsa', 'hmac-sha256')
+
+        # Base64 HMAC secrets are not mistaken for keys.
+        secret = b'A' * 43 + b'='
+        loader = StaticKeyLoader({'hmac': secret}, algorithm='hmac-sha256')
+        self.assertEqual(loader('hmac', 'hmac-sha256'), secret)
+        self.assertIsNone(loader('hmac', 'hmac-sha1'))
+
+        loader = FixedKeyLoader(self.public_key, algorithm='rsa-sha256')
+        self.assertIsNone(loader('any', 'rsa-sha512'))
+        self.assertEqual(loader('any', 'rsa-sha256'), self.public_key)
+        for cls, secret in ((FixedKeyLoader, self.public_key),
+                            (StaticKeyLoader, {'rsa': self.public_key})):
+            with self.assertRaises(HttpSigException):
+                cls(secret, algorithm='hmac-sha256')
+
+    def test_fixed_key_store(self):
+        store = FixedKeyStore(FixedKeyLoader(b'secret'), maxsize=2)
+        first = store.get('a', 'hmac-sha256')
+        for key_id in ('b', 'c', 'd'):
+            self.assertIs(store.get(key_id, 'hmac-sha256'), first)
+        self.assertEqual((store.misses, store.evictions, len(store)),
+                         (1, 0, 1))
+        store.invalidate('x')
+        self.assertIsNone(store.peek('a', 'hmac-sha256'))
+
+    def test_lru_eviction(self):
+        loader = CountingLoader({'a': b'secret a', 'b': b'secret b',
+                                 'c': b'secret c'})
+        store = KeyStore(loader, maxsize=2)
+        store.get('a', 'hmac-sha256')
+        store.get('b', 'hmac-sha256')
+        store.get('a', 'hmac-sha256')
+        store.get('c', 'hmac-sha256')
+        self.assertEqual(store.evictions, 1)
+        self.assertEqual(len(store), 2)
+        store.get('a', 'hmac-sha256')
+        self.assertEqual(loader.calls, 3)
+        store.get('b', 'hmac-sha256')
+        self.assertEqual(loader.calls, 4)
+
+    def test_ttl_expiry(self):
+        loader = CountingLoader({'a': b'secret a'})
+        store = KeyStore(loader, ttl=10)
+        store.get('a', 'hmac-sha256')
+        self.now += 9
+        store.get('a', 'hmac-sha256')
+        self.assertEqual(loader.calls, 1)
+        self.now += 2
+        store.get('a', 'hmac-sha256')
+        self.assertEqual(loader.calls, 2)
+
+    def test_negative_caching(self):
+        loader = CountingLoader({})
+        store = KeyStore(loader, negative_ttl=5)
+        for _ in range(3):
+            with self.assertRaises(HttpSigException):
+                store.get('nobody', 'hmac-sha256')
+        self.assertEqual(loader.calls, 1)
+        self.now += 6
+        with self.assertRaises(HttpSigException):
+            store.get('nobody', 'hmac-sha256')
+        self.assertEqual(loader.calls, 2)
+
+    def test_invalidate(self):
+        loader = CountingLoader({'a': b'secret a'})
+        store = KeyStore(loader)
+        store.get('a', 'hmac-sha256')
+        store.invalidate('a')
+        store.get('a', 'hmac-sha256')
+        self.assertEqual(loader.calls, 2)
+
+    def test_header_verifier(self):
+        store = KeyStore(StaticKeyLoader({'Test': self.public_key}))
+        hs = HeaderSigner(key_id='Test', secret=self.private_key,
+                          algorithm='rsa-sha256')
+        signed = hs.sign({'Date': self.header_date})
+        for _ in range(2):
+            hv = HeaderVerifier(headers=signed, key_store=store)
+            self.assertTrue(hv.verify())
+        self.assertEqual(store.hits, 1)
+        self.assertEqual(hv.algorithm, 'rsa-sha256')
+        self.assertTrue(hv._verify(b'data', hs._signer.sign(b'data')))
+
+        hs = HeaderSigner(key_id='Other', secret=self.private_key,
+                          algorithm='rsa-sha256')
+        signed = hs.sign({'Date': self.header_date})
+        hv = HeaderVerifier(headers=signed, key_store=store)
+        with self.assertRaises(HttpSigException):
+            hv.verify()
+
+    def test_single_flight(self):
+        service = KeyService({'Test': self.public_key})
+        store = KeyStore(service)
+        results = burst(lambda: store.get('Test', 'rsa-sha256'))
+        self.assertEqual(service.fetches, 1)
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertEqual(store.coalesced + 1 + store.hits, len(results))
+
+        results = burst(lambda: store.get('nobody', 'rsa-sha256'))
+        self.assertEqual(service.fetches, 2)
+        self.assertTrue(all(isinstance(r, HttpSigException)
+                            for r in results))
+
+    def test_stale_while_revalidate(self):
+        service = KeyService({'a': b'secret a'}, delay=0.01)
+        store = KeyStore(service, ttl=10, stale_ttl=5)
+        first = store.get('a', 'hmac-sha256')
+        self.now += 12
+        # Served stale while one reload runs in the background.
+        results = burst(lambda: store.get('a', 'hmac-sha256'), count=10)
+        self.assertTrue(all(r is first for r in results))
+        deadline = time.time() + 5
+        while store.peek('a', 'hmac-sha256') is first:
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+        self.assertEqual(service.fetches, 2)
+        self.assertGreaterEqual(store.stale_hits, 10)
+
+        # Past the stale window, the reload happens before answering.
+        self.now += 20
+        self.assertIsNot(store.get('a', 'hmac-sha256'), first)
+        self.assertEqual(service.fetches, 3)
+
+    def test_refresh_revoked_key(self):
+        service = KeyService({'a': b'secret a'}, delay=0)
+        store = KeyStore(service, ttl=10, stale_ttl=5)
+        store.get('a', 'hmac-sha256')
+        del service.keys['a']
+        self.now += 11
+        store.get('a', 'hmac-sha256')
+        deadline = time.time() + 5
+        while store.refresh_errors == 0:
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+        with self.assertRaises(HttpSigException):
+            store.get('a', 'hmac-sha256')
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+import base64
+import os
+import pickle
+import sys
+import unittest
+
+from httpsig import clock
+from httpsig.keystore import KeyStore
+from httpsig.policy import STAGES, Policy, Rejected, decoded_size
+from httpsig.sign import HeaderSigner
+from httpsig.utils import HttpSigException, parse_authorization_params
+from httpsig.verify import HeaderVerifier, RequestVerifier
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+NOW = 1388957500
+DATE = 'Sun, 05 Jan 2014 21:31:40 GMT'
+
+
+class CountingLoader(object):
+
+    def __init__(self, secret):
+        self.secret = secret
+        self.calls = 0
+
+    def __call__(self, key_id, algorithm):
+        self.calls += 1
+        return self.secret
+
+
+class TestPolicy(unittest.TestCase):
+    secret = b'secret'
+
+    def setUp(self):
+        self.clock = clock.FakeClock(NOW)
+        self.previous = clock.set_clock(self.clock)
+        self.loader = CountingLoader(self.secret)
+
+    def tearDown(self):
+        clock.set_clock(self.previous)
+
+    def verifier(self, **kwargs):
+        return RequestVerifier(key_store=KeyStore(self.loader),
+                               policy=Policy(**kwargs))
+
+    def sign(self, headers=('date',), algorithm='hmac-sha256', **kwargs):
+        signer = HeaderSigner('Test', self.secret, algorithm=algorithm,
+                              headers=list(headers), **kwargs)
+        return signer.sign({'Date': DATE}, method='GET', path='/')
+
+    def assertRejected(self, verifier, signed, stage):
+        with self.assertRaises(Rejected) as cm:
+            verifier.verify(signed, method='GET', path='/')
+        self.assertEqual(cm.exception.stage, stage)
+        self.assertEqual(verifier.rejections[stage], 1)
+        self.assertEqual(sum(verifier.rejections.values()), 1)
+
+    def test_decoded_size(self):
+        for size in range(70):
+            encoded = base64.b64encode(b'x' * size)
+            self.assertEqual(decoded_size(encoded), size)
+            self.assertEqual(decoded_size(encoded.decode('ascii')), size)
+        self.assertIsNone(decoded_size('abc'))
+
+    def test_valid(self):
+        verifier = self.verifier(
+            required_headers=['date', '(created)'], algorithms=['hmac-sha256'],
+            key_ids=['Test'], max_age=60)
+        signed = self.sign(['(request-target)', '(created)', '(expires)',
+                            'date'], expires_in=30)
+        params = parse_authorization_params(signed['authorization'])
+        self.assertEqual((params.created, params.expires),
+                         (str(NOW), str(NOW + 30)))
+        self.clock.advance(10)
+        self.assertTrue(verifier.verify(signed, method='GET', path='/'))
+        self.assertEqual(set(verifier.rejections), set(STAGES))
+        self.assertEqual(sum(verifier.rejections.values()), 0)
+
+    def test_created_is_signed(self):
+        verifier = self.verifier()
+        signed = self.sign(['(created)', 'date'])
+        value = signed['authorization']
+        signed['authorization'] = value.replace(
+            'created=%d' % NOW, 'created=%d' % (NOW - 1))
+        self.assertFalse(verifier.verify(signed))
+        signed['authorization'] = value
+        self.assertTrue(verifier.verify(signed))
+
+    def test_date_not_generated(self):
+        verifier = self.verifier()
+        signed = self.sign(['(created)', 'date'])
+        del signed['date']
+        value = signed['authorization']
+        for created in ('%d' % NOW, '%d.0' % NOW):
+            signed['authorization'] = value.replace(
+                'created=%d' % NOW, 'created=' + created)
+            with self.assertRaises(Exception) as cm:
+                verifier.verify(signed)
+            self.assertIn('missing required header "date"',
+                          str(cm.exception))
+
+    def test_algorithm(self):
+        verifier = self.verifier(algorithms=['ed25519'])
+        self.assertRejected(verifier, self.sign(), 'algorithm')
+        self.assertEqual(self.loader.calls, 0)
+        with self.assertRaises(HttpSigException):
+            Policy(algorithms=['hs2019'])
+
+    def test_key_id(self):
+        for key_ids in (['Other'], lambda key_id: key_id.startswith('O')):
+            verifier = self.verifier(key_ids=key_ids)
+            self.assertRejected(verifier, self.sign(), 'key_id')
+        self.assertEqual(self.loader.calls, 0)
+
+    def test_headers(self):
+        verifier = self.verifier(required_headers=['date', 'digest'])
+        self.assertRejected(verifier, self.sign(), 'headers')
+
+    def test_signature_size(self):
+        verifier = self.verifier()
+        signed = self.sign(algorithm='hmac-sha1')
+        # An hmac-sha1 signature claiming to be hmac-sha256.
+        signed['authorization'] = signed['authorization'].replace(
+            'hmac-sha1', 'hmac-sha256')
+        self.assertRejected(verifier, signed, 'signature')
+        self.assertEqual(self.loader.calls, 0)
+
+    def test_created(self):
+        signed = self.sign(['(created)', 'date'])
+        self.clock.timestamp = NOW - 301
+        self.assertRejected(self.verifier(), signed, 'created')
+        self.clock.timestamp = NOW + 70
+        self.assertTrue(self.verifier().verify(signed))
+        self.assertRejected(self.verifier(max_age=60, max_skew=5), signed,
+                            'created')
+
+        # (created) signed without its parameter.
+        signed['authorization'] = signed['authorization'].replace(
+            ',created=%d' % NOW, '')
+        self.clock.timestamp = NOW
+        self.assertRejected(self.verifier(), signed, 'created')
+
+    def test_expires(self):
+        with self.assertRaises(HttpSigException):
+            self.sign(['(expires)'])
+        signed = self.sign(['(expires)', 'date'], expires_in=30)
+        self.clock.advance(30 + 300)
+        self.assertTrue(self.verifier().verify(signed))
+        self.clock.advance(1)
+        self.assertRejected(self.verifier(), signed, 'expires')
+
+    def test_date(self):
+        signed = self.sign()
+        self.clock.advance(3600)
+        # Dates are only checked with a maximum age.
+        self.assertTrue(self.verifier().verify(signed))
+        self.assertRejected(self.verifier(max_age=60), signed, 'date')
+        self.clock.timestamp = NOW - 301
+        self.assertRejected(self.verifier(max_age=60), signed, 'date')
+        signed['date'] = 'yesterday'
+        self.assertRejected(self.verifier(max_age=60), signed, 'date')
+
+    def test_header_verifier(self):
+        policy = Policy(max_age=60)
+        signed = self.sign(['(request-target)', '(created)', 'date'])
+        hv = HeaderVerifier(signed, self.secret, method='GET', path='/',
+                            policy=policy)
+        self.assertTrue(hv.verify())
+        self.clock.advance(3600)
+        with self.assertRaises(Rejected):
+            hv.verify()
+        self.assertEqual(policy.rejections['created'], 1)
+
+        # The key is looked up once the keyId is accepted.
+        hv = HeaderVerifier(signed, key_store=KeyStore(self.loader),
+                            method='GET', path='/',
+                            policy=Policy(key_ids=['Other']))
+        with self.assertRaises(Rejected):
+            hv.verify()
+        self.assertEqual(self.loader.calls, 0)
+        with self.assertRaises(Rejected):
+            HeaderVerifier(signed, key_store=KeyStore(self.loader),
+                           policy=Policy(algorithms=['ed25519']))
+
+    def test_pickle(self):
+        policy = Policy(max_age=60, key_ids=set(['Test']))
+        signed = self.sign(['(request-target)', '(created)', 'date'])
+        verifier = RequestVerifier(self.secret, policy=policy)
+        copy = pickle.loads(pickle.dumps(verifier))
+        self.assertTrue(copy.verify(signed, method='GET', path='/'))
+        hv = pickle.loads(pickle.dumps(HeaderVerifier(
+            signed, self.secret, method='GET', path='/', policy=policy)))
+        self.assertTrue(hv.verify())
+
+        self.clock.advance(3600)
+        with self.assertRaises(Rejected):
+            copy.verify(signed, method='GET', path='/')
+        self.assertEqual(copy.rejections['created'], 1)
+        self.assertEqual(policy.rejections['created'], 0)
+
+        results = verifier.verify_many(
+            [(signed, 'GET', '/')] * 4, max_workers=2, processes=True)
+        self.assertEqual(list(results), [False] * 4)
+
+    def test_sign_value(self):
+        signer = HeaderSigner('Test', self.secret, algorithm='hmac-sha256',
+                              headers=['(created)', '(expires)'],
+                              expires_in=60)
+        value = signer.sign_value({})
+        self.assertTrue(value.endswith(
+            (',created=%d,expires=%d' % (NOW, NOW + 60)).encode('ascii')))
+        self.assertTrue(RequestVerifier(
+            self.secret, required_headers=['(created)']).verify(
+                {'authorization': value}))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from httpsig import prefork
+from httpsig.keydir import KeyDirectory
+from httpsig.keystore import KeyStore
+from httpsig.sign import HeaderSigner
+from httpsig.verify import RequestVerifier
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+def read(name):
+    with open(os.path.join(os.path.dirname(__file__), name), 'rb') as f:
+        return f.read()
+
+
+class TestPrefork(unittest.TestCase):
+    header_date = 'Thu, 05 Jan 2014 21:31:40 GMT'
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        for name, data in (('alice.pem', read('rsa_public.pem')),
+                           ('bob.txt', read('ed25519_public.txt'))):
+            with open(os.path.join(self.path, name), 'wb') as f:
+                f.write(data)
+        self.keys = KeyDirectory(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        if hasattr(gc, 'unfreeze'):
+            gc.unfreeze()
+
+    def test_key_pairs(self):
+        self.assertEqual(sorted(self.keys.key_pairs()),
+                         [('alice', 'rsa-sha256'), ('bob', 'ed25519')])
+        pairs = self.keys.key_pairs(
+            {'rsa': ('rsa-sha256', 'rsa-sha512')}, fingerprints=True)
+        self.assertEqual(len(list(pairs)), 4)
+
+    def test_preload(self):
+        store = KeyStore(self.keys)
+        self.assertEqual(prefork.preload(store), 2)
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store.preload([('nobody', 'ed25519'),
+                                        ('bob', 'ed25519')]), 1)
+        if hasattr(gc, 'get_freeze_count'):
+            self.assertGreater(gc.get_freeze_count(), 0)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork()')
+    def test_forked_worker(self):
+        store = KeyStore(self.keys)
+        prefork.preload(store)
+        verifier = RequestVerifier(key_store=store)
+        signed = HeaderSigner('alice', read('rsa_private.pem'),
+                              algorithm='rsa-sha256').sign(
+                                  {'Date': self.header_date})
+        misses = store.misses
+
+        pid = os.fork()
+        if pid == 0:
+            # The worker verifies without loading the key.
+            ok = verifier.verify(signed) and store.misses == misses
+            os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+import os
+import sys
+import unittest
+
+from httpsig import clock
+from httpsig.keystore import KeyStore, StaticKeyLoader
+from httpsig.replay import (BloomStore, Replayed, ReplayGuard, ReplayStore,
+                            bloom_size)
+from httpsig.sign import HeaderSigner
+from httpsig.utils import HttpSigException
+from httpsig.verify import HeaderVerifier, RequestVerifier
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+NOW = 1388957500
+
+
+class SetStore(ReplayStore):
+    """
+    A ReplayStore without false positives, keeping every key.
+    """
+    slots = 100
+
+    def __init__(self):
+        self.keys = set()
+
+    def add(self, bucket, key):
+        if (bucket, key) in self.keys:
+            return False
+        self.keys.add((bucket, key))
+        return True
+
+
+class TestBloomStore(unittest.TestCase):
+
+    def test_size(self):
+        self.assertEqual(bloom_size(1000, 0.01), (9592, 7))
+        self.assertEqual(bloom_size(1, 0.5), (8, 6))
+
+    def test_abstract_store(self):
+        with self.assertRaises(TypeError):
+            ReplayStore()
+
+    def test_add(self):
+        store = BloomStore(3, 100)
+        self.assertEqual(store.memory, 3 * (8 + store.bits // 8))
+        self.assertTrue(store.add(10, b'a'))
+        self.assertFalse(store.add(10, b'a'))
+        self.assertTrue(store.add(11, b'a'))
+        # Bucket 13 reuses the slot of bucket 10, which is dropped.
+        self.assertTrue(store.add(13, b'a'))
+        self.assertFalse(store.add(10, b'b'))
+        self.assertFalse(store.add(11, b'a'))
+
+    def test_error_rate(self):
+        store = BloomStore(1, 1000, 0.01)
+        for i in range(1000):
+            store.add(0, b'key %d' % i)
+        self.assertFalse(store.add(0, b'key 0'))
+        full = bytes(store._data)
+        false_positives = 0
+        for i in range(10000):
+            false_positives += not store.add(0, b'other %d' % i)
+            store._data[:] = full
+        self.assertLess(false_positives, 200)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork()')
+    def test_shared(self):
+        store = BloomStore(2, 100, shared=True)
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if store.add(1, b'child') else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(status, 0)
+        self.assertFalse(store.add(1, b'child'))
+
+
+class TestReplayGuard(unittest.TestCase):
+    secret = b'secret'
+
+    def setUp(self):
+        self.clock = clock.FakeClock(NOW)
+        self.previous = clock.set_clock(self.clock)
+        self.guard = ReplayGuard(window=60, rate=100, buckets=6, max_skew=30)
+
+    def tearDown(self):
+        clock.set_clock(self.previous)
+
+    def sign(self, headers=('(created)', 'date'), **kwargs):
+        signer = HeaderSigner('Test', self.secret, algorithm='hmac-sha256',
+                              headers=list(headers))
+        return signer.sign(kwargs, method='GET', path='/')
+
+    def assertReplayed(self, reason, func, *args):
+        with self.assertRaises(Replayed) as cm:
+            func(*args)
+        self.assertEqual(cm.exception.reason, reason)
+
+    def test_window(self):
+        guard = self.guard
+        self.assertEqual(guard.slots, 6 + 3 + 1)
+        self.assertEqual(guard.store.capacity, 1000)
+        guard.add(b'sig', NOW - 60)
+        guard.add(b'sig', NOW + 30)
+        self.assertReplayed('replay', guard.add, b'sig', NOW - 60)
+        self.assertReplayed('window', guard.add, b'sig', NOW - 61)
+        self.assertReplayed('window', guard.add, b'sig', NOW + 31)
+        self.assertEqual(guard.rejections,
+                         {'replay': 1, 'window': 2, 'time': 0})
+
+        # Slots are reused as time goes by: the window stays covered.
+        for i in range(20):
+            self.clock.advance(10)
+            now = self.clock.now()
+            signature = b'sig %d' % i
+            guard.add(signature, now - 60)
+            guard.add(signature, now + 30)
+            self.assertReplayed('replay', guard.add, signature, now - 60)
+
+        with self.assertRaises(HttpSigException):
+            ReplayGuard(window=60, buckets=6, store=BloomStore(5, 10))
+
+    def test_request_verifier(self):
+        verifier = RequestVerifier(
+            key_store=KeyStore(StaticKeyLoader({'Test': self.secret})),
+            replay_guard=ReplayGuard(store=SetStore()))
+        for headers in (['(created)', 'date'], ['date']):
+            signed = self.sign(headers)
+            self.assertTrue(verifier.verify(signed))
+            self.assertReplayed('replay', verifier.verify, signed)
+            self.clock.advance(1)
+
+        # Invalid signatures are not recorded.
+        signed = self.sign()
+        signed['date'] = clock.get_clock().http_date(NOW - 1)
+        self.assertFalse(verifier.verify(signed))
+        self.assertFalse(verifier.verify(signed))
+
+    def test_verify_many(self):
+        verifier = RequestVerifier(self.secret, replay_guard=self.guard)
+        signed = self.sign(['(created)', 'date'])
+        with self.assertRaises(HttpSigException):
+            list(verifier.verify_many([(signed,)] * 2, processes=True))
+        self.assertEqual(list(verifier.verify_many([(signed,)] * 2)),
+                         [True, False])
+
+    @unittest.skipUnless(hasattr(os, 'fork'), 'needs os.fork()')
+    def test_verify_many_shared(self):
+        verifier = RequestVerifier(
+            self.secret, replay_guard=ReplayGuard(
+                window=60, rate=100, buckets=6, max_skew=30, shared=True))
+        signed = self.sign(['(created)', 'date'])
+        results = verifier.verify_many([(signed,)] * 4, max_workers=2,
+                                       processes=True, batch_size=1)
+        self.assertEqual(sorted(results), [False] * 3 + [True])
+
+    def test_header_verifier(self):
+        signed = self.sign(['(request-target)', '(created)'])
+        for _ in range(2):
+            hv = HeaderVerifier(signed, self.secret, method='GET', path='/',
+                                required_headers=['(created)'],
+                                replay_guard=self.guard)
+            try:
+                self.assertTrue(hv.verify())
+            except Replayed:
+                break
+        self.assertEqual(self.guard.rejections['replay'], 1)
+
+    def test_unsigned_time(self):
+        verifier = RequestVerifier(self.secret, required_headers=['host'],
+                                   replay_guard=self.guard)
+        signed = self.sign(['host'], host='example.com')
+        self.assertReplayed('time', verifier.verify, signed)
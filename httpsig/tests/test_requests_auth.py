@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+import os
+import sys
+import unittest
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+from httpsig.utils import parse_authorization_params
+from httpsig.verify import RequestVerifier
+
+if requests is not None:
+    from httpsig.requests_auth import HTTPSignatureAuth
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+HEADERS = ['host', '(request-target)', 'date']
+DATE = 'Thu, 05 Jan 2014 21:31:40 GMT'
+
+
+@unittest.skipIf(requests is None, 'requests is not installed')
+class TestHTTPSignatureAuth(unittest.TestCase):
+
+    def setUp(self):
+        self.auth = HTTPSignatureAuth(
+            key_id='Test', secret=b'secret', algorithm='hmac-sha256',
+            headers=HEADERS)
+        self.verifier = RequestVerifier(secret=b'secret',
+                                        required_headers=HEADERS)
+
+    def prepare(self, url, headers=None):
+        return requests.Request('GET', url, headers=headers).prepare()
+
+    def test_sign(self):
+        for url, host, path in (
+                ('http://example.com:8080/a%20b?x=1#frag',
+                 'example.com:8080', '/a%20b?x=1'),
+                ('https://example.com', 'example.com', '/'),
+                ('https://example.com?x=1', 'example.com', '/?x=1')):
+            r = self.prepare(url, {'Date': DATE, 'X-Other': 'value'})
+            before = dict(r.headers)
+            r = self.auth(r)
+            self.assertEqual(r.path_url, path)
+            self.assertTrue(self.verifier.verify(
+                r.headers, method='GET', path=path, host=host), url)
+            # only the signature header was added
+            after = dict(r.headers)
+            self.assertTrue(after.pop('authorization').startswith(
+                'Signature keyId="Test"'))
+            self.assertEqual(after, before)
+
+    def test_generated_date(self):
+        r = self.auth(self.prepare('https://example.com/'))
+        self.assertTrue(r.headers['Date'].endswith(' GMT'))
+        self.assertTrue(self.verifier.verify(
+            r.headers, method='GET', path='/', host='example.com'))
+
+    def test_host_contexts(self):
+        for path in ('/a', '/b'):
+            self.auth(self.prepare('https://example.com' + path,
+                                   {'Date': DATE}))
+        self.auth(self.prepare('https://other.com/a', {'Date': DATE}))
+        self.assertEqual(sorted(self.auth._hosts),
+                         ['https://example.com', 'https://other.com'])
+        context = self.auth.host_context('https://example.com',
+                                         'example.com')
+        self.assertEqual(context.host, 'example.com')
+        self.assertEqual(
+            context.message.build({'date': DATE}, method='GET', path='/'),
+            b'host: example.com\n(request-target): get /\ndate: ' +
+            DATE.encode('ascii'))
+
+    def test_created(self):
+        auth = HTTPSignatureAuth(
+            key_id='Test', secret=b'secret', algorithm='hmac-sha256',
+            headers=HEADERS + ['(created)'])
+        r = auth(self.prepare('https://example.com/', {'Date': DATE}))
+        self.assertIn(',created=', r.headers['authorization'])
+        self.assertTrue(self.verifier.verify(
+            r.headers, method='GET', path='/', host='example.com'))
+
+    def test_expires(self):
+        auth = HTTPSignatureAuth(
+            key_id='Test', secret=b'secret', algorithm='hmac-sha256',
+            headers=HEADERS + ['(created)', '(expires)'], expires_in=60)
+        r = auth(self.prepare('https://example.com/', {'Date': DATE}))
+        params = parse_authorization_params(r.headers['authorization'])
+        self.assertEqual(int(params.expires), int(params.created) + 60)
+        self.assertTrue(self.verifier.verify(
+            r.headers, method='GET', path='/', host='example.com'))
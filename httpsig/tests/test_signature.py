@@ -46,6 +46,13 @@ class TestSign(unittest.TestCase):
         self.assertEqual(params['algorithm'], 'rsa-sha256')
         self.assertEqual(params['signature'], 'jKyvPcxB4JbmYY4mByyBY7cZfNl4OW9HpFQlG7N4YcJPteKTu4MWCLyk+gIr0wDgqtLWf9NLpMAMimdfsH7FSWGfbMFSrsVTHNTk0rK3usrfFnti1dxsM4jl0kYJCKTGI/UWkqiaxwNiKqGcdlEDrTcUhhsFsOIo8VhddmZTZ8w=')  # noqa: E501
 
+    def test_generated_date(self):
+        hs = sign.HeaderSigner(key_id='Test', secret=self.key)
+        signed = hs.sign({})
+        # the Date that was signed must be sent along
+        self.assertIn('Date', signed)
+        self.assertTrue(signed['Date'].endswith(' GMT'))
+
     def test_basic(self):
         hs = sign.HeaderSigner(key_id='Test', secret=self.key, headers=[
             '(request-target)',
@@ -106,3 +113,27 @@ class TestSign(unittest.TestCase):
             params['headers'],
             '(request-target) host date content-type digest content-length')
         self.assertEqual(params['signature'], 'Ef7MlxLXoBovhil3AlyjtBwAL9g4TN3tibLj7uuNB3CROat/9KaeQ4hW2NiJ+pZ6HQEOx9vYZAyi+7cmIkmJszJCut5kQLAwuX+Ms/mUFvpKlSo9StS2bMXDBNjOh4Auj774GFj4gwjS+3NhFeoqyr/MuN6HsEnkvn6zdgfE2i0=')  # noqa: E501
+
+    def test_sign_value(self):
+        hs = sign.HeaderSigner(key_id='Test', secret=self.key, headers=[
+            '(request-target)',
+            'host',
+            'date',
+        ])
+        unsigned = {
+            'Host': self.header_host,
+            'Date': self.header_date,
+        }
+        signed = hs.sign(
+            unsigned, method=self.test_method, path=self.test_path)
+        raw = {
+            'host': memoryview(self.header_host.encode('ascii')),
+            'date': self.header_date.encode('ascii'),
+        }
+        value = hs.sign_value(
+            raw, method=memoryview(b'POST'), path=self.test_path.encode())
+        self.assertIsInstance(value, bytes)
+        self.assertEqual(value.decode('ascii'), signed['authorization'])
+        with self.assertRaises(Exception):
+            hs.sign_value({'host': self.header_host},
+                          method=self.test_method, path=self.test_path)
@@ -1,8 +1,14 @@
 #!/usr/bin/env python
 import os
 import sys
+import time
 import unittest
-from httpsig.utils import get_fingerprint
+from httpsig.utils import (MAX_PARAMS_LENGTH, CaseInsensitiveDict,
+                           HttpSigException, MessageBuilder, RawHeaders,
+                           SignatureParams, WSGIHeaders, as_headers,
+                           compile_message, generate_message,
+                           get_fingerprint, parse_authorization_header,
+                           parse_authorization_params, parse_signature_params)
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
@@ -16,3 +22,186 @@ class TestUtils(unittest.TestCase):
         fingerprint = get_fingerprint(key)
         self.assertEqual(
             fingerprint, "73:61:a2:21:67:e0:df:be:7e:4b:93:1e:15:98:a5:b7")
+        self.assertEqual(get_fingerprint(key.encode('ascii')), fingerprint)
+
+    def test_get_fingerprint_openssh(self):
+        key = ('ssh-ed25519 AAAAC3NzaC1lZDI1NTE5AAAAILTQXu8CmcFDcAz9+vkfh92'
+               'NGZrqJ+2sT6rlhcIuuykc test')
+        self.assertEqual(get_fingerprint(key),
+                         "65:39:e6:3a:ae:ed:57:25:8a:a1:b9:e3:4f:45:de:52")
+
+
+class TestMessageBuilder(unittest.TestCase):
+    headers = CaseInsensitiveDict({
+        'Host': 'example.com',
+        'Date': 'Thu, 05 Jan 2014 21:31:40 GMT',
+        'Content-Type': 'application/json',
+    })
+
+    def test_build(self):
+        builder = MessageBuilder(
+            ['(request-target)', 'Host', 'date', 'content-type'])
+        self.assertEqual(builder.headers, (
+            '(request-target)', 'host', 'date', 'content-type'))
+        self.assertEqual(
+            builder.build(self.headers, method='POST', path='/foo?a=b'),
+            b'(request-target): post /foo?a=b\n'
+            b'host: example.com\n'
+            b'date: Thu, 05 Jan 2014 21:31:40 GMT\n'
+            b'content-type: application/json')
+
+    def test_bytes_values(self):
+        builder = MessageBuilder(
+            ['(request-target)', 'host', 'date', 'content-type'])
+        raw = {'host': b'example.com',
+               'date': memoryview(b'Thu, 05 Jan 2014 21:31:40 GMT'),
+               'content-type': bytearray(b'application/json')}
+        self.assertEqual(
+            builder.build(raw, method=b'POST', path=memoryview(b'/foo?a=b')),
+            builder.build(self.headers, method='POST', path='/foo?a=b'))
+
+    def test_bind(self):
+        builder = MessageBuilder(['host', 'date']).bind('bound.com')
+        self.assertEqual(
+            builder.build(self.headers, host='other.com'),
+            b'host: bound.com\ndate: Thu, 05 Jan 2014 21:31:40 GMT')
+
+    def test_default(self):
+        self.assertEqual(MessageBuilder().build(self.headers),
+                         b'date: Thu, 05 Jan 2014 21:31:40 GMT')
+
+    def test_host_override(self):
+        self.assertEqual(
+            MessageBuilder(['host']).build(self.headers, host='other.com'),
+            b'host: other.com')
+
+    def test_missing(self):
+        with self.assertRaises(Exception):
+            MessageBuilder(['digest']).build(self.headers)
+        with self.assertRaises(Exception):
+            MessageBuilder(['host']).build({})
+        with self.assertRaises(Exception):
+            MessageBuilder(['(request-target)']).build({}, method='GET')
+
+    def test_generated_date(self):
+        message = MessageBuilder(['date']).build({})
+        self.assertTrue(message.startswith(b'date: '))
+        self.assertTrue(message.endswith(b' GMT'))
+        # Verifiers never sign a Date that was not sent.
+        with self.assertRaises(Exception):
+            MessageBuilder(['date']).build({}, signing=False)
+        with self.assertRaises(Exception):
+            MessageBuilder(['(created)']).build({}, signing=False)
+
+    def test_generate_message(self):
+        self.assertEqual(
+            generate_message(['Host'], {'HOST': 'example.com'}),
+            b'host: example.com')
+
+    def test_compile_cache(self):
+        self.assertIs(compile_message(['date', 'host']),
+                      compile_message(['date', 'host']))
+
+
+class TestRawHeaders(unittest.TestCase):
+
+    def test_lookup(self):
+        headers = RawHeaders([('Host', 'example.com'),
+                              ('X-Forwarded-For', '10.0.0.1'),
+                              ('x-forwarded-for', '10.0.0.2')])
+        self.assertEqual(headers['host'], 'example.com')
+        self.assertEqual(headers.get('HOST'), 'example.com')
+        # repeated headers are combined in order
+        self.assertEqual(headers['X-Forwarded-For'], '10.0.0.1, 10.0.0.2')
+        self.assertNotIn('date', headers)
+        self.assertIsNone(headers.get('date'))
+        with self.assertRaises(KeyError):
+            headers['date']
+
+    def test_bytes(self):
+        headers = RawHeaders([(b'host', b'example.com'),
+                              (b'via', b'a'), (b'Via', memoryview(b'b'))])
+        self.assertEqual(headers['Host'], b'example.com')
+        self.assertEqual(headers['via'], b'a, b')
+        self.assertEqual(
+            MessageBuilder(['host', 'via']).build(headers),
+            b'host: example.com\nvia: a, b')
+        headers = RawHeaders([(b'via', b'a'), (b'host', b'example.com'),
+                              (b'via', b'b')], lowercase=True)
+        self.assertEqual(headers['VIA'], b'a, b')
+        self.assertEqual(headers['host'], b'example.com')
+
+    def test_wsgi(self):
+        headers = WSGIHeaders({'HTTP_HOST': 'example.com',
+                               'CONTENT_TYPE': 'application/json',
+                               'HTTP_X_REQUEST_ID': '42'})
+        self.assertEqual(headers['Host'], 'example.com')
+        self.assertEqual(headers['content-type'], 'application/json')
+        self.assertEqual(headers.get('x-request-id'), '42')
+        self.assertNotIn('date', headers)
+        with self.assertRaises(KeyError):
+            headers['date']
+
+    def test_as_headers(self):
+        self.assertIsInstance(as_headers([]), RawHeaders)
+        self.assertIsInstance(as_headers({}), CaseInsensitiveDict)
+        headers = CaseInsensitiveDict()
+        self.assertIs(as_headers(headers), headers)
+
+
+class TestParseSignatureParams(unittest.TestCase):
+    header = ('Signature keyId="Test",algorithm="rsa-sha256",'
+              'created=1402170695, expires=1402170995.5,'
+              'headers="(request-target) (created) host date",'
+              'signature="KY+J5RxA3oFfa0+wWrhbR0gMhJ1uNr7uoXqzVsVFvAc="')
+
+    def test_parse(self):
+        params = parse_authorization_params(self.header)
+        self.assertEqual(params, SignatureParams(
+            key_id='Test', algorithm='rsa-sha256',
+            headers='(request-target) (created) host date',
+            signature='KY+J5RxA3oFfa0+wWrhbR0gMhJ1uNr7uoXqzVsVFvAc=',
+            created='1402170695', expires='1402170995.5'))
+
+    def test_matches_legacy_parser(self):
+        params = parse_authorization_params(self.header)
+        legacy = parse_authorization_header(self.header)[1]
+        self.assertEqual(params.key_id, legacy['keyId'])
+        self.assertEqual(params.algorithm, legacy['algorithm'])
+        self.assertEqual(params.headers, legacy['headers'])
+        self.assertEqual(params.signature, legacy['signature'])
+
+    def test_escaped_quotes(self):
+        value = r'keyId="a \"quoted\", key",algorithm="hmac-sha256"'
+        params = parse_signature_params(value)
+        self.assertEqual(params.key_id, 'a "quoted", key')
+        self.assertEqual(params.algorithm, 'hmac-sha256')
+        legacy = parse_authorization_header('Signature ' + value)[1]
+        self.assertEqual(legacy['keyId'], 'a "quoted", key')
+
+    def test_bytes_and_case(self):
+        params = parse_signature_params(b'KEYID="Test", Signature="abc"')
+        self.assertEqual(params.key_id, 'Test')
+        self.assertEqual(params.signature, 'abc')
+        self.assertIsNone(params.algorithm)
+
+    def test_garbage(self):
+        self.assertEqual(parse_authorization_params('Signature'),
+                         SignatureParams())
+        params = parse_authorization_params(
+            'Signature garbage, keyId="Test", foo="bar"')
+        self.assertEqual(params.key_id, 'Test')
+        params = parse_signature_params('keyId="", algorithm=')
+        self.assertEqual((params.key_id, params.algorithm), ('', ''))
+
+    def test_long_input(self):
+        # Each of these took seconds with a regex backtracking from every
+        # offset.
+        size = MAX_PARAMS_LENGTH
+        for value in ('a' * size, ' a' * (size // 2), 'a="' * (size // 3),
+                      'a="\\' * (size // 4), ('a=b ' * size)[:size]):
+            start = time.time()
+            self.assertEqual(parse_signature_params(value), SignatureParams())
+            self.assertLess(time.time() - start, 0.1)
+        with self.assertRaises(HttpSigException):
+            parse_signature_params('a' * (size + 1))
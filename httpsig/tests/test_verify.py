@@ -1,10 +1,16 @@
 #!/usr/bin/env python
 import sys
 import os
+import pickle
+import threading
 import unittest
 
-from httpsig.sign import HeaderSigner, Signer
-from httpsig.verify import HeaderVerifier, Verifier
+from httpsig.keystore import KeyStore, StaticKeyLoader
+from httpsig.policy import Rejected
+from httpsig.sign import BaseSigner, HeaderSigner, Signer, new_signer
+from httpsig.utils import HttpSigException, WSGIHeaders
+from httpsig.verify import (BaseVerifier, HeaderVerifier, RequestVerifier,
+                            Verifier, new_verifier)
 
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
@@ -57,6 +63,49 @@ class TestVerifyHMACSHA1(BaseTestCase):
         self.assertTrue(verifier._verify(data=GOOD, signature=signature))
         self.assertFalse(verifier._verify(data=BAD, signature=signature))
 
+    def test_specialized(self):
+        signer = new_signer(self.sign_secret, algorithm=self.algorithm)
+        verifier = new_verifier(self.verify_secret, algorithm=self.algorithm)
+        family = self.algorithm.split('-')[0]
+        self.assertEqual(signer.sign_algorithm, family)
+        self.assertEqual(verifier.sign_algorithm, family)
+        self.assertEqual(signer.algorithm, self.algorithm)
+        self.assertFalse(hasattr(verifier, '__dict__'))
+
+        GOOD = b"this is a test"
+        signature = signer.sign(GOOD)
+        self.assertEqual(signature, Signer(
+            self.sign_secret, algorithm=self.algorithm).sign(GOOD))
+        self.assertTrue(verifier.verify(GOOD, signature))
+        self.assertFalse(verifier.verify(GOOD + b'!', signature))
+
+        copy = pickle.loads(pickle.dumps(verifier))
+        self.assertIs(type(copy), type(verifier))
+        self.assertTrue(copy.verify(GOOD, signature))
+
+        for cls in (BaseSigner, BaseVerifier):
+            with self.assertRaises(TypeError):
+                cls(self.sign_secret)
+
+    def test_pickle(self):
+        GOOD = b"this is a test"
+        signer = Signer(secret=self.sign_secret, algorithm=self.algorithm)
+        verifier = Verifier(
+                secret=self.verify_secret, algorithm=self.algorithm)
+        signature = signer.sign(GOOD)
+        for obj in (signer, verifier):
+            data = pickle.dumps(obj)
+            # The key material, the algorithm and the backend's name only.
+            self.assertLess(len(data), len(obj._signer._secret) + 160)
+            copy = pickle.loads(data)
+            self.assertIs(type(copy), type(obj))
+            self.assertIs(copy.backend, obj.backend)
+            self.assertEqual(copy.algorithm, obj.algorithm)
+        self.assertEqual(pickle.loads(pickle.dumps(signer)).sign(GOOD),
+                         signature)
+        self.assertTrue(
+            pickle.loads(pickle.dumps(verifier))._verify(GOOD, signature))
+
     def test_default(self):
         unsigned = {
             'Date': self.header_date
@@ -133,6 +182,15 @@ class TestVerifyHMACSHA1(BaseTestCase):
         with self.assertRaises(Exception):
             hv.verify()
 
+        # An unusable algorithm is refused before the secret is parsed.
+        signed[self.sign_header] = signed[self.sign_header].replace(
+            self.algorithm, 'rsa-md5')
+        with self.assertRaises(Rejected) as cm:
+            HeaderVerifier(headers=signed, secret=self.verify_secret,
+                           host=HOST, method=METHOD, path=PATH,
+                           sign_header=self.sign_header)
+        self.assertEqual(cm.exception.stage, 'algorithm')
+
     def test_extra_auth_headers(self):
         HOST = "example.com"
         METHOD = "POST"
@@ -166,6 +224,110 @@ class TestVerifyHMACSHA1(BaseTestCase):
                 required_headers=['date', '(request-target)'])
         self.assertTrue(hv.verify())
 
+    def test_request_verifier(self):
+        hs = HeaderSigner(
+                key_id="Test",
+                secret=self.sign_secret,
+                sign_header=self.sign_header,
+                algorithm=self.algorithm,
+                headers=['(request-target)', 'host', 'date'])
+        unsigned = {
+            'Host': self.header_host,
+            'Date': self.header_date,
+        }
+        signed = hs.sign(unsigned, method=self.test_method,
+                         path=self.test_path)
+
+        rv = RequestVerifier(
+                secret=self.verify_secret, sign_header=self.sign_header,
+                required_headers=['(request-target)'])
+        for _ in range(2):
+            self.assertTrue(rv.verify(signed, method=self.test_method,
+                                      path=self.test_path))
+        self.assertFalse(rv.verify(signed, method=self.test_method,
+                                   path='/bar'))
+        with self.assertRaises(Exception):
+            rv.verify({'Date': self.header_date,
+                       self.sign_header: signed[self.sign_header]},
+                      method=self.test_method, path=self.test_path)
+
+        # The secret is used for every keyId, and parsed once.
+        for key_id in ('Other', 'Another'):
+            hs = HeaderSigner(key_id, self.sign_secret,
+                              sign_header=self.sign_header,
+                              algorithm=self.algorithm,
+                              headers=['(request-target)'])
+            signed = hs.sign({}, method=self.test_method, path=self.test_path)
+            self.assertTrue(rv.verify(signed, method=self.test_method,
+                                      path=self.test_path))
+        self.assertEqual(rv.key_store.misses, 1)
+        self.assertEqual(len(rv.key_store), 1)
+
+    def test_base64_secret(self):
+        # HMAC secrets are often the base64 encoding of 32 random bytes.
+        if not self.algorithm.startswith('hmac'):
+            return
+        secret = b'A' * 43 + b'='
+        hs = HeaderSigner(self.keyId, secret, sign_header=self.sign_header,
+                          algorithm=self.algorithm)
+        signed = hs.sign({'Date': self.header_date})
+        self.assertTrue(RequestVerifier(
+            secret, sign_header=self.sign_header).verify(signed))
+        self.assertTrue(HeaderVerifier(
+            signed, secret, sign_header=self.sign_header).verify())
+
+    def test_bytes_headers(self):
+        hs = HeaderSigner(
+                key_id="Test",
+                secret=self.sign_secret,
+                sign_header=self.sign_header,
+                algorithm=self.algorithm,
+                headers=['(request-target)', 'host', 'date'])
+        raw = {
+            'host': self.header_host.encode('ascii'),
+            'date': memoryview(self.header_date.encode('ascii')),
+        }
+        raw[self.sign_header] = hs.sign_value(
+                raw, method=b'POST', path=self.test_path.encode('ascii'))
+
+        rv = RequestVerifier(
+                secret=self.verify_secret, sign_header=self.sign_header)
+        self.assertTrue(rv.verify(raw, method=b'POST',
+                                  path=self.test_path.encode('ascii')))
+        self.assertFalse(rv.verify(raw, method=b'POST', path=b'/bar'))
+
+    def test_header_lists(self):
+        hs = HeaderSigner(
+                key_id="Test",
+                secret=self.sign_secret,
+                sign_header=self.sign_header,
+                algorithm=self.algorithm,
+                headers=['host', 'date', 'via'])
+        pairs = [(b'host', self.header_host.encode('ascii')),
+                 (b'date', self.header_date.encode('ascii')),
+                 (b'via', b'1.1 a'),
+                 (b'via', b'1.1 b')]
+        signed = hs.sign(pairs)
+        self.assertEqual(signed[:4], pairs)
+        self.assertEqual(signed[4][0], self.sign_header.encode('ascii'))
+
+        rv = RequestVerifier(
+                secret=self.verify_secret, sign_header=self.sign_header,
+                required_headers=['via'])
+        self.assertTrue(rv.verify(signed))
+        self.assertTrue(HeaderVerifier(
+                signed, self.verify_secret, sign_header=self.sign_header,
+                required_headers=['via']).verify())
+        # a proxy appending a value changes the signed message
+        self.assertFalse(rv.verify(signed + [(b'via', b'1.1 c')]))
+
+        environ = {'HTTP_HOST': self.header_host,
+                   'HTTP_DATE': self.header_date,
+                   'HTTP_VIA': '1.1 a, 1.1 b'}
+        environ['HTTP_' + self.sign_header.upper()] = \
+            signed[4][1].decode('ascii')
+        self.assertTrue(rv.verify(WSGIHeaders(environ)))
+
 
 class TestVerifyHMACSHA256(TestVerifyHMACSHA1):
 
@@ -201,6 +363,41 @@ class TestVerifyRSASHA1(TestVerifyHMACSHA1):
         self.sign_secret = private_key
         self.verify_secret = public_key
 
+    def test_public_key_as_hmac_secret(self):
+        # Anyone can sign with a public key used as an HMAC secret.
+        hs = HeaderSigner(self.keyId, self.verify_secret,
+                          sign_header=self.sign_header,
+                          algorithm='hmac-sha256')
+        signed = hs.sign({'Date': self.header_date})
+        if self.algorithm == 'ed25519':
+            # A raw ed25519 key looks like an HMAC secret: pin the
+            # algorithm.
+            rv = RequestVerifier(self.verify_secret, algorithm='ed25519',
+                                 sign_header=self.sign_header)
+            with self.assertRaises(HttpSigException):
+                rv.verify(signed)
+            return
+        rv = RequestVerifier(self.verify_secret, sign_header=self.sign_header)
+        with self.assertRaises(HttpSigException):
+            rv.verify(signed)
+        with self.assertRaises(HttpSigException):
+            HeaderVerifier(signed, self.verify_secret,
+                           sign_header=self.sign_header)
+        with self.assertRaises(HttpSigException):
+            RequestVerifier(self.verify_secret, algorithm='hmac-sha256')
+
+        hs = HeaderSigner(self.keyId, self.sign_secret,
+                          sign_header=self.sign_header,
+                          algorithm=self.algorithm)
+        signed = hs.sign({'Date': self.header_date})
+        self.assertTrue(rv.verify(signed))
+        if self.algorithm != 'rsa-sha512':
+            rv = RequestVerifier(self.verify_secret,
+                                 sign_header=self.sign_header,
+                                 algorithm='rsa-sha512')
+            with self.assertRaises(HttpSigException):
+                rv.verify(signed)
+
 
 class TestVerifyRSASHA256(TestVerifyRSASHA1):
 
@@ -238,4 +435,60 @@ class TestVerifyEd25519(TestVerifyRSASHA1):
         self.keyId = "Test"
         self.algorithm = "ed25519"
         self.sign_secret = private_key
-        self.verify_secret = public_key
\ No newline at end of file
+        self.verify_secret = public_key
+
+
+class TestRequestVerifierThreads(BaseTestCase):
+    header_date = 'Thu, 05 Jan 2014 21:31:40 GMT'
+
+    def test_shared_between_threads(self):
+        with open(os.path.join(
+                os.path.dirname(__file__), 'rsa_private.pem'), 'rb') as f:
+            rsa_private = f.read()
+        with open(os.path.join(
+                os.path.dirname(__file__), 'rsa_public.pem'), 'rb') as f:
+            rsa_public = f.read()
+        with open(os.path.join(
+                os.path.dirname(__file__), 'ed25519_private.txt')) as f:
+            ed_private = f.read()
+        with open(os.path.join(
+                os.path.dirname(__file__), 'ed25519_public.txt')) as f:
+            ed_public = f.read()
+
+        keys = [('rsa', rsa_private, rsa_public, 'rsa-sha256'),
+                ('ed', ed_private, ed_public, 'ed25519'),
+                ('hmac', b'secret', b'secret', 'hmac-sha256')]
+        rv = RequestVerifier(
+                key_store=KeyStore(StaticKeyLoader(
+                    {k: public for k, _, public, _ in keys})),
+                required_headers=['(request-target)', 'date'])
+
+        requests = []
+        for i in range(30):
+            key_id, private, _, algorithm = keys[i % len(keys)]
+            hs = HeaderSigner(key_id=key_id, secret=private,
+                              algorithm=algorithm,
+                              headers=['(request-target)', 'date'])
+            path = '/item/%d' % i
+            signed = hs.sign({'Date': self.header_date},
+                             method='GET', path=path)
+            # every other request is checked against a tampered path
+            requests.append((signed, path if i % 2 else path + '/x', i % 2))
+
+        failures = []
+
+        def worker():
+            for _ in range(20):
+                for signed, path, expected in requests:
+                    result = rv.verify(signed, method='GET', path=path)
+                    if result != bool(expected):
+                        failures.append((signed, path))
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(failures, [])
+        self.assertEqual(len(rv.key_store), len(keys))
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+import os
+import sys
+import threading
+import unittest
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+from wsgiref.util import setup_testing_defaults
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+from httpsig import metrics
+from httpsig.sign import HeaderSigner
+from httpsig.verify import RequestVerifier
+from httpsig.wsgi import SignatureMiddleware, request_target
+
+if requests is not None:
+    from httpsig.requests_auth import HTTPSignatureAuth
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+HEADERS = ['(request-target)', 'host', 'date']
+
+
+def app(environ, start_response):
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [environ['httpsig.key_id'].encode('ascii')]
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+class TestSignatureMiddleware(unittest.TestCase):
+
+    def setUp(self):
+        self.middleware = SignatureMiddleware(app, RequestVerifier(
+            secret=b'secret', required_headers=HEADERS))
+
+    def call(self, environ):
+        setup_testing_defaults(environ)
+        status = []
+        body = b''.join(self.middleware(
+            environ, lambda s, headers: status.append((s, dict(headers)))))
+        return status[0][0], status[0][1], body
+
+    def signed_environ(self, path='/foo', query=''):
+        signer = HeaderSigner('Test', b'secret', algorithm='hmac-sha256',
+                              headers=HEADERS)
+        target = path + ('?' + query if query else '')
+        signed = signer.sign({'Host': 'example.com'}, method='GET',
+                             path=target)
+        return {'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': query,
+                'HTTP_HOST': 'example.com',
+                'HTTP_DATE': signed['date'],
+                'HTTP_AUTHORIZATION': signed['authorization']}
+
+    def test_valid(self):
+        status, headers, body = self.call(
+            self.signed_environ('/foo', 'x=1'))
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(body, b'Test')
+
+    def test_rejected(self):
+        status, headers, body = self.call({})
+        self.assertEqual(status, '401 Unauthorized')
+        self.assertEqual(headers['WWW-Authenticate'],
+                         'Signature realm="httpsig",'
+                         'headers="(request-target) date host"')
+
+        environ = self.signed_environ()
+        environ['PATH_INFO'] = '/bar'
+        status, headers, body = self.call(environ)
+        self.assertEqual(status, '401 Unauthorized')
+
+        totals = self.middleware.metrics.totals()
+        self.assertEqual(totals[metrics.REJECTED], 1)
+        self.assertEqual(totals[metrics.INVALID], 1)
+        self.assertEqual(totals[metrics.OK], 0)
+
+    def test_metrics_per_key(self):
+        self.call(self.signed_environ())
+        self.call(self.signed_environ())
+        self.call({})
+        stats = dict(((s['key_id'], s['algorithm']), s)
+                     for s in self.middleware.metrics.snapshot())
+        self.assertEqual(stats['Test', 'hmac-sha256'][metrics.OK], 2)
+        self.assertEqual(stats['Test', 'hmac-sha256']['latency']['count'], 2)
+        self.assertEqual(stats[None, None][metrics.REJECTED], 1)
+
+    def test_request_target(self):
+        self.assertEqual(request_target({'PATH_INFO': '/a b',
+                                         'QUERY_STRING': 'x=1&y'}),
+                         '/a%20b?x=1&y')
+        self.assertEqual(request_target({'SCRIPT_NAME': '/app',
+                                         'PATH_INFO': ''}), '/app')
+        self.assertEqual(request_target({'RAW_URI': '/a%2Fb?x',
+                                         'PATH_INFO': '/a/b'}), '/a%2Fb?x')
+        # PATH_INFO holds the UTF-8 bytes of the path decoded as latin-1.
+        path = u'/caf\u00e9'.encode('utf-8').decode('latin-1')
+        self.assertEqual(request_target({'PATH_INFO': path}), '/caf%C3%A9')
+
+    @unittest.skipIf(requests is None, 'requests is not installed')
+    def test_server(self):
+        server = make_server('127.0.0.1', 0, self.middleware,
+                             handler_class=QuietHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            url = 'http://127.0.0.1:%d/path?q=1' % server.server_port
+            auth = HTTPSignatureAuth(key_id='Test', secret=b'secret',
+                                     algorithm='hmac-sha256', headers=HEADERS)
+            response = requests.get(url, auth=auth)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, b'Test')
+
+            response = requests.get(url)
+            self.assertEqual(response.status_code, 401)
+            self.assertIn('Signature', response.headers['WWW-Authenticate'])
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_histogram(self):
+        histogram = metrics.Histogram()
+        self.assertIsNone(histogram.percentile(50))
+        for i in range(1, 101):
+            histogram.add(i * 1e-3)
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.mean, 0.0505)
+        p50 = histogram.percentile(50)
+        self.assertTrue(0.05 <= p50 < 0.1, p50)
+        self.assertEqual(histogram.percentile(100), 0.1)
+
+    def test_max_keys(self):
+        collected = metrics.VerificationMetrics(max_keys=2)
+        for key_id in ('a', 'b', 'c', 'd'):
+            collected.record(key_id, 'hmac-sha256', metrics.REJECTED, 1e-5)
+        keys = set((s['key_id'], s['algorithm'])
+                   for s in collected.snapshot())
+        self.assertEqual(keys, set([('a', 'hmac-sha256'),
+                                    ('b', 'hmac-sha256'), metrics.OTHER]))
+        self.assertEqual(collected.totals()[metrics.REJECTED], 4)
@@ -3,18 +3,16 @@ import six
 import re
 import struct
 import hashlib
-import time
-from email.utils import formatdate
-from datetime import datetime
+import hmac
 
 try:
     # Python 3
-    from urllib.request import parse_http_list
+    from collections.abc import Mapping
 except ImportError:
     # Python 2
-    from urllib2 import parse_http_list
+    from collections import Mapping
 
-from Crypto.Hash import SHA, SHA256, SHA512
+from . import clock
 
 ALGORITHMS = frozenset([
                 'rsa-sha1',
@@ -24,9 +22,34 @@ ALGORITHMS = frozenset([
                 'hmac-sha256',
                 'hmac-sha512',
                 'ed25519'])
-HASHES = {'sha1':   SHA,
-          'sha256': SHA256,
-          'sha512': SHA512}
+
+
+class _Hashes(Mapping):
+    """
+    The PyCryptodome hash modules by name, imported on first use so that
+        importing httpsig does not load PyCryptodome.
+    """
+    _modules = None
+
+    def _load(self):
+        if self._modules is None:
+            from Crypto.Hash import SHA, SHA256, SHA512
+            _Hashes._modules = {'sha1':   SHA,
+                                'sha256': SHA256,
+                                'sha512': SHA512}
+        return self._modules
+
+    def __getitem__(self, name):
+        return self._load()[name]
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+
+HASHES = _Hashes()
 
 
 class HttpSigException(Exception):
@@ -39,74 +62,204 @@ def ct_bytes_compare(a, b):
     http://codahale.com/a-lesson-in-timing-attacks/
     """
     if not isinstance(a, six.binary_type):
-        a = a.decode('utf8')
+        a = a.encode('utf8')
     if not isinstance(b, six.binary_type):
-        b = b.decode('utf8')
+        b = b.encode('utf8')
+    return hmac.compare_digest(a, b)
 
-    if len(a) != len(b):
-        return False
 
-    result = 0
-    for x, y in zip(a, b):
-        if six.PY2:
-            result |= ord(x) ^ ord(y)
-        else:
-            result |= x ^ y
+def _text(value):
+    return value if isinstance(value, six.string_types) else str(value)
 
-    return (result == 0)
 
+_BYTES_TYPES = (six.binary_type, bytearray, memoryview)
 
-def generate_message(required_headers, headers, host=None, method=None,
-                     path=None):
-    headers = CaseInsensitiveDict(headers)
 
-    if not required_headers:
-        required_headers = ['date']
+def _bytes(value):
+    """
+    Return a header value as bytes or a bytes-like object, encoding text as
+        ASCII; bytes, bytearrays and memoryviews are returned as is.
+    """
+    if isinstance(value, _BYTES_TYPES):
+        return value
+    return _text(value).encode("ascii")
+
+
+class MessageBuilder(object):
+    """
+    Builds the signing string for a fixed list of headers.
+
+    The list is compiled once into one step per header, with the lowercase
+        names and line prefixes encoded up front, so building a message only
+        looks up the values it needs and joins them as bytes.
+
+    Header values (and `host`, `method` and `path`) may be text, bytes,
+        bytearrays or memoryviews; bytes-like values are copied once, into
+        the message.
+
+    :arg required_headers: the headers to sign, defaulting to ['date'].
+    """
+    def __init__(self, required_headers=None):
+        self.headers = tuple(h.lower() for h in required_headers or ['date'])
+        self._steps = tuple(self._compile(h, i > 0)
+                            for i, h in enumerate(self.headers))
+        self.uses_clock = bool(
+            {'date', '(created)', '(expires)'}.intersection(self.headers))
+
+    def bind(self, host):
+        """
+        Return a copy of this builder that always signs `host` as the 'host'
+            header, with that line encoded once, e.g. for all requests to
+            one server.
+        """
+        builder = MessageBuilder.__new__(MessageBuilder)
+        builder.headers = self.headers
+        builder.uses_clock = self.uses_clock
+        builder._steps = tuple(
+            self._constant(self._prefix(h, i > 0) + _bytes(host))
+            if h == 'host' else step
+            for i, (h, step) in enumerate(zip(self.headers, self._steps)))
+        return builder
+
+    @staticmethod
+    def _prefix(h, newline):
+        prefix = (u'\n' if newline else u'') + h + u': '
+        return prefix.encode("ascii")
+
+    @staticmethod
+    def _constant(line):
+        def step(parts, headers, host, method, path, now, expires,
+                 signing):
+            parts.append(line)
+        return step
+
+    @classmethod
+    def _compile(cls, h, newline):
+        # Each step appends its line, with the separating newline, to `parts`.
+        prefix = cls._prefix(h, newline)
 
-    signable_list = []
-    for h in required_headers:
-        h = h.lower()
         if h == '(request-target)':
-            if not method or not path:
-                raise Exception('method and path arguments required when ' +
-                                'using "(request-target)"')
-            signable_list.append('%s: %s %s' % (h, method.lower(), path))
+            def step(parts, headers, host, method, path, now, expires,
+                     signing):
+                if not method or not path:
+                    raise Exception('method and path arguments required ' +
+                                    'when using "(request-target)"')
+                method = _bytes(method)
+                if isinstance(method, memoryview):
+                    method = method.tobytes()
+                parts += (prefix, method.lower(), b' ', _bytes(path))
 
         elif h == 'host':
             # 'host' special case due to requests lib restrictions
             # 'host' is not available when adding auth so must use a param
             # if no param used, defaults back to the 'host' header
-            if not host:
-                if 'host' in headers:
-                    host = headers[h]
-                else:
-                    raise Exception('missing required header "%s"' % h)
-            signable_list.append('%s: %s' % (h, host))
+            def step(parts, headers, host, method, path, now, expires,
+                     signing):
+                if not host:
+                    host = headers.get('host')
+                    if host is None:
+                        raise Exception('missing required header "host"')
+                parts += (prefix, _bytes(host))
+
         elif h == '(created)':
-            now = int(time.time())
-            signable_list.append('%s: %s' % (h, now))
+            def step(parts, headers, host, method, path, now, expires,
+                     signing):
+                if now is None:
+                    raise Exception('missing required "(created)"')
+                parts += (prefix, str(now).encode("ascii"))
+
+        elif h == '(expires)':
+            def step(parts, headers, host, method, path, now, expires,
+                     signing):
+                if expires is None:
+                    raise Exception('missing required "(expires)"')
+                parts += (prefix, str(expires).encode("ascii"))
+
         elif h == 'date':
-            if not headers.get(h):
-                now = datetime.now()
-                stamp = time.mktime(now.timetuple())
-                date = formatdate(timeval=stamp, localtime=False, usegmt=True)
-                headers[h] = date
-            signable_list.append('%s: %s' % (h, headers[h]))
+            def step(parts, headers, host, method, path, now, expires,
+                     signing):
+                date = headers.get('date')
+                if not date:
+                    if not signing:
+                        raise Exception('missing required header "date"')
+                    date = clock.get_clock().http_date(now)
+                parts += (prefix, _bytes(date))
+
         else:
-            if h not in headers:
-                raise Exception('missing required header "%s"' % h)
+            def step(parts, headers, host, method, path, now, expires,
+                     signing):
+                value = headers.get(h)
+                if value is None:
+                    raise Exception('missing required header "%s"' % h)
+                parts += (prefix, _bytes(value))
+
+        return step
+
+    def build(self, headers, host=None, method=None, path=None, now=None,
+              expires=None, signing=True):
+        """
+        Return the signing string as bytes.
+
+        `headers` maps lowercase header names to values, e.g. a
+            CaseInsensitiveDict; it is not copied.
+        `now` is the Unix time used for '(created)' and a missing 'date',
+            read once from the clock when not given so both always agree.
+        `expires` is the time signed as '(expires)'.
+        `signing` is False when verifying: `now` and `expires` are then the
+            created and expires parameters of the signature, and a missing
+            'date' header is an error rather than the current time.
+        """
+        if now is None and signing and self.uses_clock:
+            now = clock.get_clock().now()
+        parts = []
+        for step in self._steps:
+            step(parts, headers, host, method, path, now, expires, signing)
+        # One join sizes and fills the result in a single allocation.
+        return b''.join(parts)
+
+
+# Compiled builders by header list, shared by all signers and verifiers.
+_builders = {}
+_MAX_BUILDERS = 256
+
+
+def compile_message(required_headers):
+    """
+    Return a (cached) MessageBuilder for `required_headers`.
+    """
+    key = tuple(required_headers or ())
+    builder = _builders.get(key)
+    if builder is None:
+        if len(_builders) >= _MAX_BUILDERS:
+            _builders.clear()
+        builder = _builders[key] = MessageBuilder(required_headers)
+    return builder
+
 
-            signable_list.append('%s: %s' % (h, headers[h]))
+def generate_message(required_headers, headers, host=None, method=None,
+                     path=None):
+    return compile_message(required_headers).build(
+            as_headers(headers), host, method, path)
 
-    signable = '\n'.join(signable_list).encode("ascii")
-    return signable
+
+def _parse_http_list(value):
+    # Imported on first use, as urllib.request is slow to import.
+    try:
+        # Python 3
+        from urllib.request import parse_http_list
+    except ImportError:
+        # Python 2
+        from urllib2 import parse_http_list
+    return parse_http_list(value)
 
 
 def parse_signature_header(sign_value):
     values = {}
     if sign_value:
+        if not isinstance(sign_value, six.string_types):
+            sign_value = sign_value.decode("ascii")
         # This is tricky string magic.  Let urllib do it.
-        fields = parse_http_list(sign_value)
+        fields = _parse_http_list(sign_value)
 
         for item in fields:
             # Only include keypairs.
@@ -118,7 +271,7 @@ def parse_signature_header(sign_value):
 
                 # Unquote values, if quoted.
                 if value[0] == '"':
-                    value = value[1:-1]
+                    value = _unescape(value[1:-1])
 
                 values[key] = value
     return CaseInsensitiveDict(values)
@@ -142,6 +295,105 @@ def parse_authorization_header(header):
     return (auth[0], values)
 
 
+class SignatureParams(object):
+    """
+    The parameters of a Signature header, as parsed by
+        parse_signature_params(). Parameters that were not given are None.
+    """
+    __slots__ = ('key_id', 'algorithm', 'headers', 'signature', 'created',
+                 'expires')
+
+    def __init__(self, key_id=None, algorithm=None, headers=None,
+                 signature=None, created=None, expires=None):
+        self.key_id = key_id
+        self.algorithm = algorithm
+        self.headers = headers
+        self.signature = signature
+        self.created = created
+        self.expires = expires
+
+    def __repr__(self):
+        return 'SignatureParams(%s)' % ', '.join(
+            '%s=%r' % (name, getattr(self, name)) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return (isinstance(other, SignatureParams) and
+                all(getattr(self, name) == getattr(other, name)
+                    for name in self.__slots__))
+
+    def __ne__(self, other):
+        return not self == other
+
+
+# Parameter names (lowercased) to SignatureParams attributes.
+_SIGNATURE_PARAMS = {'keyid': 'key_id',
+                     'algorithm': 'algorithm',
+                     'headers': 'headers',
+                     'signature': 'signature',
+                     'created': 'created',
+                     'expires': 'expires'}
+
+# The longest parameter list parsed, far above that of an RSA-8192
+# signature.
+MAX_PARAMS_LENGTH = 8192
+
+# One `name=value` or `name="quoted \"value\""` item of a parameter list,
+# or else the garbage up to the next comma: it matches wherever a previous
+# match ended, so a list is scanned once from start to end.
+_PARAM_RE = re.compile(
+    r'\s*(?:([^\s=,]+)\s*=\s*(?:"([^"\\]*(?:\\.[^"\\]*)*)"|([^\s,]*))\s*'
+    r'(?:,|$)|[^,]*(?:,|$))')
+
+
+def _unescape(value):
+    if '\\' in value:
+        return re.sub(r'\\(.)', r'\1', value)
+    return value
+
+
+def parse_signature_params(value):
+    """
+    Parse the parameters of a Signature header (or of an Authorization
+        header without its 'Signature' scheme) in a single pass.
+
+    Quoted values may contain escaped quotes. Unknown parameters and garbage
+        up to the next comma are skipped.
+    Returns a SignatureParams.
+    Raises HttpSigException if `value` is longer than MAX_PARAMS_LENGTH.
+    """
+    if len(value) > MAX_PARAMS_LENGTH:
+        raise HttpSigException("Signature parameters too long.")
+    if not isinstance(value, six.string_types):
+        value = value.decode("ascii")  # HTTP headers cannot be Unicode.
+
+    params = SignatureParams()
+    pos, end = 0, len(value)
+    match = _PARAM_RE.match
+    while pos < end:
+        m = match(value, pos)
+        name, quoted, token = m.groups()
+        if name is not None:
+            attr = _SIGNATURE_PARAMS.get(name.lower())
+            if attr is not None:
+                setattr(params, attr,
+                        token if quoted is None else _unescape(quoted))
+        pos = m.end()
+    return params
+
+
+def parse_authorization_params(header):
+    """
+    Parse a 'Signature ...' Authorization header into a SignatureParams.
+    """
+    if not isinstance(header, six.string_types):
+        header = header.decode("ascii")  # HTTP headers cannot be Unicode.
+
+    auth = header.split(" ", 1)
+    if len(auth) == 2:
+        return parse_signature_params(auth[1])
+    return SignatureParams()
+
+
 def build_signature_template(key_id, algorithm, headers, sign_header='authorization'):
     """
     Build the Signature template for use with the Authorization header.
@@ -189,8 +441,8 @@ def is_rsa(keyobj):
 class CaseInsensitiveDict(dict):
     """ A case-insensitive dictionary for header storage.
         A limitation of this approach is the inability to store
-        multiple instances of the same header. If that is changed
-        then we suddenly care about the assembly rules in sec 2.3.
+        multiple instances of the same header. Use RawHeaders for
+        header lists with repeated headers (sec 2.3).
     """
     def __init__(self, d=None, **kwargs):
         super(CaseInsensitiveDict, self).__init__(**kwargs)
@@ -206,18 +458,155 @@ class CaseInsensitiveDict(dict):
     def __contains__(self, key):
         return super(CaseInsensitiveDict, self).__contains__(key.lower())
 
+    def get(self, key, default=None):
+        return super(CaseInsensitiveDict, self).get(key.lower(), default)
+
+
+# Marker for headers a RawHeaders lookup did not find.
+_MISSING = object()
+
+
+class RawHeaders(object):
+    """
+    Read-only, case-insensitive view of a list of (name, value) pairs, such
+        as ASGI's scope['headers'] or the header list of a raw HTTP parser.
+
+    Nothing is copied or indexed up front: the first lookup indexes the
+        names in one pass, lowercasing each once, and the others are dict
+        lookups. Repeated headers are combined in order, separated by ', ',
+        as the signature spec requires. Names and values may be text or
+        bytes.
+
+    :arg pairs:     the list of (name, value) pairs.
+    :arg lowercase: the names are known to be lowercase, as in ASGI, so they
+        are indexed without lowercasing each one.
+    """
+    __slots__ = ('pairs', 'lowercase', '_bytes_names', '_index')
+
+    def __init__(self, pairs, lowercase=False):
+        self.pairs = pairs
+        self.lowercase = lowercase
+        self._bytes_names = bool(pairs) and isinstance(pairs[0][0], bytes)
+        self._index = None
+
+    def _build_index(self):
+        pairs = self.pairs
+        if self.lowercase:
+            index = dict(pairs)
+        else:
+            index = {n.lower(): v for n, v in pairs}
+        if len(index) < len(pairs):
+            # Repeated headers: combine their values in order.
+            values = {}
+            for n, v in pairs:
+                values.setdefault(n if self.lowercase else n.lower(),
+                                  []).append(v)
+            for n, v in values.items():
+                if len(v) > 1:
+                    index[n] = (', '.join(v) if isinstance(v[0], six.text_type)
+                                else b', '.join(_bytes(i) for i in v))
+        self._index = index
+        return index
+
+    def _lookup(self, name):
+        index = self._index
+        if index is None:
+            index = self._build_index()
+        name = name.lower()
+        return index.get(name.encode('ascii') if self._bytes_names else name,
+                         _MISSING)
+
+    def get(self, name, default=None):
+        value = self._lookup(name)
+        return default if value is _MISSING else value
+
+    def __getitem__(self, name):
+        value = self._lookup(name)
+        if value is _MISSING:
+            raise KeyError(name)
+        return value
+
+    def __contains__(self, name):
+        return self._lookup(name) is not _MISSING
+
+    def __iter__(self):
+        return iter(self.pairs)
+
+    def __len__(self):
+        return len(self.pairs)
+
+
+class WSGIHeaders(object):
+    """
+    Read-only, case-insensitive view of the request headers of a WSGI
+        environ, looking up only the headers asked for. The server has
+        already combined repeated headers.
+    """
+    __slots__ = ('environ',)
+
+    # Headers stored without the HTTP_ prefix, see PEP 3333.
+    _UNPREFIXED = frozenset(['CONTENT_TYPE', 'CONTENT_LENGTH'])
+
+    def __init__(self, environ):
+        self.environ = environ
+
+    def _key(self, name):
+        key = name.upper().replace('-', '_')
+        return key if key in self._UNPREFIXED else 'HTTP_' + key
+
+    def get(self, name, default=None):
+        return self.environ.get(self._key(name), default)
+
+    def __getitem__(self, name):
+        try:
+            return self.environ[self._key(name)]
+        except KeyError:
+            raise KeyError(name)
+
+    def __contains__(self, name):
+        return self._key(name) in self.environ
+
+
+def as_headers(headers):
+    """
+    Return `headers` ready for case-insensitive lookups: RawHeaders,
+        WSGIHeaders and CaseInsensitiveDict are returned as is, lists and
+        tuples of (name, value) pairs are wrapped in RawHeaders and other
+        mappings are copied into a CaseInsensitiveDict.
+    """
+    if isinstance(headers, (CaseInsensitiveDict, RawHeaders, WSGIHeaders)):
+        return headers
+    if isinstance(headers, (list, tuple)):
+        return RawHeaders(headers)
+    return CaseInsensitiveDict(headers)
+
+
+def is_public_key(secret):
+    """
+    Return whether `secret` (text or bytes) is a PEM or OpenSSH key. Public
+        keys are no secret, so they must never be used as HMAC secrets.
+    """
+    if not isinstance(secret, bytes):
+        secret = secret.encode('utf-8')
+    secret = secret.lstrip()
+    return secret.startswith(b'-----BEGIN ') or secret.startswith(b'ssh-')
+
 
-# currently busted...
 def get_fingerprint(key):
     """
-    Takes an ssh public key and generates the fingerprint.
+    Takes an ssh public key (an OpenSSH line or a PEM block, as text or
+        bytes) and generates its MD5 fingerprint, computed over the PEM's DER
+        content for PEM keys.
 
-    See: http://tools.ietf.org/html/rfc4716 for more info
+    See: http://tools.ietf.org/html/rfc4716 for more info. For OpenSSH
+        SHA-256 fingerprints, see httpsig.keydir.parse_public_key().
     """
-    if key.startswith('ssh-rsa'):
-        key = key.split(' ')[1]
+    if not isinstance(key, six.string_types):
+        key = key.decode('ascii')
+    if key.startswith('ssh-'):
+        key = key.split()[1]
     else:
-        regex = r'\-{4,5}[\w|| ]+\-{4,5}'
+        regex = r'-{4,5}[\w ]+-{4,5}'
         key = re.split(regex, key)[1]
 
     key = key.replace('\n', '')
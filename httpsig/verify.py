@@ -4,25 +4,101 @@ Module to assist in verifying a signed header.
 import base64
 import six
 
-from .sign import Signer
+from . import instrument
+from .policy import Policy
+from .sign import BaseSigner, Signer, _split_algorithm
 from .utils import *
-from nacl.signing import VerifyKey
-from nacl.encoding import Base64Encoder
-from nacl.exceptions import BadSignatureError 
+
+
+class BaseVerifier(BaseSigner):
+    """
+    Base class of the verifiers specialized for one algorithm family. Use
+        new_verifier() to get the right class for an algorithm.
+    """
+    __slots__ = ()
+
+    def verify(self, data, signature):
+        """
+        Return whether `signature` (base64, as bytes or ASCII text) is valid
+            for `data`, which must be bytes.
+        """
+        if instrument.hooks:
+            timer = instrument.PhaseTimer(instrument.VERIFY)
+            ok = self._verify_timed(data, signature, timer)
+            timer.report(self.algorithm)
+            return ok
+        return self._key.verify(data, base64.b64decode(signature))
+
+    def _verify_timed(self, data, signature, timer):
+        signature = base64.b64decode(signature)
+        timer.mark(instrument.BASE64)
+        ok = self._key.verify(data, signature)
+        timer.mark(instrument.CRYPTO)
+        return ok
+
+    # Verifier compatibility, e.g. for keys returned by a KeyStore.
+    _verify = verify
+
+
+class HMACVerifier(BaseVerifier):
+    __slots__ = ()
+    sign_algorithm = 'hmac'
+
+    def _load_key(self, backend, secret):
+        # Anyone could sign with a public key taken as an HMAC secret.
+        if is_public_key(secret):
+            raise HttpSigException(
+                "A public key cannot be used as an HMAC secret.")
+        return backend.hmac_key(secret, self.hash_algorithm)
+
+
+class RSAVerifier(BaseVerifier):
+    __slots__ = ()
+    sign_algorithm = 'rsa'
+
+    def _load_key(self, backend, secret):
+        return backend.rsa_public_key(secret, self.hash_algorithm)
+
+
+class Ed25519Verifier(BaseVerifier):
+    __slots__ = ()
+    sign_algorithm = 'ed25519'
+
+    def _load_key(self, backend, secret):
+        return backend.ed25519_public_key(secret)
+
+
+VERIFIERS = {'hmac': HMACVerifier,
+             'rsa': RSAVerifier,
+             'ed25519': Ed25519Verifier}
+
+
+def new_verifier(secret, algorithm=None, backend=None):
+    """
+    Return the verifier class specialized for `algorithm`, built with
+        `secret` (see Verifier for the accepted secrets).
+    """
+    sign_algorithm, hash_algorithm = _split_algorithm(algorithm)
+    try:
+        cls = VERIFIERS[sign_algorithm]
+    except KeyError:
+        raise HttpSigException("Unsupported algorithm.")
+    return cls(secret, hash_algorithm, backend)
+
 
 class Verifier(Signer):
     """
     Verifies signed text against a secret.
     For HMAC, the secret is the shared secret.
     For RSA, the secret is the PUBLIC key.
+    For ed25519, the secret is the base64-encoded PUBLIC key.
     """
 
-    def __init__(self,secret, algorithm=None):
-        super(Verifier, self).__init__(secret=secret, algorithm=algorithm)
-        # special case for ed25519 algo that needs to to use another type
-        # for the key then the Signer class
-        if self._ed25519:
-            self._ed25519 = VerifyKey(secret, encoder=Base64Encoder)
+    def __init__(self, secret, algorithm=None, backend=None):
+        super(Verifier, self).__init__(
+                secret=secret, algorithm=algorithm, backend=backend)
+
+    _new = staticmethod(new_verifier)
 
     def _verify(self, data, signature):
         """
@@ -33,27 +109,21 @@ class Verifier(Signer):
 
         if isinstance(data, six.string_types):
             data = data.encode("ascii")
-        if isinstance(signature, six.string_types):
-            signature = signature.encode("ascii")
-
-        if self.sign_algorithm == 'rsa':
-            h = self._hash.new()
-            h.update(data)
-            return self._rsa.verify(h, base64.b64decode(signature))
-
-        elif self.sign_algorithm == 'hmac':
-            h = self._sign_hmac(data)
-            s = base64.b64decode(signature)
-            return ct_bytes_compare(h, s)
-
-        elif self.sign_algorithm == 'ed25519':
-            try:
-                self._ed25519.verify(data, base64.b64decode(signature))
-                return True
-            except BadSignatureError:
-                return False
-        else:
-            raise HttpSigException("Unsupported algorithm.")
+
+        # b64decode() takes the signature as ASCII text or bytes.
+        return self._signer.verify(data, signature)
+
+
+def _parse_sign_header(headers, sign_header):
+    """
+    Parse the signature parameters out of a case-insensitive header dict.
+    """
+    if sign_header.lower() == 'authorization':
+        auth = parse_authorization_header(headers['authorization'])
+        if len(auth) == 2:
+            return auth[1]
+        raise HttpSigException("Invalid authorization header.")
+    return parse_signature_header(headers[sign_header])
 
 
 class HeaderVerifier(Verifier):
@@ -61,8 +131,10 @@ class HeaderVerifier(Verifier):
     Verifies an HTTP signature from given headers.
     """
 
-    def __init__(self, headers, secret, required_headers=None, method=None,
-                 path=None, host=None, sign_header='authorization'):
+    def __init__(self, headers, secret=None, required_headers=None,
+                 method=None, path=None, host=None, sign_header='authorization',
+                 key_store=None, backend=None, policy=None,
+                 replay_guard=None):
         """
         Instantiate a HeaderVerifier object.
 
@@ -81,45 +153,259 @@ class HeaderVerifier(Verifier):
             header, if not supplied in :param:headers.
         :param sign_header:         Optional. The header where the signature is.
             Default is 'authorization'.
+        :param key_store:           Optional. A KeyStore used to look up the
+            key by the keyId and algorithm of the signature, instead of
+            parsing :param:secret for every request.
+        :param backend:             Optional. The crypto backend used with
+            :param:secret, see httpsig.backends.
+        :param policy:              Optional. The httpsig.policy.Policy
+            checked before the signature, e.g. shared by all requests to
+            count rejections. Replaces :param:required_headers.
+        :param replay_guard:        Optional. The httpsig.replay.ReplayGuard
+            recording valid signatures, to reject them when replayed.
         """
-        required_headers = required_headers or ['date']
-        self.headers = CaseInsensitiveDict(headers)
+        timer = None
+        if instrument.hooks:
+            timer = instrument.PhaseTimer(instrument.VERIFY)
+        # Set when timing, to report the phases run here with verify()'s.
+        self._timer = timer
 
-        if sign_header.lower() == 'authorization':
-            auth = parse_authorization_header(self.headers['authorization'])
-            if len(auth) == 2:
-                self.auth_dict = auth[1]
-            else:
-                raise HttpSigException("Invalid authorization header.")
-        else:
-            self.auth_dict = parse_signature_header(self.headers[sign_header])
+        if policy is None:
+            policy = Policy(required_headers)
+        self.policy = policy
+        self.replay_guard = replay_guard
+        self.headers = as_headers(headers)
 
-        self.required_headers = [s.lower() for s in required_headers]
+        self.auth_dict = _parse_sign_header(self.headers, sign_header)
+
+        self.required_headers = list(policy.required_headers)
         self.method = method
         self.path = path
         self.host = host
 
-        super(HeaderVerifier, self).__init__(
-                secret, algorithm=self.auth_dict['algorithm'])
+        auth = self.auth_dict
+        self._params = SignatureParams(
+                auth.get('keyId'), auth.get('algorithm'), auth.get('headers'),
+                auth.get('signature'), auth.get('created'),
+                auth.get('expires'))
+        self._auth_headers = (self._params.headers or 'date').split(' ')
+        # The secret is parsed for the algorithm of the signature, so an
+        # unusable one is refused now; verify() runs the other checks.
+        policy.check_algorithm(self._params.algorithm)
+        if timer is not None:
+            timer.mark(instrument.PARSE)
+
+        # With a key store, the key is looked up by verify(), once the
+        # policy has accepted its keyId.
+        self.key_store = key_store
+        self._verifier = None
+        if key_store is None:
+            if secret is None:
+                raise HttpSigException("A secret or a key store is required.")
+            super(HeaderVerifier, self).__init__(
+                    secret, algorithm=self._params.algorithm, backend=backend)
+            self._verifier = self._signer
+            if timer is not None:
+                timer.mark(instrument.KEY)
+
+    # Holds the state of one request: pickled as its attributes, not as
+    # the arguments of a Verifier.
+    __reduce__ = object.__reduce__
 
     def verify(self):
         """
         Verify the headers based on the arguments passed at creation and
             current properties.
 
-        Raises an Exception if a required header (:param:required_headers) is
-            not found in the signature.
+        Raises httpsig.policy.Rejected if a check of the policy fails, e.g.
+            a required header (:param:required_headers) is not found in the
+            signature.
+        Raises httpsig.replay.Replayed if the replay guard has seen the
+            valid signature before.
+        Returns True or False.
+        """
+        timer = self._timer
+        if timer is None and instrument.hooks:
+            timer = instrument.PhaseTimer(instrument.VERIFY)
+        elif timer is not None:
+            timer.restart()
+
+        params = self._params
+        auth_headers = self._auth_headers
+        self.policy.check(params, auth_headers, self.headers)
+        if timer is not None:
+            timer.mark(instrument.PARSE)
+        if self._verifier is None:
+            self._use(self.key_store.get(params.key_id, params.algorithm))
+            self._verifier = self._signer
+            if timer is not None:
+                timer.mark(instrument.KEY)
+
+        if timer is None:
+            signing_str = compile_message(auth_headers).build(
+                    self.headers, self.host, self.method, self.path,
+                    params.created, params.expires, signing=False)
+            ok = self._verifier.verify(signing_str, params.signature)
+            if ok and self.replay_guard is not None:
+                self.replay_guard.check(params, auth_headers, self.headers)
+            return ok
+
+        signing_str = compile_message(auth_headers).build(
+                self.headers, self.host, self.method, self.path,
+                params.created, params.expires, signing=False)
+        timer.mark(instrument.BUILD)
+        ok = self._verifier._verify_timed(signing_str, params.signature, timer)
+        timer.report(params.algorithm, params.key_id)
+        if ok and self.replay_guard is not None:
+            self.replay_guard.check(params, auth_headers, self.headers)
+        return ok
+
+
+class RequestVerifier(object):
+    """
+    Verifies HTTP signatures of many requests against a fixed policy.
+
+    Unlike HeaderVerifier, which is built for a single request, a
+        RequestVerifier is configured once and keeps no per-request state,
+        so one instance can be shared by all threads of a server.
+
+    :arg secret:           The HMAC secret or RSA *public* key used for every
+        keyId. Ignored when :arg:key_store is given.
+    :arg required_headers: Optional. A list of headers required to be present
+        to validate, even if the signature is otherwise valid. Defaults to
+        ['date'].
+    :arg sign_header:      Optional. The header where the signature is.
+        Default is 'authorization'.
+    :arg key_store:        Optional. A KeyStore used to look up the key by the
+        keyId and algorithm of each signature.
+    :arg backend:          Optional. The crypto backend used with
+        :arg:secret, see httpsig.backends.
+    :arg policy:           Optional. The httpsig.policy.Policy checked before
+        looking up the key of a request, e.g. to restrict algorithms and
+        keyIds or to enforce a maximum age. Replaces :arg:required_headers.
+    :arg replay_guard:     Optional. The httpsig.replay.ReplayGuard
+        recording valid signatures, to reject them when replayed.
+    :arg algorithm:        Optional. The only algorithm accepted with
+        :arg:secret, checked against it here. By default any algorithm is,
+        except HMAC for PEM and OpenSSH keys: pin it for raw ed25519 keys.
+
+    The policy rejects requests that cannot verify, or are outside of its
+        limits, before any crypto runs; `rejections` counts them by check.
+    """
+    def __init__(self, secret=None, required_headers=None,
+                 sign_header='authorization', key_store=None, backend=None,
+                 policy=None, replay_guard=None, algorithm=None):
+        from .keystore import FixedKeyLoader, FixedKeyStore
+
+        if key_store is None:
+            if secret is None:
+                raise HttpSigException("A secret or a key store is required.")
+            key_store = FixedKeyStore(FixedKeyLoader(secret, algorithm),
+                                      backend=backend)
+
+        if policy is None:
+            policy = Policy(required_headers)
+        self.policy = policy
+        self.replay_guard = replay_guard
+        self.required_headers = policy.required_headers
+        self.sign_header = sign_header
+        self.key_store = key_store
+        self._authorization = sign_header.lower() == 'authorization'
+
+    @property
+    def rejections(self):
+        """
+        The number of requests rejected by each check of the policy.
+        """
+        return self.policy.rejections
+
+    def verify(self, headers, method=None, path=None, host=None):
+        """
+        Verify the signature of one request.
+
+        :param headers: A dictionary of headers from the HTTP request.
+        :param method:  Optional. The HTTP method used in the request (eg.
+            "GET"). Required for the '(request-target)' header.
+        :param path:    Optional. The HTTP path requested, exactly as sent.
+            Required for the '(request-target)' header.
+        :param host:    Optional. The value to use for the Host header, if not
+            supplied in :param:headers.
+
+        Raises httpsig.policy.Rejected if a check of the policy fails, e.g.
+            a required header is not found in the signature, and
+            httpsig.replay.Replayed if the replay guard has seen the valid
+            signature before.
         Returns True or False.
         """
-        auth_headers = self.auth_dict.get('headers', 'date').split(' ')
+        if instrument.hooks:
+            return self._verify_timed(headers, method, path, host)
+        headers, params, auth_headers = self._parse(headers)
+        key = self.key_store.get(params.key_id, params.algorithm)
+        return self._verify_parsed(
+                key, headers, params, auth_headers, method, path, host)
+
+    def _verify_timed(self, headers, method, path, host):
+        timer = instrument.PhaseTimer(instrument.VERIFY)
+        headers, params, auth_headers = self._parse(headers)
+        timer.mark(instrument.PARSE)
+        key = self.key_store.get(params.key_id, params.algorithm)
+        timer.mark(instrument.KEY)
+        return self._verify_parsed(
+                key, headers, params, auth_headers, method, path, host, timer)
 
-        if len(set(self.required_headers) - set(auth_headers)) > 0:
-            error_headers = ', '.join(
-                    set(self.required_headers) - set(auth_headers))
-            raise Exception(
-                    '{} is a required header(s)'.format(error_headers))
+    def verify_many(self, requests, **kwargs):
+        """
+        Verify many requests, yielding True or False for each in order.
 
-        signing_str = generate_message(
-                auth_headers, self.headers, self.host, self.method, self.path)
+        See httpsig.batch.verify_many() for the arguments.
+        """
+        from .batch import verify_many
+        return verify_many(self, requests, **kwargs)
 
-        return self._verify(signing_str, self.auth_dict['signature'])
+    def _parse(self, headers):
+        """
+        Return the case-insensitive headers, the SignatureParams and the list
+            of signed headers of a request, once it passed the policy.
+        """
+        headers = as_headers(headers)
+        value = headers[self.sign_header]
+        if self._authorization:
+            params = parse_authorization_params(value)
+        else:
+            params = parse_signature_params(value)
+        if params.algorithm is None or params.signature is None:
+            raise HttpSigException("Invalid signature header.")
+
+        auth_headers = (params.headers or 'date').split(' ')
+        self.policy.check(params, auth_headers, headers)
+        return headers, params, auth_headers
+
+    def _verify_parsed(self, key, headers, params, auth_headers,
+                       method=None, path=None, host=None, timer=None):
+        """
+        Check the signature of a request parsed by _parse() with `key`.
+
+        When hooks are registered (see httpsig.instrument), the phases from
+            here on are added to `timer` (a new one by default) and
+            reported. A valid signature is then recorded by the replay
+            guard, if any.
+        """
+        if timer is None:
+            if not instrument.hooks:
+                signing_str = compile_message(auth_headers).build(
+                        headers, host, method, path, params.created,
+                        params.expires, signing=False)
+                ok = key.verify(signing_str, params.signature)
+                if ok and self.replay_guard is not None:
+                    self.replay_guard.check(params, auth_headers, headers)
+                return ok
+            timer = instrument.PhaseTimer(instrument.VERIFY)
+        signing_str = compile_message(auth_headers).build(
+                headers, host, method, path, params.created, params.expires,
+                signing=False)
+        timer.mark(instrument.BUILD)
+        ok = key._verify_timed(signing_str, params.signature, timer)
+        timer.report(params.algorithm, params.key_id)
+        if ok and self.replay_guard is not None:
+            self.replay_guard.check(params, auth_headers, headers)
+        return ok
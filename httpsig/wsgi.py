@@ -0,0 +1,127 @@
+"""
+WSGI middleware verifying the HTTP signature of every request before the
+application sees it.
+"""
+import time
+
+try:
+    # Python 3
+    from urllib.parse import quote
+except ImportError:
+    # Python 2
+    from urllib import quote
+
+from . import metrics as _metrics
+from .utils import WSGIHeaders
+
+try:
+    _timer = time.perf_counter
+except AttributeError:
+    # Python 2
+    _timer = time.time
+
+# Characters left as is when re-quoting PATH_INFO (RFC 3986 pchar and '/').
+_PATH_SAFE = "/:@!$&'()*+,;=-._~"
+
+
+def request_target(environ):
+    """
+    Return the path and query of a request as sent, for '(request-target)'.
+
+    The raw request URI is used when the server provides it (RAW_URI or
+        REQUEST_URI); otherwise it is rebuilt from SCRIPT_NAME, PATH_INFO and
+        QUERY_STRING, which loses encodings such as '%2F'.
+    """
+    raw = environ.get('RAW_URI') or environ.get('REQUEST_URI')
+    if raw:
+        return raw
+    path = environ.get('SCRIPT_NAME', '') + environ.get('PATH_INFO', '')
+    if not isinstance(path, bytes):
+        # PEP 3333: the bytes of the path, decoded as latin-1.
+        path = path.encode('latin-1')
+    path = quote(path, safe=_PATH_SAFE) or '/'
+    query = environ.get('QUERY_STRING')
+    return path + '?' + query if query else path
+
+
+def request_host(environ):
+    """
+    Return the Host of a request, from the Host header or else the server
+        name and port.
+    """
+    host = environ.get('HTTP_HOST')
+    if host:
+        return host
+    host = environ['SERVER_NAME']
+    port = environ.get('SERVER_PORT')
+    default = '443' if environ.get('wsgi.url_scheme') == 'https' else '80'
+    if port and port != default:
+        host += ':' + port
+    return host
+
+
+class SignatureMiddleware(object):
+    """
+    Rejects requests without a valid HTTP signature with 401 Unauthorized;
+        other requests are passed to `app` with the keyId that signed them in
+        environ['httpsig.key_id'].
+
+    Only the headers that are signed are read from the environ.
+
+    :arg app:      the WSGI application.
+    :arg verifier: a RequestVerifier, whose KeyStore is shared by all
+        requests (and threads) served by the middleware.
+    :arg metrics:  Optional. The VerificationMetrics updated for every
+        request; a new one by default, available as `self.metrics`.
+    :arg realm:    Optional. The realm sent in the WWW-Authenticate header of
+        401 responses.
+    """
+    def __init__(self, app, verifier, metrics=None, realm='httpsig'):
+        self.app = app
+        self.verifier = verifier
+        self.metrics = (metrics if metrics is not None
+                        else _metrics.VerificationMetrics())
+        headers = ' '.join(sorted(verifier.required_headers))
+        self._challenge = 'Signature realm="%s",headers="%s"' % (
+            realm, headers)
+
+    def verify(self, environ):
+        """
+        Verify the signature of the request in `environ`.
+
+        Returns (outcome, key_id, algorithm), where outcome is one of
+            httpsig.metrics.OUTCOMES.
+        """
+        verifier = self.verifier
+        key_id = algorithm = None
+        try:
+            headers, params, auth_headers = verifier._parse(
+                WSGIHeaders(environ))
+            key_id, algorithm = params.key_id, params.algorithm
+            key = verifier.key_store.get(key_id, algorithm)
+            host = None
+            if 'host' in auth_headers and not environ.get('HTTP_HOST'):
+                host = request_host(environ)
+            ok = verifier._verify_parsed(
+                key, headers, params, auth_headers,
+                environ.get('REQUEST_METHOD'), request_target(environ), host)
+        except Exception:
+            # Missing or malformed signature, missing headers, unknown key.
+            return _metrics.REJECTED, key_id, algorithm
+        return (_metrics.OK if ok else _metrics.INVALID), key_id, algorithm
+
+    def unauthorized(self, environ, start_response):
+        start_response('401 Unauthorized', [
+            ('Content-Type', 'text/plain'),
+            ('WWW-Authenticate', self._challenge),
+        ])
+        return [b'Invalid or missing signature.\n']
+
+    def __call__(self, environ, start_response):
+        start = _timer()
+        outcome, key_id, algorithm = self.verify(environ)
+        self.metrics.record(key_id, algorithm, outcome, _timer() - start)
+        if outcome != _metrics.OK:
+            return self.unauthorized(environ, start_response)
+        environ['httpsig.key_id'] = key_id
+        return self.app(environ, start_response)
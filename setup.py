@@ -31,11 +31,13 @@ setup(
     author_email='adam@movq.us',
     url='https://github.com/ahknight/httpsig',
     license='MIT',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     include_package_data=True,
     zip_safe=True,
-    use_scm_version=True,
+    use_scm_version={'write_to': 'httpsig/_version.py'},
     setup_requires=['setuptools_scm'],
     install_requires=['pycryptodome>=3,<4', 'pynacl>=1.3.0','six'],
+    extras_require={'cryptography': ['cryptography'],
+                    'httpx': ['httpx']},
     test_suite="httpsig.tests",
 )